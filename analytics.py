@@ -0,0 +1,361 @@
+"""
+Class-wide statistics over grading results
+
+Every accepted submission is recorded as an attempt (course, exercise,
+student, time) and every grading result as an outcome of its submission,
+in one SQLite file shared by all server processes. Identical code is graded
+once (see grading.py), so many attempts point at one outcome.
+
+exercise_stats() turns an exercise's attempts into:
+
+- per-test pass rates, over all graded attempts and over each student's
+  latest attempt
+- failure clusters: students failing the same test with the same wrong
+  result (or the same error), most common first
+- time to pass: from a student's first attempt to their first attempt
+  passing every test, and how many attempts it took
+
+The outcomes are decoded once per distinct submission into boolean
+pass/seen matrices (submissions x tests); everything else is numpy
+arithmetic over those matrices and the attempts' index arrays, so
+thousands of attempts take milliseconds. Results are cached per exercise
+until a new attempt or outcome is stored.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from middleware import CoalescingCache
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempts (
+    id INTEGER PRIMARY KEY,
+    course TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    exercise TEXT NOT NULL,
+    student TEXT,
+    submission_id TEXT NOT NULL,
+    submitted_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS attempts_exercise ON attempts (course, bucket, exercise, submitted_at);
+CREATE TABLE IF NOT EXISTS outcomes (
+    submission_id TEXT PRIMARY KEY,
+    success INTEGER NOT NULL,
+    loaded INTEGER NOT NULL,
+    tests TEXT NOT NULL,
+    graded_at REAL NOT NULL
+);
+"""
+
+# Failure clusters returned, most common first
+MAX_CLUSTERS = 20
+# Time-to-pass histogram bucket edges, in seconds
+HISTOGRAM_EDGES = (60, 300, 900, 3600, 4 * 3600, 24 * 3600, 7 * 24 * 3600)
+# Characters of a wrong result or error compared when clustering failures
+MAX_SIGNATURE_LENGTH = 500
+
+
+class AttemptStore:
+    """SQLite-backed attempts and outcomes (see the module docstring)"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+        self._stats = CoalescingCache("stats", max_entries=256)
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def add_attempt(self, course, bucket, exercise_code, student, submission_id, submitted_at=None):
+        try:
+            self._connect().execute(
+                "INSERT INTO attempts (course, bucket, exercise, student, submission_id, submitted_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (course or "", bucket, exercise_code, student or None, submission_id,
+                 time.time() if submitted_at is None else submitted_at),
+            )
+        except sqlite3.Error as e:
+            # Statistics must never make a submission fail
+            print(f"Warning: Could not record attempt: {e}")
+
+    def add_outcome(self, submission_id, result):
+        """Store (or replace, after a regrade) the grading result of a submission"""
+        tests = [
+            {key: entry[key] for key in ("test", "function", "description", "passed", "call",
+                                         "expected", "got", "error", "generated") if key in entry}
+            for entry in result.get("tests", [])
+        ]
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO outcomes (submission_id, success, loaded, tests, graded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (submission_id, bool(result.get("success")), bool(result.get("loaded")),
+                 json.dumps(tests), result.get("graded_at", time.time())),
+            )
+        except sqlite3.Error as e:
+            print(f"Warning: Could not record outcome: {e}")
+
+    def exercise_stats(self, bucket, exercise_code, course=None):
+        """
+        Statistics of one exercise (see exercise_stats)
+
+        Raises:
+            RuntimeError: numpy is not installed
+        """
+        if np is None:
+            raise RuntimeError("Statistics need numpy")
+        course = course or ""
+        connection = self._connect()
+        # Anything stored for the exercise changes one of these
+        version = connection.execute(
+            "SELECT COUNT(o.submission_id), MAX(a.id), MAX(o.rowid) FROM attempts a "
+            "LEFT JOIN outcomes o ON o.submission_id = a.submission_id "
+            "WHERE a.course = ? AND a.bucket = ? AND a.exercise = ?",
+            (course, bucket, exercise_code),
+        ).fetchone()
+        key = (course, bucket, exercise_code, version)
+        return self._stats.get(key, lambda: self._compute(course, bucket, exercise_code))
+
+    def _compute(self, course, bucket, exercise_code):
+        connection = self._connect()
+        attempts = connection.execute(
+            "SELECT student, submission_id, submitted_at FROM attempts "
+            "WHERE course = ? AND bucket = ? AND exercise = ? ORDER BY submitted_at, id",
+            (course, bucket, exercise_code),
+        ).fetchall()
+        outcomes = {}
+        for sub_id, success, loaded, tests in connection.execute(
+            "SELECT submission_id, success, loaded, tests FROM outcomes "
+            "WHERE submission_id IN (SELECT submission_id FROM attempts "
+            "WHERE course = ? AND bucket = ? AND exercise = ?)",
+            (course, bucket, exercise_code),
+        ):
+            outcomes[sub_id] = (bool(success), bool(loaded), json.loads(tests))
+        stats = exercise_stats(attempts, outcomes)
+        stats.update({"bucket": bucket, "exercise": exercise_code})
+        if course:
+            stats["course"] = course
+        return stats
+
+
+def _test_key(entry):
+    test = entry.get("test")
+    if test == "differential":
+        return f"differential:{entry.get('function')}"
+    return test
+
+
+def _percentiles(values, points=(25, 50, 75, 90)):
+    if not len(values):
+        return None
+    result = {f"p{p}": round(float(v), 1) for p, v in zip(points, np.percentile(values, points))}
+    result["max"] = round(float(values.max()), 1)
+    return result
+
+
+def exercise_stats(attempts, outcomes):
+    """
+    Aggregate an exercise's attempts
+
+    Args:
+        attempts: [(student or None, submission id, submitted_at), ...] in time order
+        outcomes: {submission id: (success, loaded, [report test entries])}
+
+    Returns:
+        {"attempts", "pending", "students", "success_rate", "load_failures",
+         "tests": [...], "failure_clusters": [...], "time_to_pass": {...}}
+    """
+    # Only graded attempts count; the rest are still queued
+    graded = [row for row in attempts if row[1] in outcomes]
+    sub_index = {}
+    student_index = {}
+    sub_idx = np.empty(len(graded), dtype=np.int64)
+    stu_idx = np.empty(len(graded), dtype=np.int64)
+    times = np.empty(len(graded), dtype=np.float64)
+    for i, (student, sub_id, submitted_at) in enumerate(graded):
+        sub_idx[i] = sub_index.setdefault(sub_id, len(sub_index))
+        stu_idx[i] = student_index.setdefault(student, len(student_index)) if student else -1
+        times[i] = submitted_at
+    n_subs, n_students = len(sub_index), len(student_index)
+
+    # Columns: the suite's own [[test]] tables and differential checks, in
+    # order of appearance (generated cases only ever report failures).
+    # Outcomes are read in one pass into (row, column, passed) triples.
+    columns = {}
+    info = {}
+    cells_row, cells_column, cells_passed = [], [], []
+    success = np.zeros(n_subs, dtype=bool)
+    not_loaded = np.zeros(n_subs, dtype=bool)
+    # Failures as (submission, cluster) pairs; a cluster is one test failing one way
+    clusters = {}
+    cluster_entries = []
+    fail_sub = []
+    fail_cluster = []
+    for sub_id, i in sub_index.items():
+        ok, loaded, tests = outcomes[sub_id]
+        success[i] = ok
+        if not loaded:
+            not_loaded[i] = True
+            continue
+        for entry in tests:
+            key = _test_key(entry)
+            passed = entry.get("passed", False)
+            if not entry.get("generated"):
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = len(columns)
+                    info[key] = {"test": key, "function": entry.get("function"),
+                                 "description": entry.get("description", "")}
+                cells_row.append(i)
+                cells_column.append(column)
+                cells_passed.append(passed)
+            if passed:
+                continue
+            signature = ("error", entry["error"]) if "error" in entry else ("got", entry.get("got"))
+            signature = (key, signature[0], str(signature[1])[:MAX_SIGNATURE_LENGTH])
+            cluster = clusters.get(signature)
+            if cluster is None:
+                cluster = clusters[signature] = len(clusters)
+                cluster_entries.append(entry)
+            fail_sub.append(i)
+            fail_cluster.append(cluster)
+
+    passed = np.zeros((n_subs, len(columns)), dtype=bool)
+    seen = np.zeros((n_subs, len(columns)), dtype=bool)
+    seen[cells_row, cells_column] = True
+    passed[cells_row, cells_column] = cells_passed
+    # Nothing ran: every test counts as failed
+    seen[not_loaded] = True
+
+    # Attempts per distinct submission: every per-attempt sum is weights @ matrix
+    weights = np.bincount(sub_idx, minlength=n_subs).astype(np.float64)
+    passed_f = passed.astype(np.float64)
+    seen_f = seen.astype(np.float64)
+    attempt_passes = weights @ passed_f
+    attempt_seen = weights @ seen_f
+
+    # Each student's latest graded attempt
+    with_student = stu_idx >= 0
+    latest = np.full(n_students, -1, dtype=np.int64)
+    np.maximum.at(latest, stu_idx[with_student], np.nonzero(with_student)[0])
+    latest_subs = sub_idx[latest[latest >= 0]]
+    student_passes = passed_f[latest_subs].sum(axis=0)
+    student_seen = seen_f[latest_subs].sum(axis=0)
+
+    tests = []
+    for key, column in columns.items():
+        entry = dict(info[key])
+        entry["attempts"] = int(attempt_seen[column])
+        entry["pass_rate"] = round(float(attempt_passes[column] / attempt_seen[column]), 4) \
+            if attempt_seen[column] else None
+        entry["student_pass_rate"] = round(float(student_passes[column] / student_seen[column]), 4) \
+            if student_seen[column] else None
+        tests.append(entry)
+
+    return {
+        "attempts": len(graded),
+        "pending": len(attempts) - len(graded),
+        "students": n_students,
+        "success_rate": round(float(weights @ success / len(graded)), 4) if graded else None,
+        "load_failures": int(weights @ not_loaded),
+        "tests": tests,
+        "failure_clusters": _failure_clusters(
+            np.array(fail_sub, dtype=np.int64), np.array(fail_cluster, dtype=np.int64),
+            cluster_entries, weights, sub_idx, stu_idx, n_students,
+        ),
+        "time_to_pass": _time_to_pass(success[sub_idx], stu_idx, times, n_students),
+    }
+
+
+def _failure_clusters(fail_sub, fail_cluster, cluster_entries, weights, sub_idx, stu_idx, n_students):
+    """The most common ways of failing a test, with attempt and student counts"""
+    n_clusters = len(cluster_entries)
+    if not n_clusters:
+        return []
+    attempts = np.bincount(fail_cluster, weights=weights[fail_sub], minlength=n_clusters)
+
+    # Distinct students per cluster: join the distinct (submission, student)
+    # pairs with the (submission, cluster) pairs on submission
+    with_student = stu_idx >= 0
+    students = np.zeros(n_clusters, dtype=np.int64)
+    if n_students:
+        pairs = np.unique(sub_idx[with_student] * n_students + stu_idx[with_student])
+        pair_sub, pair_student = pairs // n_students, pairs % n_students
+        order = np.argsort(fail_sub, kind="stable")
+        sorted_clusters = fail_cluster[order]
+        per_sub = np.bincount(fail_sub, minlength=len(weights))
+        starts = np.concatenate(([0], np.cumsum(per_sub)[:-1]))
+        repeats = per_sub[pair_sub]
+        total = int(repeats.sum())
+        if total:
+            offsets = np.arange(total) - np.repeat(np.cumsum(repeats) - repeats, repeats)
+            joined_clusters = sorted_clusters[np.repeat(starts[pair_sub], repeats) + offsets]
+            joined_students = np.repeat(pair_student, repeats)
+            unique = np.unique(joined_clusters * n_students + joined_students)
+            students = np.bincount(unique // n_students, minlength=n_clusters)
+
+    top = np.lexsort((-students, -attempts))[:MAX_CLUSTERS]
+    result = []
+    for cluster in top:
+        entry = cluster_entries[cluster]
+        item = {
+            "test": _test_key(entry),
+            "function": entry.get("function"),
+            "description": entry.get("description", ""),
+            "attempts": int(attempts[cluster]),
+            "students": int(students[cluster]),
+        }
+        for key in ("call", "expected", "got", "error"):
+            if key in entry:
+                item[key] = entry[key]
+        if entry.get("generated"):
+            item["generated"] = True
+        result.append(item)
+    return result
+
+
+def _time_to_pass(attempt_success, stu_idx, times, n_students):
+    """From each student's first attempt to their first fully passing one"""
+    with_student = stu_idx >= 0
+    students, attempt_times = stu_idx[with_student], times[with_student]
+    first = np.full(n_students, np.inf)
+    np.minimum.at(first, students, attempt_times)
+    first_pass = np.full(n_students, np.inf)
+    passing = attempt_success[with_student]
+    np.minimum.at(first_pass, students[passing], attempt_times[passing])
+
+    done = np.isfinite(first_pass)
+    seconds = (first_pass - first)[done]
+    # Attempts up to and including the first passing one
+    counted = attempt_times <= first_pass[students]
+    attempts_needed = np.bincount(students[counted], minlength=n_students)[done]
+
+    counts, _ = np.histogram(seconds, bins=(0,) + HISTOGRAM_EDGES + (np.inf,))
+    histogram = [
+        {"up_to_seconds": edge, "students": int(count)}
+        for edge, count in zip(HISTOGRAM_EDGES + (None,), counts)
+    ]
+    return {
+        "students": n_students,
+        "passed": int(done.sum()),
+        "seconds": _percentiles(seconds),
+        "attempts": _percentiles(attempts_needed.astype(np.float64)),
+        "histogram": histogram,
+    }
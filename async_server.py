@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Asyncio variant of the Exercise API's read routes
+
+server.py under gunicorn holds a thread for every request in progress, so
+slow lab clients, long-polls and event streams use up the worker threads.
+Here connections cost a coroutine each; only file I/O (reading and
+rendering exercises, sending files) runs on a bounded thread pool.
+
+Served, with the same JSON bodies as server.py (same views, same caches,
+same JSON encoder) and under /courses/<course>/... too:
+
+    GET /health
+    GET /courses/<course>/health
+    GET /metrics
+    GET /api/exercises[?bucket=&prefix=&limit=&cursor=&fields=]
+    GET /api/exercises/<bucket>/<code>
+    GET /api/exercises/<bucket>/<code>/<file>
+    GET /api/exercises/<bucket>/<code>/res/<file>
+    GET /api/res/<file>
+    GET /api/events
+
+Search, submissions, statistics, datasets and bundle sync stay on
+server.py (answered with 404 here). HTTP/1.1 keep-alive; no TLS (put a
+reverse proxy in front). One process; the content watcher runs in it.
+"""
+import argparse
+import asyncio
+import http
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from werkzeug.exceptions import InternalServerError, NotFound
+from werkzeug.http import http_date, parse_date, parse_etags, parse_if_range_header, parse_range_header
+from werkzeug.utils import get_content_type
+
+import events
+import metrics
+import middleware
+import server
+from catalog import DEFAULT_PAGE_SIZE
+from fileserve import BLOCK_SIZE, not_modified, requested_range
+
+
+DEFAULT_THREADS = 16
+MAX_CONNECTIONS = 10000
+# Idle time allowed before (and while sending) a request on a kept-alive connection
+KEEPALIVE_SECONDS = 15.0
+MAX_REQUEST_BODY_BYTES = 64 * 1024
+
+
+class _Request:
+    def __init__(self, method, target, version, headers, peer, writer):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        self.peer = peer
+        # For responses that take over the connection (event streams)
+        self.writer = writer
+        url = urlsplit(target)
+        self.path = unquote(url.path)
+        self.query = parse_qs(url.query, keep_blank_values=True)
+
+    def arg(self, name, default=None):
+        values = self.query.get(name)
+        return values[0] if values else default
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+
+class _Response:
+    def __init__(self, status, body=b"", mimetype="application/json", headers=None, content_length=None,
+                 on_close=None):
+        self.status = status
+        # bytes, or an async iterator of bytes (with content_length)
+        self.body = body
+        # Called once the response is done with, written or not (e.g. to
+        # release a cached descriptor); a body generator's finally doesn't
+        # run when it was never started (HEAD, client gone)
+        self.on_close = on_close
+        self.headers = list(headers or [])
+        if mimetype:
+            self.headers.insert(0, ("Content-Type", get_content_type(mimetype, "utf-8")))
+        self.content_length = len(body) if isinstance(body, bytes) else content_length
+
+    async def close(self):
+        try:
+            if not isinstance(self.body, bytes):
+                await self.body.aclose()
+        finally:
+            if self.on_close is not None:
+                on_close, self.on_close = self.on_close, None
+                on_close()
+
+
+def _jsonify(payload, status=200):
+    """What flask.jsonify would send"""
+    return _Response(status, server.app.json.response(payload).get_data())
+
+
+def _not_found(description=None):
+    """server.not_found's response"""
+    error = NotFound(description) if description else NotFound()
+    return _jsonify({"error": "Resource not found", "message": str(error)}, 404)
+
+
+class AsyncExerciseServer(events.EventStreamServer):
+    """
+    The read routes of server.py on asyncio (see the module docstring)
+
+    Args:
+        host, port: Where to listen
+        threads: Size of the pool running file I/O
+        max_connections: Open connections (event streams included) before
+                         new ones get 503
+    """
+
+    def __init__(self, host="0.0.0.0", port=5000, threads=DEFAULT_THREADS, max_connections=MAX_CONNECTIONS):
+        super().__init__(server.EVENTS, host, port, max_connections=max_connections)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix="async-io")
+        self.rate_limiter = None
+        if server.RATE_LIMIT > 0:
+            self.rate_limiter = middleware.TokenBuckets(server.RATE_LIMIT, server.RATE_BURST)
+        self.rate_limit_header = server.RATE_LIMIT_HEADER.lower() if server.RATE_LIMIT_HEADER else None
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    async def _offload(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, partial(function, *args))
+
+    async def _handle(self, reader, writer):
+        if self.connections >= self.max_connections:
+            await self._respond(writer, "503 Service Unavailable", b'{"error": "Too many connections"}')
+            writer.close()
+            return
+        self.connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read(reader, writer), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                if not await self._serve_request(request, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def _read(self, reader, writer):
+        """The next request on the connection, or None when the client is done"""
+        try:
+            request_line = (await reader.readuntil(b"\r\n")).decode("latin-1").split()
+        except asyncio.IncompleteReadError:
+            return None
+        if len(request_line) != 3:
+            return None
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+            if line == "\r\n":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if "transfer-encoding" in headers:
+            return None
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_REQUEST_BODY_BYTES:
+            return None
+        if length:
+            # Read routes only: a body is read and ignored
+            await reader.readexactly(length)
+        method, target, version = request_line
+        return _Request(method, target, version, headers, writer.get_extra_info("peername"), writer)
+
+    async def _serve_request(self, request, writer):
+        """Answer one request; returns whether the connection stays open"""
+        started = time.perf_counter()
+        handler, label = self._route(request)
+        metrics.IN_FLIGHT.inc()
+        try:
+            response = await self._limit(request)
+            if response is None:
+                try:
+                    response = await handler(request)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception:
+                    traceback.print_exc()
+                    response = _jsonify({"error": "Internal server error",
+                                         "message": str(InternalServerError())}, 500)
+            if response is None:
+                # Event stream: the connection was the stream's until it ended
+                return False
+            await self._write(writer, request, response)
+        finally:
+            metrics.IN_FLIGHT.dec()
+            metrics.REQUEST_LATENCY.labels(label, request.method).observe(time.perf_counter() - started)
+        metrics.REQUESTS.labels(label, request.method, str(response.status)).inc()
+        metrics.RESPONSE_BYTES.labels(label).inc(response.content_length or 0)
+        return request.keep_alive
+
+    async def _limit(self, request):
+        """A 429 response when the client is over its rate, else None"""
+        if self.rate_limiter is None or middleware.is_exempt(request.path):
+            return None
+        key = None
+        if self.rate_limit_header:
+            key = middleware.client_address(request.headers.get(self.rate_limit_header, ""),
+                                            server.RATE_LIMIT_TRUSTED_HOPS)
+        if not key:
+            key = request.peer[0] if request.peer else ""
+        wait = self.rate_limiter.take(key)
+        if not wait:
+            return None
+        retry_after, body = middleware.too_many_requests(wait)
+        return _Response(429, body, headers=[("Retry-After", str(retry_after))])
+
+    async def _write(self, writer, request, response):
+        reason = http.HTTPStatus(response.status).phrase
+        head = [f"HTTP/1.1 {response.status} {reason}"]
+        head += [f"{name}: {value}" for name, value in response.headers]
+        if response.status != 304:
+            head.append(f"Content-Length: {response.content_length or 0}")
+        head.append("Connection: keep-alive" if request.keep_alive else "Connection: close")
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+            if request.method == "HEAD":
+                pass
+            elif isinstance(response.body, bytes):
+                writer.write(response.body)
+            else:
+                async for data in response.body:
+                    writer.write(data)
+                    await asyncio.wait_for(writer.drain(), KEEPALIVE_SECONDS)
+            await asyncio.wait_for(writer.drain(), KEEPALIVE_SECONDS)
+        finally:
+            await response.close()
+
+    def _route(self, request):
+        """
+        (handler, route label); labels are server.py's rule templates, so
+        metrics from both servers line up
+        """
+        if request.method not in ("GET", "HEAD"):
+            return self._method_not_allowed, "<unmatched>"
+        path = request.path
+        if path == "/health":
+            return self._health, "/health"
+        if path == "/metrics":
+            return self._metrics, "/metrics"
+
+        course = None
+        label_prefix = ""
+        if path.startswith("/courses/"):
+            course, _, rest = path[len("/courses/"):].partition("/")
+            if not course or not rest:
+                return self._unmatched, "<unmatched>"
+            path = "/" + rest
+            label_prefix = "/courses/<course>"
+            if path == "/health":
+                root = server.COURSES.get(course)
+                if root is None:
+                    return partial(self._unknown_course, course), "/courses/<course>/health"
+                return partial(self._course_health, root), "/courses/<course>/health"
+
+        parts = path.split("/")
+        # ["", "api", ...]
+        if len(parts) < 3 or parts[0] or parts[1] != "api" or not all(parts[2:-1]):
+            return self._unmatched, "<unmatched>"
+        rest = parts[2:]
+        if rest == ["exercises"]:
+            view, rule = self._list_exercises, "/api/exercises"
+        elif rest == ["events"]:
+            view, rule = self._events, "/api/events"
+        elif rest[0] == "exercises" and len(rest) == 3 and rest[2]:
+            view, rule = partial(self._exercise, rest[1], rest[2]), "/api/exercises/<bucket>/<exercise_code>"
+        elif rest[0] == "exercises" and len(rest) == 4 and rest[3] and rest[3] not in ("stats", "submissions"):
+            view = partial(self._exercise_file, rest[1], rest[2], rest[3])
+            rule = "/api/exercises/<bucket>/<exercise_code>/<filename>"
+        elif rest[0] == "exercises" and len(rest) >= 5 and rest[3] == "res" and rest[-1]:
+            view = partial(self._exercise_resource, rest[1], rest[2], "/".join(rest[4:]))
+            rule = "/api/exercises/<bucket>/<exercise_code>/res/<path:filename>"
+        elif rest[0] == "res" and len(rest) >= 2 and rest[-1]:
+            view, rule = partial(self._global_resource, "/".join(rest[1:])), "/api/res/<path:filename>"
+        else:
+            return self._unmatched, "<unmatched>"
+
+        root = server.COURSES.get(course or server.DEFAULT_COURSE)
+        if root is None:
+            return partial(self._unknown_course, course), label_prefix + rule
+        api_prefix = f"/courses/{course}" if course else ""
+        return partial(view, root, api_prefix), label_prefix + rule
+
+    async def _method_not_allowed(self, request):
+        return _jsonify({"error": "Method not allowed on this server"}, 405)
+
+    async def _unmatched(self, request):
+        return _not_found()
+
+    async def _unknown_course(self, course, request):
+        return _not_found(f"Unknown course: {course}")
+
+    async def _health(self, request):
+        status = {name: server._course_health(root) for name, root in server.COURSES.items()}
+        return _jsonify({
+            "status": "ok",
+            "message": "Exercise API is running",
+            **status[server.DEFAULT_COURSE],
+            "courses": status,
+            "grading": server._grading_health(),
+            "in_flight": metrics.IN_FLIGHT.get(),
+        })
+
+    async def _course_health(self, root, request):
+        return _jsonify({
+            "status": "ok",
+            "message": "Exercise API is running",
+            **server._course_health(root),
+            "grading": server._grading_health(),
+            "in_flight": metrics.IN_FLIGHT.get(),
+        })
+
+    async def _metrics(self, request):
+        return _Response(200, metrics.render().encode("utf-8"), mimetype="text/plain; version=0.0.4")
+
+    async def _list_exercises(self, root, api_prefix, request):
+        """server.list_exercises"""
+        if not any(name in request.query for name in server.LISTING_PARAMS):
+            return _jsonify({"buckets": root.catalog.buckets})
+
+        fields = request.arg("fields", "codes")
+        if fields not in ("codes", "summary"):
+            return _jsonify({"error": "fields must be 'codes' or 'summary'"}, 400)
+        try:
+            limit = int(request.arg("limit", DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return _jsonify({"error": "limit must be an integer"}, 400)
+        try:
+            page = root.catalog.page(
+                bucket=request.arg("bucket"),
+                prefix=request.arg("prefix", ""),
+                cursor=request.arg("cursor"),
+                limit=limit,
+                summary=fields == "summary",
+            )
+        except ValueError as e:
+            return _jsonify({"error": str(e)}, 400)
+        return _jsonify(page)
+
+    async def _exercise(self, bucket, exercise_code, root, api_prefix, request):
+        """server.get_exercise, rendered on the pool and shared with concurrent requests"""
+        host = request.headers.get("host") or f"{self.host}:{self.port}"
+        resource_base_url = f"http://{host}{api_prefix}/api/exercises/{bucket}/{exercise_code}/res"
+        include_html = bool(root.catalog.index_file) and request.arg("include") == "html"
+        render = server._render_built_exercise if root.catalog.index_file else server._render_exercise
+        key = (root.catalog.generation, bucket, exercise_code, resource_base_url, include_html)
+        try:
+            body, status = await self._offload(root.payloads.get, key, partial(
+                render, root, bucket, exercise_code, resource_base_url, include_html
+            ))
+        except (OSError, UnicodeDecodeError) as e:
+            return _jsonify({"error": f"Failed to read index.md: {str(e)}"}, 500)
+        return _Response(status, body)
+
+    async def _exercise_file(self, bucket, exercise_code, filename, root, api_prefix, request):
+        return await self._send_file(request, root, root.paths.exercise_file(bucket, exercise_code, filename),
+                                     filename)
+
+    async def _exercise_resource(self, bucket, exercise_code, filename, root, api_prefix, request):
+        return await self._send_file(request, root, root.paths.resource(bucket, exercise_code, filename),
+                                     filename)
+
+    async def _global_resource(self, filename, root, api_prefix, request):
+        return await self._send_file(request, root, root.paths.global_resource(filename), filename)
+
+    async def _send_file(self, request, root, path, filename):
+        """server._send_file / fileserve.send_file_fast, reading on the pool"""
+        if not path:
+            return _not_found()
+        mimetype = server._guess_mimetype(filename)
+        extra = []
+        response = None
+        if root.build_tree:
+            extra.append(("Vary", "Accept-Encoding"))
+            if (path in root.paths.compressed and "range" not in request.headers
+                    and "gzip" in request.headers.get("accept-encoding", "")):
+                response = await self._file_response(request, root.file_cache, path + ".gz", mimetype,
+                                                     extra + [("Content-Encoding", "gzip")])
+        if response is None:
+            response = await self._file_response(request, root.file_cache, path, mimetype, extra)
+        return response or _not_found()
+
+    async def _file_response(self, request, cache, path, mimetype, extra):
+        entry = await self._offload(cache.acquire, path)
+        if entry is None:
+            return None
+        headers = [
+            ("Accept-Ranges", "bytes"),
+            ("ETag", entry.etag),
+            ("Last-Modified", http_date(entry.mtime)),
+        ] + extra
+
+        if not_modified(entry, parse_etags(request.headers.get("if-none-match")),
+                        parse_date(request.headers.get("if-modified-since"))):
+            cache.release(entry)
+            # Without entity headers, as werkzeug sends it
+            return _Response(304, mimetype=None, headers=[
+                (name, value) for name, value in headers
+                if not name.startswith("Content-") and name != "Last-Modified"
+            ])
+
+        byte_range = requested_range(entry, parse_range_header(request.headers.get("range")),
+                                     parse_if_range_header(request.headers.get("if-range")))
+        if byte_range is False:
+            cache.release(entry)
+            return _Response(416, mimetype="text/html", headers=headers + [("Content-Range", f"bytes */{entry.size}")])
+        if byte_range is None:
+            status, (start, stop) = 200, (0, entry.size)
+        else:
+            status, (start, stop) = 206, byte_range
+            headers.append(("Content-Range", f"bytes {start}-{stop - 1}/{entry.size}"))
+        return _Response(status, self._read_file(entry, start, stop), mimetype=mimetype,
+                         headers=headers, content_length=stop - start,
+                         on_close=lambda: cache.release(entry))
+
+    async def _read_file(self, entry, start, stop):
+        """
+        The bytes [start, stop) of a cached descriptor, read with pread on the
+        pool; the response releases the entry
+        """
+        position = start
+        while position < stop:
+            data = await self._offload(os.pread, entry.fd, min(BLOCK_SIZE, stop - position), position)
+            if not data:
+                return
+            position += len(data)
+            yield data
+
+    async def _events(self, root, api_prefix, request):
+        """server.stream_events, served directly"""
+        last_id = request.headers.get("last-event-id") or request.arg("last_event_id")
+        await self._stream(request.writer, last_id, set(request.query.get("exercise", [])), root.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Exercise API's read routes on asyncio")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help=f"threads for file I/O (default: {DEFAULT_THREADS})")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help=f"open connections before new ones get 503 (default: {MAX_CONNECTIONS})")
+    parser.add_argument("--no-watch", dest="watch", action="store_false",
+                        help="don't rescan when exercise content changes")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="content polling interval in seconds (default: 2)")
+    args = parser.parse_args()
+
+    if args.watch:
+        server.start_watchers(server.on_content_change, interval=args.watch_interval)
+    print(f"Serving the Exercise API (read routes) on http://{args.host}:{args.port}")
+    try:
+        AsyncExerciseServer(args.host, args.port, args.threads, args.max_connections).serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+How many concurrent slow or idle connections a running Exercise API sustains
+
+At each level, that many clients connect at once and then:
+
+- slow: send a request's first line, hold it for --hold seconds (a lab
+  machine on a bad network), then finish it and read the response
+- idle: make a request, then keep the connection open for --hold seconds
+  before making another one on it
+
+Meanwhile a probe client requests --probe-path once every 100 ms on a fresh
+connection. A level is sustained when every client got its responses and the
+probe's p99 latency stayed under --max-latency. Run it against
+`python server.py`, `python serve.py` and `python async_server.py` in turn.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from benchmarks.loadtest import percentile
+except ImportError:
+    # Run as a script (python benchmarks/connections.py)
+    from loadtest import percentile
+
+
+async def _read_response(reader):
+    """Status code of one response, its body read (Content-Length framing)"""
+    status_line = await reader.readuntil(b"\r\n")
+    status = int(status_line.split()[1])
+    length = 0
+    while True:
+        line = await reader.readuntil(b"\r\n")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    if length:
+        await reader.readexactly(length)
+    return status
+
+
+async def _client(host, port, path, mode, hold, timeout):
+    """One client; returns True if all of its requests were answered with 2xx"""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n".encode("latin-1")
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        if mode == "slow":
+            writer.write(request)
+            await writer.drain()
+            await asyncio.sleep(hold)
+            writer.write(b"\r\n")
+            statuses = [await asyncio.wait_for(_read_response(reader), timeout)]
+        else:
+            writer.write(request + b"\r\n")
+            statuses = [await asyncio.wait_for(_read_response(reader), timeout)]
+            await asyncio.sleep(hold)
+            writer.write(request + b"\r\n")
+            statuses.append(await asyncio.wait_for(_read_response(reader), timeout))
+        return all(200 <= status < 300 for status in statuses)
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+        return False
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def _probe(host, port, path, stop, latencies, timeout):
+    while not stop.is_set():
+        started = time.perf_counter()
+        ok = await _client(host, port, path, "slow", 0, timeout)
+        latencies.append(time.perf_counter() - started if ok else float("inf"))
+        await asyncio.sleep(0.1)
+
+
+async def run_level(url, path, probe_path, connections, mode, hold, timeout):
+    """
+    Returns:
+        {"connections", "ok", "failed", "probe_ms": {"p50", "p99"}, "probe_failures"}
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or "127.0.0.1"
+    port = parts.port or 80
+    stop = asyncio.Event()
+    latencies = []
+    probe = asyncio.ensure_future(_probe(host, port, probe_path, stop, latencies, timeout))
+    results = await asyncio.gather(*[
+        _client(host, port, path, mode, hold, timeout + hold) for _ in range(connections)
+    ])
+    stop.set()
+    await probe
+
+    answered = sorted(value for value in latencies if value != float("inf"))
+    return {
+        "connections": connections,
+        "ok": sum(results),
+        "failed": connections - sum(results),
+        "probe_requests": len(latencies),
+        "probe_failures": len(latencies) - len(answered),
+        "probe_ms": {
+            "p50": round(percentile(answered, 50) * 1000, 1),
+            "p99": round(percentile(answered, 99) * 1000, 1),
+        },
+    }
+
+
+def _raise_file_limit():
+    """Allow as many sockets as the hard limit permits"""
+    if resource is None:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Find how many slow/idle connections a server sustains")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", default="/api/exercises", help="what the clients request")
+    parser.add_argument("--probe-path", default="/health")
+    parser.add_argument("--mode", choices=("slow", "idle"), default="slow")
+    parser.add_argument("--levels", default="50,100,250,500,1000,2000",
+                        help="comma-separated connection counts (default: 50,...,2000)")
+    parser.add_argument("--hold", type=float, default=5.0,
+                        help="seconds each client keeps its connection busy or idle (default: 5)")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="seconds to wait for a connection or response (default: 10)")
+    parser.add_argument("--max-latency", type=float, default=1.0,
+                        help="probe p99 (seconds) above which a level counts as not sustained (default: 1)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    _raise_file_limit()
+    levels = [int(value) for value in args.levels.split(",")]
+    results = []
+    sustained = 0
+    for connections in levels:
+        level = asyncio.run(run_level(args.url, args.path, args.probe_path, connections,
+                                      args.mode, args.hold, args.timeout))
+        level["sustained"] = (level["failed"] == 0 and level["probe_failures"] == 0
+                              and level["probe_ms"]["p99"] <= args.max_latency * 1000)
+        results.append(level)
+        if not args.json:
+            print(f"{connections:>6} {args.mode} connections: {level['ok']} ok, {level['failed']} failed; "
+                  f"probe p50 {level['probe_ms']['p50']}ms p99 {level['probe_ms']['p99']}ms, "
+                  f"{level['probe_failures']} probe failures"
+                  + ("" if level["sustained"] else "  <- not sustained"))
+        if not level["sustained"]:
+            break
+        sustained = connections
+
+    if args.json:
+        print(json.dumps({"url": args.url, "mode": args.mode, "hold": args.hold,
+                          "sustained": sustained, "levels": results}, indent=2))
+    else:
+        print(f"Sustained: {sustained} concurrent {args.mode} connections")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Local HTTP load test for the Exercise API
+Hammers one or more endpoints with keep-alive connections and reports throughput
+"""
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _client_loop(host, port, paths, deadline, latencies, errors):
+    """One client: a single keep-alive connection cycling through paths"""
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors.append(response.status)
+            latencies.append(time.perf_counter() - start)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+    conn.close()
+
+
+def run_load(url, paths, concurrency=16, duration=10.0):
+    """
+    Run the load test and return a summary dict
+
+    Returns:
+        {"requests": N, "errors": N, "rps": float,
+         "latency_ms": {"p50": ..., "p90": ..., "p99": ..., "max": ...}}
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or "127.0.0.1"
+    port = parts.port or 80
+
+    deadline = time.perf_counter() + duration
+    # list.append is atomic, so clients share these without a lock
+    latencies = []
+    errors = []
+
+    threads = [
+        threading.Thread(target=_client_loop, args=(host, port, paths, deadline, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "url": url,
+        "paths": paths,
+        "concurrency": concurrency,
+        "duration": round(elapsed, 3),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            name: round(percentile(latencies, pct) * 1000, 3)
+            for name, pct in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+        },
+    }
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Load test a running Exercise API server")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", action="append", dest="paths",
+                        help="endpoint to request (repeatable, default: /api/exercises)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = run_load(args.url, args.paths or ["/api/exercises"], args.concurrency, args.duration)
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    latency = summary["latency_ms"]
+    print(f"{summary['requests']} requests in {summary['duration']}s "
+          f"({summary['concurrency']} clients), {summary['errors']} errors")
+    print(f"Throughput: {summary['rps']} req/s")
+    print(f"Latency: p50 {latency['p50']}ms  p90 {latency['p90']}ms  "
+          f"p99 {latency['p99']}ms  max {latency['max']}ms")
+
+
+if __name__ == "__main__":
+    main()
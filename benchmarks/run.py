@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the Exercise API and grading paths
+
+Generates a synthetic content tree, micro-benchmarks the hot functions,
+drives the HTTP endpoints with concurrent clients and writes a JSON report.
+With a stored baseline it exits non-zero when something regressed.
+
+Usage (from the repository root):
+    python -m benchmarks.run                       # full run, compare to baseline
+    python -m benchmarks.run --quick               # small tree, short runs
+    python -m benchmarks.run --save-baseline       # store results as the new baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import synthetic
+from benchmarks.loadtest import percentile, run_load
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNNER_DIR = os.path.join(REPO_DIR, "course_checker", "tests")
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+
+
+def summarize(samples):
+    """Percentile summary of a list of durations in seconds, reported in ms"""
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean": round(sum(samples) / len(samples) * 1000, 4),
+        "p50": round(percentile(samples, 50) * 1000, 4),
+        "p90": round(percentile(samples, 90) * 1000, 4),
+        "p99": round(percentile(samples, 99) * 1000, 4),
+        "max": round(samples[-1] * 1000, 4),
+    }
+
+
+def time_calls(fn, runs, warmup=3):
+    """Call fn() runs times and return the summary of the durations"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def bench_markdown_rewrite(server, runs):
+    """server.process_markdown_resources on a large document"""
+    markdown = synthetic.make_markdown(200)
+    base_url = "http://127.0.0.1:5000/api/exercises/bucket000/EX0000/res"
+    return {
+        "markdown_rewrite": time_calls(
+            lambda: server.process_markdown_resources(markdown, base_url, True), runs
+        )
+    }
+
+
+def bench_rendering(runs):
+    """Markdown conversion and HTML sanitizing (ExerciseView's renderer)"""
+    from build import load_rendering
+
+    rendering = load_rendering()
+    if rendering.Markdown is None:
+        return {"markdown_convert": {"skipped": "markdown2 not installed"}}
+
+    converter = rendering.create_converter()
+    markdown = synthetic.make_markdown(200)
+    html = converter.convert(markdown)
+    # Event handlers and scripts so the sanitizer has work to do
+    html = html.replace("<p>", '<p onclick="alert(1)">') + "<script>alert(1)</script>" * 50
+
+    return {
+        "markdown_convert": time_calls(lambda: converter.convert(markdown), runs),
+        "sanitize_html": time_calls(lambda: rendering.sanitize_html(html), runs),
+    }
+
+
+def bench_test_runner(scratch, runs, count):
+    """TestRunner.run_all_tests on a large tests.toml"""
+    if RUNNER_DIR not in sys.path:
+        sys.path.insert(0, RUNNER_DIR)
+    from test_runner import TestRunner
+
+    code_file, test_file = synthetic.build_large_suite(os.path.join(scratch, "suite"), count)
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            TestRunner(code_file, test_file).run_all_tests()
+
+    return {f"test_runner_{count}": time_calls(run, runs, warmup=1)}
+
+
+@contextlib.contextmanager
+def running_server(app):
+    """Serve app on a free local port in a background thread"""
+    from werkzeug.serving import make_server
+
+    httpd = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_port}"
+    finally:
+        httpd.shutdown()
+
+
+def bench_http(server, tree, concurrency, duration):
+    """Drive the main endpoints with concurrent keep-alive clients"""
+    rng = random.Random(1)
+    exercises = rng.sample(tree["exercises"], min(200, len(tree["exercises"])))
+    resources = rng.sample(tree["resources"], min(200, len(tree["resources"])))
+
+    scenarios = {
+        "http_health": ["/health"],
+        "http_list": ["/api/exercises"],
+        "http_exercise": [f"/api/exercises/{b}/{c}" for b, c in exercises],
+        "http_resource": [f"/api/exercises/{b}/{c}/res/{name}" for b, c, name in resources],
+        "http_global_resource": ["/api/res/shared_0.png", "/api/res/shared_1.png"],
+    }
+
+    results = {}
+    with running_server(server.app) as url:
+        for name, paths in scenarios.items():
+            summary = run_load(url, paths, concurrency, duration)
+            results[name] = dict(
+                runs=summary["requests"],
+                errors=summary["errors"],
+                rps=summary["rps"],
+                **summary["latency_ms"],
+            )
+    return results
+
+
+def compare(results, baseline, threshold, metric):
+    """
+    Compare results against a baseline
+
+    Returns:
+        list of human-readable regression descriptions (empty if none)
+    """
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        base = baseline.get("benchmarks", {}).get(name)
+        if not base or "skipped" in base or "skipped" in current:
+            continue
+        if base.get(metric) and current[metric] > base[metric] * (1 + threshold):
+            regressions.append(
+                f"{name}: {metric} {current[metric]}ms vs baseline {base[metric]}ms "
+                f"(+{(current[metric] / base[metric] - 1) * 100:.1f}%)"
+            )
+        if base.get("rps") and current.get("rps", 0) < base["rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: {current['rps']} req/s vs baseline {base['rps']} req/s"
+            )
+    return regressions
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Run the Exercise API benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="small tree and short runs")
+    parser.add_argument("--buckets", type=int, default=20)
+    parser.add_argument("--exercises", type=int, default=100, help="exercises per bucket")
+    parser.add_argument("--runs", type=int, default=200, help="samples per micro-benchmark")
+    parser.add_argument("--tests", type=int, default=5000, help="tests in the large tests.toml")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per HTTP scenario")
+    parser.add_argument("--output", default="bench_output.json")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown before failing (default: 0.25 = 25%%)")
+    parser.add_argument("--metric", default="p50", choices=["p50", "p90", "p99", "mean"])
+    args = parser.parse_args()
+
+    if args.quick:
+        args.buckets, args.exercises = 4, 25
+        args.runs, args.tests, args.duration = 30, 500, 1.0
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    scratch = tempfile.mkdtemp(prefix="exercise-bench-")
+    benchmarks = {}
+
+    try:
+        print(f"Generating {args.buckets * args.exercises} exercises in {scratch}")
+        tree = synthetic.build_tree(scratch, buckets=args.buckets, exercises=args.exercises)
+
+        print("Benchmarking TestRunner...")
+        benchmarks.update(bench_test_runner(scratch, max(5, args.runs // 20), args.tests))
+
+        print("Benchmarking rendering...")
+        benchmarks.update(bench_rendering(args.runs))
+
+        # server.py resolves its directories relative to the working directory;
+        # all benchmark clients share one address, so no rate limiting
+        os.chdir(scratch)
+        os.environ.setdefault("EXERCISE_RATE_LIMIT", "0")
+        try:
+            import server
+        except ImportError as e:
+            print(f"Skipping server benchmarks: {e}")
+            benchmarks["server"] = {"skipped": str(e)}
+        else:
+            print("Benchmarking markdown resource rewrite...")
+            benchmarks.update(bench_markdown_rewrite(server, args.runs))
+            print("Benchmarking HTTP endpoints...")
+            benchmarks.update(bench_http(server, tree, args.concurrency, args.duration))
+        finally:
+            os.chdir(REPO_DIR)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "exercises": args.buckets * args.exercises,
+            "concurrency": args.concurrency,
+        },
+        "benchmarks": benchmarks,
+    }
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    for name, summary in benchmarks.items():
+        if "skipped" in summary:
+            print(f"  {name:<24} skipped ({summary['skipped']})")
+        else:
+            rps = f"  {summary['rps']} req/s" if "rps" in summary else ""
+            print(f"  {name:<24} p50 {summary['p50']}ms  p99 {summary['p99']}ms{rps}")
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print("No baseline found - run with --save-baseline to create one")
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold, args.metric)
+    if regressions:
+        print(f"\nREGRESSIONS (threshold {args.threshold * 100:.0f}%):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
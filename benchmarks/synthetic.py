@@ -0,0 +1,109 @@
+"""
+Synthetic content trees for benchmarks
+Builds a serverstr/ + res/ layout of arbitrary size in a scratch directory
+"""
+import os
+import random
+
+
+MARKDOWN_SECTION = """
+## Part {n}
+
+Write a function `solve_{n}(values)` that returns the sum of `values`.
+See the diagram ![diagram](res/figure_{n}.png) and the
+<img class="wide" src="res/photo_{n}.jpg"> reference photo.
+
+```python
+def solve_{n}(values):
+    return sum(values)
+```
+
+| input | output |
+|-------|--------|
+| [1, 2] | 3 |
+| [] | 0 |
+
+Extra reading: res/notes_{n}.txt and https://docs.python.org/3/
+"""
+
+
+def make_markdown(sections):
+    """Markdown document with the given number of sections"""
+    parts = ["# Synthetic exercise\n\nGenerated for benchmarking.\n"]
+    parts.extend(MARKDOWN_SECTION.format(n=n) for n in range(sections))
+    return "".join(parts)
+
+
+def make_tests_toml(count, function="add"):
+    """tests.toml with count function tests"""
+    rng = random.Random(count)
+    lines = []
+    for i in range(count):
+        a, b = rng.randint(-1000, 1000), rng.randint(-1000, 1000)
+        lines.append(
+            f'[[test]]\ndescription = "case {i}"\nfunction = "{function}"\n'
+            f'args = [{a}, {b}]\nreturns = {a + b}\n'
+        )
+    return "\n".join(lines)
+
+
+SOLUTION = '''def add(a, b):
+    return a + b
+'''
+
+
+def _write(path, content, mode="w"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(content)
+
+
+def build_tree(root, buckets=20, exercises=100, sections=20, resources=5,
+               resource_size=64 * 1024, global_resources=20):
+    """
+    Create root/serverstr/<bucket>/<code>/ and root/res/
+
+    Returns:
+        {"root": root, "exercises": [(bucket, code), ...],
+         "resources": [(bucket, code, filename), ...]}
+    """
+    rng = random.Random(0)
+    markdown = make_markdown(sections)
+    tests = make_tests_toml(20)
+    blob = bytes(rng.getrandbits(8) for _ in range(min(resource_size, 4096)))
+    blob = (blob * (resource_size // len(blob) + 1))[:resource_size]
+
+    listing = []
+    resource_list = []
+    for b in range(buckets):
+        bucket = f"bucket{b:03d}"
+        for e in range(exercises):
+            code = f"EX{e:04d}"
+            exercise_dir = os.path.join(root, "serverstr", bucket, code)
+            _write(os.path.join(exercise_dir, "index.md"), markdown)
+            _write(os.path.join(exercise_dir, "tests.toml"), tests)
+            _write(os.path.join(exercise_dir, "solution.py"), SOLUTION)
+            for r in range(resources):
+                name = f"figure_{r}.png"
+                _write(os.path.join(exercise_dir, "res", name), blob, "wb")
+                resource_list.append((bucket, code, name))
+            listing.append((bucket, code))
+
+    for r in range(global_resources):
+        _write(os.path.join(root, "res", f"shared_{r}.png"), blob, "wb")
+
+    return {"root": root, "exercises": listing, "resources": resource_list}
+
+
+def build_large_suite(directory, count):
+    """
+    Write solution.py and a tests.toml with count tests into directory
+
+    Returns:
+        (code_file, test_file)
+    """
+    code_file = os.path.join(directory, "solution.py")
+    test_file = os.path.join(directory, "tests.toml")
+    _write(code_file, SOLUTION)
+    _write(test_file, make_tests_toml(count))
+    return code_file, test_file
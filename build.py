@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Offline exercise build
+
+Compiles the exercise trees into a versioned, read-only build directory:
+
+    build/
+        current -> 20260101-120000-1a2b3c4d
+        20260101-120000-1a2b3c4d/
+            manifest.json                  inputs, outputs and hashes (for incremental builds)
+            server/                        from serverstr/ (+ global res/)
+                catalog.json (+ .gz)       buckets and per-exercise metadata
+                search.json                full-text index (see search.py)
+                exercises/<bucket>/<code>/
+                    index.md (+ .gz)       markdown, resource links pointing at RESOURCE_PLACEHOLDER
+                    index.html (+ .gz)     sanitized HTML fragment, same placeholder
+                    tests.json (+ .gz)     tests.toml parsed once
+                    ...                    original files (hard links when possible)
+                res/                       global resources
+            plugin/                        from course_checker/bucket/, same layout
+
+Only exercises whose files changed since the previous build (mtime/size,
+then sha256) are rebuilt, in parallel; unchanged ones are hard-linked
+from the previous build. `current` is switched atomically at the end, so
+a server reading build/current (EXERCISE_BUILD_DIR) never sees a
+half-written build.
+
+Usage:
+    python build.py                      # build into ./build
+    python build.py --output /srv/build --workers 8
+    python build.py --full               # ignore the previous build
+"""
+import argparse
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib
+
+from catalog import extract_title, scan_exercises
+from markdown_resources import process_markdown_resources
+import search
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# By path, like rendering.py below: a top-level "datasets" could be an
+# installed package
+_datasets_spec = importlib.util.spec_from_file_location(
+    'course_checker_datasets', os.path.join(REPO_DIR, 'course_checker', 'tests', 'datasets.py'))
+datasets = importlib.util.module_from_spec(_datasets_spec)
+_datasets_spec.loader.exec_module(datasets)
+RENDERING_FILE = os.path.join(REPO_DIR, 'course_checker', 'rendering.py')
+TOOLCHAIN_FILES = (RENDERING_FILE, os.path.join(REPO_DIR, 'markdown_resources.py'))
+
+# Bump when the layout or the content of generated files changes
+BUILD_FORMAT = 1
+
+# Substituted with the request's resource base URL when serving
+RESOURCE_PLACEHOLDER = '{{RESOURCE_BASE_URL}}'
+
+# Generated files that get a .gz sibling (only if it is actually smaller)
+COMPRESSED_FILES = ('index.md', 'index.html', 'tests.json', 'tests.toml', 'solution.py', 'catalog.json')
+GZIP_MIN_SIZE = 512
+
+DEFAULT_SOURCES = {
+    'server': (os.path.join(REPO_DIR, 'serverstr'), os.path.join(REPO_DIR, 'res')),
+    'plugin': (os.path.join(REPO_DIR, 'course_checker', 'bucket'), None),
+}
+
+
+def load_rendering():
+    """
+    Load course_checker/rendering.py without importing the plugin package
+    (its __init__ needs Thonny)
+    """
+    spec = importlib.util.spec_from_file_location('course_checker_rendering', RENDERING_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def list_files(root):
+    """Relative paths of the files below root, skipping hidden and cache directories"""
+    files = []
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names[:] = sorted(d for d in dir_names if not d.startswith('.') and d != '__pycache__')
+        for name in sorted(file_names):
+            if not name.startswith('.'):
+                files.append(os.path.relpath(os.path.join(dir_path, name), root).replace(os.sep, '/'))
+    return files
+
+
+def fingerprint(root, previous=None):
+    """
+    {relpath: [mtime_ns, size, sha256]} for the files below root
+
+    Hashes are reused from previous when mtime and size are unchanged.
+    """
+    previous = previous or {}
+    result = {}
+    for rel in list_files(root):
+        st = os.stat(os.path.join(root, rel))
+        old = previous.get(rel)
+        if old and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            result[rel] = old
+        else:
+            result[rel] = [st.st_mtime_ns, st.st_size, file_sha256(os.path.join(root, rel))]
+    return result
+
+
+def same_content(a, b):
+    """True if two fingerprints describe the same files (hashes, not mtimes)"""
+    if a.keys() != b.keys():
+        return False
+    return all(a[rel][1:] == b[rel][1:] for rel in a)
+
+
+def copy_file(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copy2(source, target)
+
+
+def link_or_copy(source, target):
+    """
+    Hard link a file from the previous build (builds are never modified,
+    unlike source files, which editors may rewrite in place)
+    """
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def write_gzip(path):
+    """Write path + '.gz' if compression pays off"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < GZIP_MIN_SIZE:
+        return False
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(compressed) >= len(data):
+        return False
+    write_file(path + '.gz', compressed)
+    return True
+
+
+# Rendering module and converter, created once per worker process
+_rendering = None
+_converter = None
+
+
+def build_exercise(task):
+    """
+    Build one exercise directory (runs in a worker process)
+
+    Args:
+        task: (source_dir, target_dir, inputs fingerprint)
+    Returns:
+        catalog entry for the exercise
+    """
+    global _rendering, _converter
+    source_dir, target_dir, inputs = task
+
+    for rel in inputs:
+        copy_file(os.path.join(source_dir, rel), os.path.join(target_dir, rel))
+
+    with open(os.path.join(source_dir, 'index.md'), 'r', encoding='utf-8') as f:
+        markdown_content = f.read()
+
+    has_local_res = any(rel.startswith('res/') for rel in inputs)
+    # The server's rewrite, with a placeholder in place of the per-request URL
+    processed = process_markdown_resources(markdown_content, RESOURCE_PLACEHOLDER, has_local_res)
+    # index.md in the build is the processed version
+    write_file(os.path.join(target_dir, 'index.md'), processed.encode('utf-8'))
+
+    has_html = False
+    if _rendering is None:
+        _rendering = load_rendering()
+        if _rendering.Markdown is not None:
+            _converter = _rendering.create_converter()
+    if _converter is not None:
+        html = _rendering.render_fragment(processed, _converter)
+        write_file(os.path.join(target_dir, 'index.html'), html.encode('utf-8'))
+        has_html = True
+
+    tests_error = None
+    if 'tests.toml' in inputs:
+        try:
+            with open(os.path.join(source_dir, 'tests.toml'), 'rb') as f:
+                suite = tomllib.load(f)
+        except tomllib.TOMLDecodeError as e:
+            tests_error = str(e)
+        else:
+            write_file(os.path.join(target_dir, 'tests.json'),
+                       json.dumps(suite, default=str, ensure_ascii=False).encode('utf-8'))
+            if datasets.np is not None:
+                # Columns land in .datasets/ next to the CSV, as the server would do lazily
+                for spec in suite.get('dataset', []):
+                    try:
+                        datasets.ensure_dataset(target_dir, spec)
+                    except (datasets.DatasetError, OSError) as e:
+                        tests_error = f"dataset {spec.get('name')}: {e}"
+
+    for name in COMPRESSED_FILES:
+        path = os.path.join(target_dir, name)
+        if os.path.isfile(path):
+            write_gzip(path)
+
+    files = [rel for rel in inputs if '/' not in rel]
+    return {
+        'title': extract_title(markdown_content),
+        'has_tests': 'tests.toml' in inputs,
+        'has_solution': 'solution.py' in inputs,
+        'has_local_resources': has_local_res,
+        'has_html': has_html,
+        'tests_error': tests_error,
+        'files': files,
+        'inputs': inputs,
+    }
+
+
+def build_tree(name, source_dir, global_res_dir, target_root, previous_root, previous, pool):
+    """
+    Build one source tree into target_root/name
+
+    Returns:
+        (catalog, stats)
+    """
+    target = os.path.join(target_root, name)
+    previous_tree = os.path.join(previous_root, name) if previous_root else None
+    previous_entries = previous.get('exercises', {}) if previous else {}
+
+    buckets = scan_exercises(source_dir) if os.path.isdir(source_dir) else {}
+    os.makedirs(os.path.join(target, 'exercises'), exist_ok=True)
+    os.makedirs(os.path.join(target, 'res'), exist_ok=True)
+    entries = {}
+    tasks = {}
+    reused = 0
+    for bucket, codes in buckets.items():
+        for code in codes:
+            key = f'{bucket}/{code}'
+            source = os.path.join(source_dir, bucket, code)
+            old = previous_entries.get(key)
+            inputs = fingerprint(source, old['inputs'] if old else None)
+            old_dir = os.path.join(previous_tree, 'exercises', bucket, code) if previous_tree else None
+            if old and same_content(inputs, old['inputs']) and os.path.isdir(old_dir):
+                # Unchanged: hard-link the previous outputs
+                shutil.copytree(old_dir, os.path.join(target, 'exercises', bucket, code),
+                                copy_function=link_or_copy)
+                entries[key] = dict(old, inputs=inputs)
+                reused += 1
+            else:
+                tasks[key] = (source, os.path.join(target, 'exercises', bucket, code), inputs)
+
+    if pool is not None and len(tasks) > 1:
+        results = pool.map(build_exercise, tasks.values())
+    else:
+        results = map(build_exercise, tasks.values())
+    entries.update(zip(tasks, results))
+
+    resources = {}
+    if global_res_dir and os.path.isdir(global_res_dir):
+        old_resources = previous.get('resources', {}) if previous else {}
+        resources = fingerprint(global_res_dir, old_resources)
+        for rel, entry in resources.items():
+            old = old_resources.get(rel)
+            if old and old[1:] == entry[1:]:
+                link_or_copy(os.path.join(previous_tree, 'res', rel), os.path.join(target, 'res', rel))
+            else:
+                copy_file(os.path.join(global_res_dir, rel), os.path.join(target, 'res', rel))
+
+    catalog = {
+        'buckets': buckets,
+        'exercises': {
+            key: {k: v for k, v in entry.items() if k != 'inputs'}
+            for key, entry in sorted(entries.items())
+        },
+    }
+    catalog_path = os.path.join(target, 'catalog.json')
+    write_file(catalog_path, json.dumps(catalog, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    write_gzip(catalog_path)
+    # Tokenizing is cheap next to rendering, so the index is always rebuilt whole
+    search.build_index(os.path.join(target, 'exercises'), buckets).save(os.path.join(target, 'search.json'))
+
+    stats = {'exercises': len(entries), 'rebuilt': len(tasks), 'reused': reused}
+    return {'exercises': entries, 'resources': resources}, stats
+
+
+def hash_outputs(build_dir, previous=None):
+    """
+    {relpath: {"sha256", "size", "mtime_ns"}} for every file in the build
+
+    Hard-linked files keep their mtime, so hashes of unchanged outputs
+    are taken from the previous manifest.
+    """
+    previous = previous or {}
+    files = {}
+    for rel in list_files(build_dir):
+        if rel == 'manifest.json':
+            continue
+        st = os.stat(os.path.join(build_dir, rel))
+        old = previous.get(rel)
+        if old and old.get('mtime_ns') == st.st_mtime_ns and old['size'] == st.st_size:
+            files[rel] = old
+        else:
+            files[rel] = {'sha256': file_sha256(os.path.join(build_dir, rel)),
+                          'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    return files
+
+
+def read_manifest(build_dir):
+    try:
+        with open(os.path.join(build_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def switch_current(output_dir, build_id):
+    """Point output_dir/current at build_id atomically"""
+    link = os.path.join(output_dir, 'current')
+    tmp_link = f'{link}.{os.getpid()}.tmp'
+    os.symlink(build_id, tmp_link)
+    os.replace(tmp_link, link)
+
+
+def prune(output_dir, keep):
+    """Remove all but the newest `keep` builds (never the current one)"""
+    current = os.path.realpath(os.path.join(output_dir, 'current'))
+    builds = sorted(
+        entry.path for entry in os.scandir(output_dir)
+        if entry.is_dir(follow_symlinks=False) and os.path.isfile(os.path.join(entry.path, 'manifest.json'))
+    )
+    for path in builds[:-keep] if keep > 0 else []:
+        if os.path.realpath(path) != current:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build(output_dir, sources=None, workers=None, full=False, keep=3):
+    """
+    Run a build
+
+    Args:
+        output_dir: directory holding the versioned builds and `current`
+        sources: {name: (exercise_root, global_res_dir or None)}
+        workers: worker processes (default: CPU count)
+        full: ignore the previous build
+        keep: number of builds to keep
+    Returns:
+        (build_dir, stats)
+    """
+    sources = sources or DEFAULT_SOURCES
+    os.makedirs(output_dir, exist_ok=True)
+
+    # New renderer or resource rewrite: everything must be regenerated
+    toolchain = hashlib.sha256()
+    for path in TOOLCHAIN_FILES:
+        with open(path, 'rb') as f:
+            toolchain.update(f.read())
+    toolchain = toolchain.hexdigest()
+
+    previous_root = os.path.join(output_dir, 'current')
+    previous = None if full else read_manifest(previous_root)
+    if previous and (previous.get('format') != BUILD_FORMAT or previous.get('toolchain') != toolchain):
+        previous = None
+
+    build_id = time.strftime('%Y%m%d-%H%M%S') + '-' + os.urandom(4).hex()
+    build_dir = os.path.join(output_dir, build_id)
+    tmp_dir = build_dir + '.tmp'
+    os.makedirs(tmp_dir)
+
+    manifest = {'format': BUILD_FORMAT, 'toolchain': toolchain, 'build_id': build_id,
+                'created': time.time(), 'trees': {}}
+    stats = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 else None
+    try:
+        for name, (source_dir, global_res_dir) in sources.items():
+            previous_tree = previous['trees'].get(name) if previous else None
+            tree, stats[name] = build_tree(
+                name, os.path.abspath(source_dir), global_res_dir, tmp_dir,
+                previous_root if previous_tree else None, previous_tree, pool,
+            )
+            manifest['trees'][name] = dict(tree, source=os.path.abspath(source_dir))
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    manifest['files'] = hash_outputs(tmp_dir, previous['files'] if previous else None)
+    write_file(os.path.join(tmp_dir, 'manifest.json'),
+               json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    os.rename(tmp_dir, build_dir)
+    switch_current(output_dir, build_id)
+    prune(output_dir, keep)
+    return build_dir, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-build exercise artifacts for the server and plugin')
+    parser.add_argument('--output', default=os.path.join(REPO_DIR, 'build'),
+                        help='Build directory (default: ./build)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Worker processes (default: CPU count, 1 = no pool)')
+    parser.add_argument('--server-dir', default=DEFAULT_SOURCES['server'][0],
+                        help='Server exercise tree (default: ./serverstr)')
+    parser.add_argument('--res-dir', default=DEFAULT_SOURCES['server'][1],
+                        help='Global resources (default: ./res)')
+    parser.add_argument('--plugin-dir', default=DEFAULT_SOURCES['plugin'][0],
+                        help='Plugin exercise tree (default: ./course_checker/bucket)')
+    parser.add_argument('--full', action='store_true', help='Rebuild everything')
+    parser.add_argument('--keep', type=int, default=3, help='Builds to keep (default: 3)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    sources = {
+        'server': (args.server_dir, args.res_dir),
+        'plugin': (args.plugin_dir, None),
+    }
+    build_dir, stats = build(args.output, sources, workers=args.workers, full=args.full, keep=args.keep)
+    elapsed = time.perf_counter() - started
+
+    print(f"Build: {build_dir}")
+    for name, tree_stats in stats.items():
+        print(f"  {name}: {tree_stats['exercises']} exercise(s), "
+              f"{tree_stats['rebuilt']} rebuilt, {tree_stats['reused']} unchanged")
+    print(f"Done in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
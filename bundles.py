@@ -0,0 +1,232 @@
+"""
+Exercise bundles with chunk-level deduplication
+
+Files are split into content-defined chunks with a gear rolling hash
+(boundaries depend on the bytes around them, not on offsets), so an edit
+only changes the chunks it touches and inserted bytes don't shift every
+chunk after them. Synchronizing a bucket (a course) takes two requests:
+
+1. POST /api/bundles/<bucket>/sync with the files the client holds
+   ({path: sha256}) -> the chunk lists of new and changed files, and the
+   removed paths
+2. POST /api/chunks with the ids of chunks the client can't assemble from
+   its own files -> those chunks, concatenated
+
+Manifests are cached per file on (mtime, size), so after the first sync
+only changed files are read and chunked again.
+"""
+import hashlib
+import os
+import random
+import threading
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Chunk sizes: boundaries where the top CUT_BITS bits of the hash are zero
+# give ~8 KiB between MIN_CHUNK and MAX_CHUNK
+MIN_CHUNK = 2 * 1024
+MAX_CHUNK = 64 * 1024
+CUT_BITS = 13
+CUT_MASK = ((1 << CUT_BITS) - 1) << (32 - CUT_BITS)
+# Chunk id: leading hex digits of the chunk's sha256
+CHUNK_ID_LENGTH = 32
+# Bytes hashed per numpy pass (bounds temporary memory)
+BLOCK_SIZE = 8 * 1024 * 1024
+
+# Served with the content but not part of it: build outputs (build.py)
+# and local caches
+DERIVED_FILES = ('index.html', 'tests.json')
+SKIPPED_DIRS = ('__pycache__',)
+
+# 256 random 32-bit values, fixed so every process chunks identically
+_rng = random.Random(0x9E3779B9)
+GEAR = [_rng.getrandbits(32) for _ in range(256)]
+del _rng
+_GEAR_ARRAY = np.array(GEAR, dtype=np.uint32) if np is not None else None
+
+
+def _cut_points_python(data):
+    """Positions i where the rolling hash after data[i] has its top bits clear"""
+    points = []
+    h = 0
+    gear = GEAR
+    for i, byte in enumerate(data):
+        h = ((h << 1) + gear[byte]) & 0xFFFFFFFF
+        if not h & CUT_MASK:
+            points.append(i)
+    return points
+
+
+def _cut_points_numpy(data):
+    """
+    Same as _cut_points_python, vectorized
+
+    With a 32-bit state each byte's contribution is shifted out after 32
+    steps, so hash[i] = sum(GEAR[data[i - j]] << j for j < 32) (mod 2**32)
+    and can be computed for all positions at once: five passes, each
+    doubling the window (h[i] += h[i - w] << w for w = 1, 2, 4, 8, 16).
+    """
+    points = []
+    for start in range(0, len(data), BLOCK_SIZE):
+        # 31 bytes of history from the previous block
+        head = max(0, start - 31)
+        block = np.frombuffer(data, dtype=np.uint8, count=min(len(data), start + BLOCK_SIZE) - head, offset=head)
+        h = _GEAR_ARRAY[block]
+        for width in (1, 2, 4, 8, 16):
+            shifted = h[:-width] << np.uint32(width)
+            h[width:] += shifted
+        hits = np.flatnonzero((h & np.uint32(CUT_MASK)) == 0)
+        hits = hits[hits >= start - head] + head
+        points.extend(hits.tolist())
+    return points
+
+
+def chunk_boundaries(data):
+    """
+    Content-defined chunk end offsets of data
+
+    Returns:
+        [end1, end2, ..., len(data)]
+    """
+    if not data:
+        return []
+    points = _cut_points_numpy(data) if np is not None else _cut_points_python(data)
+    ends = []
+    start = 0
+    while start < len(data):
+        # First cut point that leaves at least MIN_CHUNK bytes
+        index = bisect_left(points, start + MIN_CHUNK - 1)
+        end = points[index] + 1 if index < len(points) else len(data)
+        end = min(end, start + MAX_CHUNK, len(data))
+        ends.append(end)
+        start = end
+    return ends
+
+
+def chunk_id(data):
+    return hashlib.sha256(data).hexdigest()[:CHUNK_ID_LENGTH]
+
+
+def file_manifest(data):
+    """
+    Returns:
+        {"size": n, "sha256": "...", "chunks": [[chunk id, size], ...]}
+    """
+    chunks = []
+    start = 0
+    for end in chunk_boundaries(data):
+        chunks.append([chunk_id(data[start:end]), end - start])
+        start = end
+    return {"size": len(data), "sha256": hashlib.sha256(data).hexdigest(), "chunks": chunks}
+
+
+def _list_files(exercise_dir):
+    """Content files of an exercise, relative paths with "/" separators"""
+    files = []
+    for dir_path, dir_names, file_names in os.walk(exercise_dir):
+        dir_names[:] = [d for d in dir_names if not d.startswith('.') and d not in SKIPPED_DIRS]
+        for name in file_names:
+            if name.startswith('.') or name.endswith('.gz'):
+                continue
+            rel = os.path.relpath(os.path.join(dir_path, name), exercise_dir).replace(os.sep, '/')
+            if rel not in DERIVED_FILES:
+                files.append(rel)
+    return sorted(files)
+
+
+class ChunkIndex:
+    """
+    Manifests of exercise files and where each chunk can be read from
+
+    Thread-safe; entries are refreshed when a file's mtime or size changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {abs path: ((mtime_ns, size), manifest)}
+        self._manifests = {}
+        # {chunk id: (abs path, offset, size)}
+        self._locations = {}
+
+    def manifest(self, path):
+        """Manifest of one file (cached); OSError if unreadable"""
+        st = os.stat(path)
+        stat_key = (st.st_mtime_ns, st.st_size)
+        cached = self._manifests.get(path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        manifest = file_manifest(data)
+        locations = {}
+        offset = 0
+        for chunk, size in manifest["chunks"]:
+            locations.setdefault(chunk, (path, offset, size))
+            offset += size
+        with self._lock:
+            self._manifests[path] = (stat_key, manifest)
+            self._locations.update(locations)
+        return manifest
+
+    def bucket_manifest(self, bucket_dir, codes):
+        """
+        Manifests of every file of the given exercises
+
+        Returns:
+            {"<code>/<relative path>": manifest, ...}
+        """
+        files = {}
+        for code in codes:
+            exercise_dir = os.path.join(bucket_dir, code)
+            for rel in _list_files(exercise_dir):
+                try:
+                    files[f"{code}/{rel}"] = self.manifest(os.path.join(exercise_dir, *rel.split('/')))
+                except OSError:
+                    continue  # removed while listing
+        return files
+
+    def read_chunk(self, chunk):
+        """Bytes of a chunk, or None if no current file contains it"""
+        location = self._locations.get(chunk)
+        if location is None:
+            return None
+        path, offset, size = location
+        try:
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size)
+        except OSError:
+            data = b''
+        if chunk_id(data) != chunk:
+            # The file changed since it was chunked
+            with self._lock:
+                self._locations.pop(chunk, None)
+            return None
+        return data
+
+
+def bundle_etag(files):
+    """Version of a set of files: hash over paths and content hashes"""
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(f"{path}\0{files[path]['sha256']}\n".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def diff(files, client_files):
+    """
+    What a client holding client_files ({path: sha256}) is missing
+
+    Returns:
+        ({path: manifest} of new and changed files, [removed paths])
+    """
+    changed = {path: manifest for path, manifest in files.items()
+               if client_files.get(path) != manifest["sha256"]}
+    removed = sorted(path for path in client_files if path not in files)
+    return changed, removed
@@ -0,0 +1,295 @@
+"""
+Exercise Catalog
+In-memory index of the exercise tree and a polling watcher for content changes
+"""
+import base64
+import binascii
+import bisect
+import json
+import os
+import threading
+import time
+
+
+# Page size of the paginated listing
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def scan_exercises(base_dir):
+    """
+    Walk base_dir and collect exercises organized by bucket
+
+    Uses os.scandir so directory checks come from the dirent type
+    instead of one stat() per entry.
+
+    Returns:
+        {"default": ["001", "002", ...], ...}
+    """
+    buckets = {}
+
+    with os.scandir(base_dir) as bucket_entries:
+        for bucket_entry in bucket_entries:
+            if not bucket_entry.is_dir():
+                continue
+            exercises = []
+            with os.scandir(bucket_entry.path) as exercise_entries:
+                for entry in exercise_entries:
+                    if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "index.md")):
+                        exercises.append(entry.name)
+            if exercises:
+                buckets[bucket_entry.name] = sorted(exercises)
+
+    return buckets
+
+
+def extract_title(markdown_content):
+    """First heading of the markdown, or None"""
+    for line in markdown_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            return stripped.lstrip('#').strip() or None
+    return None
+
+
+def read_summary(exercise_dir):
+    """
+    Listing metadata of one exercise
+
+    Returns:
+        {"title": "...", "has_tests": bool}
+    """
+    try:
+        with open(os.path.join(exercise_dir, "index.md"), "r", encoding="utf-8") as f:
+            title = extract_title(f.read())
+    except (OSError, UnicodeDecodeError):
+        title = None
+    return {
+        "title": title,
+        "has_tests": os.path.isfile(os.path.join(exercise_dir, "tests.toml")),
+    }
+
+
+def exercise_changes(base_dir, paths):
+    """
+    Group changed file paths by the exercise they belong to
+
+    Args:
+        base_dir: Exercise tree (<bucket>/<code>/...)
+        paths: Changed files (as reported by ContentWatcher)
+
+    Returns:
+        {("bucket", "code"): ["index.md", "res/figure.png", ...]}
+    """
+    base_dir = os.path.abspath(base_dir)
+    changes = {}
+    for path in paths:
+        rel = os.path.relpath(os.path.abspath(path), base_dir)
+        parts = rel.split(os.sep)
+        if len(parts) >= 3 and parts[0] != "..":
+            changes.setdefault((parts[0], parts[1]), set()).add("/".join(parts[2:]))
+    return {key: sorted(files) for key, files in changes.items()}
+
+
+def encode_cursor(bucket, code):
+    """Opaque pagination cursor pointing just past bucket/code"""
+    return base64.urlsafe_b64encode(f"{bucket}/{code}".encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(bucket, code) from encode_cursor(); ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    bucket, sep, code = raw.partition("/")
+    if not sep:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return bucket, code
+
+
+def snapshot_tree(*roots):
+    """
+    Record (mtime_ns, size) for every file below the given roots
+
+    Returns:
+        {"/abs/path/file": (mtime_ns, size), ...}
+    """
+    snapshot = {}
+    for root in roots:
+        for dir_path, dir_names, file_names in os.walk(root):
+            # Skip generated/hidden directories (e.g. .datasets caches)
+            dir_names[:] = [d for d in dir_names if not d.startswith(".") and d != "__pycache__"]
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+def diff_snapshots(old, new):
+    """Return the sorted list of paths added, removed or modified between two snapshots"""
+    changed = {path for path in new if old.get(path) != new[path]}
+    changed.update(path for path in old if path not in new)
+    return sorted(changed)
+
+
+class Catalog:
+    """
+    Snapshot of the exercise tree
+
+    The bucket listing is rebuilt as a new dict and swapped in with a
+    single assignment, so readers never see a half-built catalog and
+    never need a lock.
+
+    With index_file (a build's catalog.json, see build.py) the listing and
+    per-exercise metadata are read from the index instead of the tree.
+
+    Besides the bucket dict, each refresh publishes a sorted list of
+    (bucket, code) keys and a title/has_tests summary per exercise, which
+    page() serves without touching the disk.
+    """
+
+    def __init__(self, base_dir, index_file=None):
+        self.base_dir = base_dir
+        self.index_file = index_file
+        self.buckets = {}
+        # {"bucket/code": {...}}, only available from a build index
+        self.exercises = {}
+        # Sorted [(bucket, code), ...] and {(bucket, code): summary}
+        self.keys = []
+        self.summaries = {}
+        # {(bucket, code): ((mtime_ns, size) of index.md, summary)}
+        self._summary_cache = {}
+        self.generation = 0
+        self.scanned_at = None
+
+    def refresh(self):
+        """Rescan the tree and publish the new listing"""
+        if self.index_file:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            buckets = index["buckets"]
+            self.exercises = index["exercises"]
+            summaries = {}
+            for key, entry in self.exercises.items():
+                bucket, _, code = key.partition("/")
+                summaries[(bucket, code)] = {"title": entry.get("title"), "has_tests": entry.get("has_tests", False)}
+        else:
+            buckets = scan_exercises(self.base_dir)
+            summaries = self._read_summaries(buckets)
+        self.summaries = summaries
+        self.keys = sorted((bucket, code) for bucket, codes in buckets.items() for code in codes)
+        self.buckets = buckets
+        self.scanned_at = time.time()
+        self.generation += 1
+        return buckets
+
+    def _read_summaries(self, buckets):
+        """Summaries for a source tree, re-reading only changed index.md files"""
+        previous = self._summary_cache
+        cache = {}
+        for bucket, codes in buckets.items():
+            for code in codes:
+                exercise_dir = os.path.join(self.base_dir, bucket, code)
+                try:
+                    st = os.stat(os.path.join(exercise_dir, "index.md"))
+                    stat_key = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    stat_key = None
+                entry = previous.get((bucket, code))
+                if entry is not None and entry[0] == stat_key:
+                    summary = dict(entry[1])
+                    summary["has_tests"] = os.path.isfile(os.path.join(exercise_dir, "tests.toml"))
+                else:
+                    summary = read_summary(exercise_dir)
+                cache[(bucket, code)] = (stat_key, summary)
+        self._summary_cache = cache
+        return {key: entry[1] for key, entry in cache.items()}
+
+    def page(self, bucket=None, prefix="", cursor=None, limit=DEFAULT_PAGE_SIZE, summary=False):
+        """
+        One page of the sorted listing
+
+        Args:
+            bucket: Only exercises of this bucket
+            prefix: Only exercise codes starting with this
+            cursor: next_cursor of the previous page
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            summary: Include title and has_tests
+
+        Returns:
+            {"exercises": [{"bucket": ..., "code": ...}, ...], "next_cursor": str or None}
+
+        Raises:
+            ValueError: Malformed cursor
+        """
+        keys = self.keys
+        summaries = self.summaries
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        if bucket is not None:
+            start = bisect.bisect_left(keys, (bucket, prefix))
+        else:
+            start = 0
+        if cursor:
+            start = max(start, bisect.bisect_right(keys, decode_cursor(cursor)))
+
+        items = []
+        last = None
+        for index in range(start, len(keys)):
+            key_bucket, code = keys[index]
+            if bucket is not None and (key_bucket != bucket or not code.startswith(prefix)):
+                # Keys of a bucket are contiguous and sorted, so the range ends here
+                break
+            if prefix and not code.startswith(prefix):
+                continue
+            if len(items) == limit:
+                return {"exercises": items, "next_cursor": encode_cursor(*last)}
+            item = {"bucket": key_bucket, "code": code}
+            if summary:
+                item.update(summaries.get((key_bucket, code)) or {"title": None, "has_tests": False})
+            items.append(item)
+            last = (key_bucket, code)
+        return {"exercises": items, "next_cursor": None}
+
+    def age(self):
+        """Seconds since the last scan (None if never scanned)"""
+        if self.scanned_at is None:
+            return None
+        return time.time() - self.scanned_at
+
+
+class ContentWatcher(threading.Thread):
+    """
+    Poll content directories and call on_change(changed_paths) when files change
+
+    Polling keeps this dependency-free and works the same on every
+    platform the classroom machines run.
+    """
+
+    def __init__(self, roots, on_change, interval=2.0, name="content-watcher"):
+        super().__init__(name=name, daemon=True)
+        self.roots = list(roots)
+        self.on_change = on_change
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        previous = snapshot_tree(*self.roots)
+        while not self._stop_event.wait(self.interval):
+            current = snapshot_tree(*self.roots)
+            if current == previous:
+                continue
+            changed = diff_snapshots(previous, current)
+            previous = current
+            try:
+                self.on_change(changed)
+            except Exception as e:
+                print(f"Content watcher callback failed: {e}")
+
+    def stop(self):
+        self._stop_event.set()
@@ -2,26 +2,48 @@ from thonny import get_workbench
 import tkinter as tk
 
 import os
+import time
 from .exercise_view import ExerciseView
 from .exercise_loader import create_loader
+from .live_updates import LiveUpdates
+from .profiling import PROFILER
 
 
 
 
-LOADER_TYPE = "filesystem"
+# "filesystem" (exercises shipped with the plugin) or "api" (synced from
+# the server at COURSE_CHECKER_API_URL)
+LOADER_TYPE = os.environ.get("COURSE_CHECKER_LOADER", "filesystem")
 PLUGIN_DIR = os.path.dirname(__file__)
 
+# Timing of "Pull Ex" and test runs, off by default
+# (can also be toggled from the Tools menu)
+PROFILING_ENABLED = os.environ.get("COURSE_CHECKER_PROFILE") == "1"
+PROFILING_LOG_FILE = os.environ.get("COURSE_CHECKER_PROFILE_LOG")
+
+# Exercise server to follow for live updates (e.g. "http://localhost:5000/api");
+# the shown exercise refreshes when it changes there. Unset: off
+API_URL = os.environ.get("COURSE_CHECKER_API_URL")
+API_KEY = os.environ.get("COURSE_CHECKER_API_KEY")
+LIVE_UPDATES_POLL_MS = 500
+LIVE_UPDATES = None
+
 
 
 if LOADER_TYPE == "filesystem":
     EXERCISE_LOADER = create_loader("filesystem", plugin_dir=PLUGIN_DIR)
 elif LOADER_TYPE == "api":
-    # EXERCISE_LOADER = create_loader("api", api_url=API_URL, api_key=API_KEY)
-    raise NotImplementedError("API loader not yet configured")
+    if not API_URL:
+        raise ValueError("COURSE_CHECKER_API_URL must be set for the api loader")
+    EXERCISE_LOADER = create_loader("api", api_url=API_URL, api_key=API_KEY)
 else:
     raise ValueError(f"Unknown loader type: {LOADER_TYPE}")
 
 
+PROFILER.enabled = PROFILING_ENABLED
+PROFILER.log_file = PROFILING_LOG_FILE
+
+
 
 
 
@@ -41,6 +63,15 @@ def load_plugin():
     get_workbench().add_view(ExerciseView,"Exercise", "e")# Right sidebar
     
     get_workbench().after(200, add_toolbar_widgets)
+    
+    add_profiling_commands()
+    
+    # Traces go to the log file if one is configured, otherwise to the Shell
+    if not PROFILER.log_file:
+        PROFILER.on_trace = _print_trace
+    
+    if API_URL:
+        start_live_updates()
 
 
 
@@ -99,46 +130,53 @@ def add_toolbar_widgets():
 
 
 def load_exercise(exercise_code):
+    with PROFILER.trace("pull", exercise_code.strip()):
+        _load_exercise(exercise_code)
+
+
+def _load_exercise(exercise_code):
 
     shell = get_workbench().get_view("ShellView")
     
-    exercise_code = exercise_code.strip()
-    
-    if not exercise_code:
-        shell.text.direct_insert("end", "ERROR: No input provided\n")
-        return
-    
-    if exercise_code.count("/") > 1:
-        shell.text.direct_insert("end", "ERROR: Only one '/' allowed (format: bucket/code)\n")
-        return
-    
-    dangerous_chars = ['\\', '..', '\0']
-    if any(char in exercise_code for char in dangerous_chars):
-        shell.text.direct_insert("end", "ERROR: Invalid characters in input\n")
-        return
-    
-    # Parse bucket and code
-    if "/" in exercise_code:
-        parts = exercise_code.split("/", 1)
-        bucket = parts[0].strip()
-        code = parts[1].strip()
+    with PROFILER.span("parse_input"):
+        exercise_code = exercise_code.strip()
         
-        if not bucket or not code:
-            shell.text.direct_insert("end", "ERROR: Both bucket and code must be provided\n")
+        if not exercise_code:
+            shell.text.direct_insert("end", "ERROR: No input provided\n")
             return
-    else:
-        bucket = "default"
-        code = exercise_code
+        
+        if exercise_code.count("/") > 1:
+            shell.text.direct_insert("end", "ERROR: Only one '/' allowed (format: bucket/code)\n")
+            return
+        
+        dangerous_chars = ['\\', '..', '\0']
+        if any(char in exercise_code for char in dangerous_chars):
+            shell.text.direct_insert("end", "ERROR: Invalid characters in input\n")
+            return
+        
+        # Parse bucket and code
+        if "/" in exercise_code:
+            parts = exercise_code.split("/", 1)
+            bucket = parts[0].strip()
+            code = parts[1].strip()
+            
+            if not bucket or not code:
+                shell.text.direct_insert("end", "ERROR: Both bucket and code must be provided\n")
+                return
+        else:
+            bucket = "default"
+            code = exercise_code
     
     try:
         shell.text.direct_insert("end", f"Loading exercise: {bucket}/{code}\n")
         
         # Load from source (filesystem or API)
-        markdown_content, exercise_dir = EXERCISE_LOADER.load_exercise(code, bucket)
+        with PROFILER.span("loader_io"):
+            markdown_content, exercise_dir = EXERCISE_LOADER.load_exercise(code, bucket)
         
         view = get_workbench().get_view("ExerciseView")
         if view:
-            view.load_exercise(markdown_content, exercise_dir)
+            view.load_exercise(markdown_content, exercise_dir, key=f"{bucket}/{code}")
             get_workbench().show_view("ExerciseView")
             shell.text.direct_insert("end", f"✓ Exercise {code} loaded successfully\n")
         else:
@@ -151,6 +189,106 @@ def load_exercise(exercise_code):
 
 
 
+def start_live_updates():
+    global LIVE_UPDATES
+    LIVE_UPDATES = LiveUpdates(API_URL)
+    LIVE_UPDATES.start()
+    get_workbench().after(LIVE_UPDATES_POLL_MS, _poll_live_updates)
+
+
+def _poll_live_updates():
+    # Events arrive on the stream thread; the view is only touched from here
+    try:
+        for event_type, data in LIVE_UPDATES.pending():
+            _apply_live_update(event_type, data)
+    except Exception as e:
+        _shell_write(f"ERROR: Live update failed - {e}\n")
+    finally:
+        get_workbench().after(LIVE_UPDATES_POLL_MS, _poll_live_updates)
+
+
+def _apply_live_update(event_type, data):
+    view = get_workbench().get_view("ExerciseView")
+    if not view or not view.current_key:
+        return
+    
+    bucket, code = view.current_key.split("/", 1)
+    reload = lambda: _refresh_exercise(bucket, code)
+    if event_type == "reset":
+        # Missed events (e.g. server restart): the shown copy may be stale
+        reload()
+    elif event_type == "exercise":
+        view.apply_update(data, reload)
+
+
+def _refresh_exercise(bucket, code):
+    try:
+        markdown_content, exercise_dir = EXERCISE_LOADER.load_exercise(code, bucket)
+    except Exception as e:
+        _shell_write(f"ERROR: Could not refresh exercise {bucket}/{code} - {e}\n")
+        return
+    
+    view = get_workbench().get_view("ExerciseView")
+    view.load_exercise(markdown_content, exercise_dir, key=f"{bucket}/{code}")
+    _shell_write(f"↻ Exercise {bucket}/{code} was updated\n")
+
+
+
+def add_profiling_commands():
+    
+    get_workbench().add_command(
+        command_id="exercise_profiling_toggle",
+        menu_name="tools",
+        command_label="Exercise profiling: enable/disable",
+        handler=toggle_profiling,
+        group=150
+    )
+    
+    get_workbench().add_command(
+        command_id="exercise_profiling_summary",
+        menu_name="tools",
+        command_label="Exercise profiling: show summary",
+        handler=lambda: _shell_write(PROFILER.summary()),
+        group=150
+    )
+    
+    get_workbench().add_command(
+        command_id="exercise_profiling_capture",
+        menu_name="tools",
+        command_label="Exercise profiling: start/stop cProfile capture",
+        handler=toggle_profile_capture,
+        group=150
+    )
+
+
+def toggle_profiling():
+    PROFILER.enabled = not PROFILER.enabled
+    _shell_write(f"Exercise profiling {'enabled' if PROFILER.enabled else 'disabled'}\n")
+
+
+def toggle_profile_capture():
+    if not PROFILER.capturing:
+        PROFILER.start_capture()
+        _shell_write("cProfile capture started - reproduce the slow action, then stop it\n")
+        return
+    
+    dump_path = os.path.join(
+        os.path.expanduser("~"), f"course_checker_{time.strftime('%Y%m%d_%H%M%S')}.prof"
+    )
+    report = PROFILER.stop_capture(dump_path)
+    _shell_write(f"{report}\npstats data saved to {dump_path}\n")
+
+
+def _print_trace(trace):
+    _shell_write(f"[profile] {trace.format()}\n")
+
+
+def _shell_write(text):
+    shell = get_workbench().get_view("ShellView")
+    shell.text.direct_insert("end", text)
+
+
+
 
 
 
@@ -0,0 +1,254 @@
+"""
+Local copy of exercise buckets, synchronized chunk by chunk
+
+Mirrors <api>/bundles/<bucket> into cache_dir/<bucket>/ (see the
+server's bundles.py). The server lists new and changed files as
+content-defined chunks; chunks found in the files already on disk are
+copied locally and only the rest is downloaded. After a small edit on the
+server a re-sync moves a few kilobytes instead of whole files.
+
+No Thonny imports.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import urllib.error
+import urllib.request
+
+
+STATE_FILE = ".bundle.json"
+# Chunks per /api/chunks request (the server's limit)
+MAX_CHUNKS_PER_REQUEST = 256
+CHUNK_ID_LENGTH = 32
+TIMEOUT = 60
+
+
+class BundleSyncError(Exception):
+    """Raised when the server can't be reached or sends inconsistent data"""
+
+
+class OutdatedChunks(BundleSyncError):
+    """Content changed on the server between the sync and the chunk download"""
+
+
+def chunk_id(data):
+    return hashlib.sha256(data).hexdigest()[:CHUNK_ID_LENGTH]
+
+
+def _safe_relpath(path):
+    """Server-provided path, checked to stay inside the bucket directory"""
+    parts = path.split("/")
+    if not path or path.startswith("/") or "\\" in path or any(p in ("", ".", "..") for p in parts):
+        raise BundleSyncError(f"Invalid path from server: {path!r}")
+    return os.path.join(*parts)
+
+
+class BundleSync:
+    """
+    Args:
+        api_url: Base URL of the API (e.g. "http://localhost:5000/api")
+        cache_dir: Where buckets are mirrored
+        headers: Extra request headers (e.g. Authorization)
+    """
+
+    def __init__(self, api_url, cache_dir, headers=None):
+        self.api_url = api_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.headers = dict(headers or {})
+
+    def bucket_dir(self, bucket):
+        return os.path.join(self.cache_dir, bucket)
+
+    def sync(self, bucket, exercise=None):
+        """
+        Bring the local copy of a bucket (or one of its exercises) up to date
+
+        Returns:
+            {"unchanged": bool, "files": n, "removed": n, "chunks_fetched": n,
+             "bytes_fetched": n, "bytes_reused": n}
+
+        Raises:
+            FileNotFoundError: No such bucket/exercise on the server
+            BundleSyncError: Network or protocol error
+        """
+        try:
+            return self._sync(bucket, exercise)
+        except OutdatedChunks:
+            return self._sync(bucket, exercise)
+
+    def _sync(self, bucket, exercise):
+        root = self.bucket_dir(bucket)
+        state = self._load_state(root)
+        scope = exercise or ""
+        prefix = f"{exercise}/" if exercise else ""
+
+        # Files still as we wrote them; anything edited locally is re-fetched
+        held = {}
+        for path, entry in state["files"].items():
+            if path.startswith(prefix) and self._unchanged(root, path, entry):
+                held[path] = entry
+        request = {"files": {path: entry["sha256"] for path, entry in held.items()}}
+        if exercise:
+            request["exercise"] = exercise
+        if len(held) == sum(1 for path in state["files"] if path.startswith(prefix)):
+            request["etag"] = state["etags"].get(scope)
+
+        reply = self._post_json(f"/bundles/{bucket}/sync", request)
+        stats = {"unchanged": bool(reply.get("unchanged")), "files": 0, "removed": 0,
+                 "chunks_fetched": 0, "bytes_fetched": 0, "bytes_reused": 0}
+        if stats["unchanged"]:
+            return stats
+
+        changed = reply.get("files", {})
+        removed = reply.get("removed", [])
+
+        # Where each chunk we already have can be read from
+        local = {}
+        for path, entry in held.items():
+            offset = 0
+            for chunk, size in entry["chunks"]:
+                local.setdefault(chunk, (os.path.join(root, _safe_relpath(path)), offset, size))
+                offset += size
+
+        os.makedirs(root, exist_ok=True)
+        with tempfile.TemporaryFile(dir=root) as spool:
+            self._fetch_missing(bucket, exercise, changed, local, spool, stats)
+            staged = self._assemble(root, changed, local, spool, stats)
+
+        for path, temp_path in staged:
+            os.replace(temp_path, os.path.join(root, _safe_relpath(path)))
+        for path in removed:
+            try:
+                os.remove(os.path.join(root, _safe_relpath(path)))
+            except FileNotFoundError:
+                pass
+            state["files"].pop(path, None)
+
+        for path, entry in changed.items():
+            st = os.stat(os.path.join(root, _safe_relpath(path)))
+            state["files"][path] = dict(entry, mtime_ns=st.st_mtime_ns)
+        state["etags"][scope] = reply.get("etag")
+        if exercise:
+            # The bucket-wide version is unknown after a partial sync
+            state["etags"].pop("", None)
+        self._save_state(root, state)
+
+        stats["files"] = len(changed)
+        stats["removed"] = len(removed)
+        return stats
+
+    def _fetch_missing(self, bucket, exercise, changed, local, spool, stats):
+        """Download chunks not available locally into spool, recording where they landed"""
+        needed = []
+        seen = set(local)
+        for entry in changed.values():
+            for chunk, size in entry["chunks"]:
+                if chunk not in seen:
+                    seen.add(chunk)
+                    needed.append((chunk, size))
+
+        for start in range(0, len(needed), MAX_CHUNKS_PER_REQUEST):
+            batch = needed[start:start + MAX_CHUNKS_PER_REQUEST]
+            request = {"ids": [chunk for chunk, _ in batch], "bucket": bucket}
+            if exercise:
+                request["exercise"] = exercise
+            data = self._post("/chunks", request)
+            offset = 0
+            for chunk, size in batch:
+                piece = data[offset:offset + size]
+                offset += size
+                if chunk_id(piece) != chunk:
+                    raise BundleSyncError(f"Chunk {chunk} failed verification")
+                local[chunk] = (spool, spool.tell(), size)
+                spool.write(piece)
+                stats["chunks_fetched"] += 1
+                stats["bytes_fetched"] += size
+
+    def _assemble(self, root, changed, local, spool, stats):
+        """Write changed files to temporary names next to their targets"""
+        staged = []
+        try:
+            for path, entry in changed.items():
+                target = os.path.join(root, _safe_relpath(path))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=".sync-")
+                staged.append((path, temp_path))
+                digest = hashlib.sha256()
+                with os.fdopen(fd, "wb") as out:
+                    for chunk, size in entry["chunks"]:
+                        data = self._read_local(local[chunk])
+                        if local[chunk][0] is not spool:
+                            stats["bytes_reused"] += size
+                        digest.update(data)
+                        out.write(data)
+                if digest.hexdigest() != entry["sha256"]:
+                    raise BundleSyncError(f"{path} failed verification")
+        except BaseException:
+            for _, temp_path in staged:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            raise
+        return staged
+
+    @staticmethod
+    def _read_local(location):
+        source, offset, size = location
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                f.seek(offset)
+                return f.read(size)
+        source.seek(offset)
+        data = source.read(size)
+        source.seek(0, os.SEEK_END)
+        return data
+
+    @staticmethod
+    def _unchanged(root, path, entry):
+        try:
+            st = os.stat(os.path.join(root, _safe_relpath(path)))
+        except (OSError, BundleSyncError):
+            return False
+        return st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+
+    @staticmethod
+    def _load_state(root):
+        try:
+            with open(os.path.join(root, STATE_FILE), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        state.setdefault("etags", {})
+        state.setdefault("files", {})
+        return state
+
+    @staticmethod
+    def _save_state(root, state):
+        temp_path = os.path.join(root, STATE_FILE + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, os.path.join(root, STATE_FILE))
+
+    def _post_json(self, path, body):
+        return json.loads(self._post(path, body))
+
+    def _post(self, path, body):
+        request = urllib.request.Request(
+            self.api_url + path,
+            data=json.dumps(body).encode("utf-8"),
+            headers=dict(self.headers, **{"Content-Type": "application/json"}),
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                raise FileNotFoundError(f"Not found on server: {path}")
+            if e.code == 409:
+                raise OutdatedChunks("Chunks changed on the server during the sync")
+            raise BundleSyncError(f"Server error {e.code} for {path}")
+        except (urllib.error.URLError, OSError) as e:
+            raise BundleSyncError(f"Cannot reach {self.api_url}: {e}")
@@ -1,6 +1,12 @@
 
 import os
 
+from .bundle_sync import BundleSync, BundleSyncError
+
+
+# Same value as build.RESOURCE_PLACEHOLDER
+RESOURCE_PLACEHOLDER = '{{RESOURCE_BASE_URL}}'
+
 
 class ExerciseLoader:
     
@@ -35,48 +41,65 @@ class FileSystemLoader(ExerciseLoader):
 
 
 class APILoader(ExerciseLoader):
-    """Load exercises from remote API (future implementation)"""
+    """
+    Load exercises from the exercise server
+
+    Buckets are mirrored under cache_dir with BundleSync, so pulling an
+    exercise again only downloads the chunks that changed on the server,
+    and the last synced copy is used when the server can't be reached.
+    """
     
-    def __init__(self, api_url, api_key=None):
+    def __init__(self, api_url, api_key=None, cache_dir=None):
         """
         Initialize API loader
         
         Args:
             api_url: Base URL of the API (e.g., "https://exercises.example.com/api")
             api_key: Optional API key for authentication
+            cache_dir: Local copies of the buckets (default: ~/.cache/course_checker/api)
         """
-        self.api_url = api_url
+        self.api_url = api_url.rstrip('/')
         self.api_key = api_key
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser('~'), '.cache', 'course_checker', 'api')
+        headers = {}
+        if api_key:
+            headers['Authorization'] = f'Bearer {api_key}'
+        self.sync = BundleSync(self.api_url, self.cache_dir, headers)
+    
+    def sync_bucket(self, bucket="default"):
+        """Bring a whole bucket up to date (e.g. before a lab session)"""
+        return self.sync.sync(bucket)
     
     def load_exercise(self, exercise_code, bucket="default"):
         """
-        Load exercise from API
+        Sync the exercise, then load it from the local copy
         
         Returns:
-            tuple: (markdown_content, None)
-                   exercise_dir is None because files are not local
+            tuple: (markdown_content, exercise_dir)
         """
-        # Future implementation:
-        # import requests
-        # 
-        # headers = {}
-        # if self.api_key:
-        #     headers['Authorization'] = f'Bearer {self.api_key}'
-        # 
-        # response = requests.get(
-        #     f"{self.api_url}/exercises/{bucket}/{exercise_code}",
-        #     headers=headers
-        # )
-        # 
-        # if response.status_code == 404:
-        #     raise FileNotFoundError(f"Exercise not found: {bucket}/{exercise_code}")
-        # 
-        # response.raise_for_status()
-        # data = response.json()
-        # 
-        # return data['markdown'], None
+        exercise_dir = os.path.join(self.sync.bucket_dir(bucket), exercise_code)
+        index_file = os.path.join(exercise_dir, 'index.md')
+        
+        try:
+            self.sync.sync(bucket, exercise_code)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Exercise not found: {bucket}/{exercise_code}")
+        except BundleSyncError as e:
+            if not os.path.exists(index_file):
+                raise
+            print(f"Using cached copy of {bucket}/{exercise_code}: {e}")
         
-        raise NotImplementedError("API loader not yet implemented")
+        if not os.path.exists(index_file):
+            raise FileNotFoundError(f"Exercise index.md not found: {index_file}")
+        
+        with open(index_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        
+        # Pre-built content links resources through a placeholder (build.py)
+        resource_base_url = f"{self.api_url}/exercises/{bucket}/{exercise_code}/res"
+        content = content.replace(RESOURCE_PLACEHOLDER, resource_base_url)
+        
+        return content, exercise_dir
 
 
 
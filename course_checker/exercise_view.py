@@ -3,11 +3,20 @@ from tkinter import messagebox
 from thonny import get_workbench
 import tkinter as tk
 from tkinter import ttk
-import re
 import os
+import queue
+import threading
 
 from tkinterweb import HtmlFrame
-from markdown2 import Markdown
+
+from . import rendering
+from .profiling import PROFILER
+from .results_panel import ResultsPanel
+from .test_worker import TestWorker
+
+
+# How often the UI checks for a finished test run
+RESULTS_POLL_MS = 50
 
 
 class ExerciseView(ttk.Frame):
@@ -16,9 +25,9 @@ class ExerciseView(ttk.Frame):
         ttk.Frame.__init__(self, master)
         
         self.current_exercise_dir = None  
-        self.markdown_converter = Markdown(
-            extras=['fenced-code-blocks', 'tables', 'break-on-newline', 'code-friendly']
-        )
+        # "bucket/code" on display, for live updates
+        self.current_key = None
+        self.markdown_converter = rendering.create_converter()
         
         self.html_frame = HtmlFrame(self)
         self.html_frame.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
@@ -28,21 +37,35 @@ class ExerciseView(ttk.Frame):
         
         self.run_button = None
         self.solution_button = None
+        
+        # Shown above the buttons after the first run
+        self.results_panel = ResultsPanel(self)
+        self.test_worker = TestWorker()
+        self._test_results = queue.Queue()
+        self._test_running = False
     
-    def load_exercise(self, markdown_content, exercise_dir=None):
+    def load_exercise(self, markdown_content, exercise_dir=None, key=None):
 
+        if exercise_dir != self.current_exercise_dir:
+            self.results_panel.pack_forget()
         self.current_exercise_dir = exercise_dir
+        self.current_key = key
         
         try:
-            html_content = self.markdown_converter.convert(markdown_content)
+            with PROFILER.span("markdown_convert"):
+                html_content = self.markdown_converter.convert(markdown_content)
             
-            safe_html = self._sanitize_html(html_content)
+            with PROFILER.span("sanitize_html"):
+                safe_html = self._sanitize_html(html_content)
             
-            full_html = self._create_full_html(safe_html)
+            with PROFILER.span("create_full_html"):
+                full_html = self._create_full_html(safe_html)
             
-            self.html_frame.load_html(full_html)
+            with PROFILER.span("load_html"):
+                self.html_frame.load_html(full_html)
             
-            self._update_buttons()
+            with PROFILER.span("update_buttons"):
+                self._update_buttons()
             
         except Exception as e:
             error_msg = f"Error rendering markdown: {str(e)}"
@@ -52,6 +75,36 @@ class ExerciseView(ttk.Frame):
             )
             self.html_frame.load_html(error_html)
     
+    def apply_update(self, change, reload):
+        """
+        React to a live update (see live_updates.py)
+
+        Args:
+            change: {"bucket", "code", "files", "removed"} from the server
+            reload: Callable that loads the exercise again
+
+        Returns:
+            True if the exercise on display was affected
+        """
+        if self.current_key != f"{change.get('bucket')}/{change.get('code')}":
+            return False
+        
+        if change.get("removed"):
+            self.html_frame.load_html(self._create_full_html(
+                "<h1>Exercise removed</h1><p>This exercise is no longer available on the server.</p>"
+            ))
+            self.current_exercise_dir = None
+            self._update_buttons()
+            return True
+        
+        # Only tests/solution changed: the text is still current
+        files = change.get("files", [])
+        if all(name in ("tests.toml", "tests.json", "solution.py") for name in files) and files:
+            self._update_buttons()
+        else:
+            reload()
+        return True
+    
     def _update_buttons(self):
         if self.run_button:
             self.run_button.destroy()
@@ -77,6 +130,8 @@ class ExerciseView(ttk.Frame):
                 text="▶ Run Tests",
                 command=self.run_tests
             )
+            if self._test_running:
+                self.run_button.state(["disabled"])
             self.run_button.pack(side=tk.LEFT, padx=5)
         
         # Create Show Solution button if solution exists
@@ -89,14 +144,61 @@ class ExerciseView(ttk.Frame):
             self.solution_button.pack(side=tk.LEFT, padx=5)
     
     def run_tests(self):
-        """Run tests for the current exercise"""
+        """Run the exercise's tests on the current editor's text (no need to save it)"""
         if not self.current_exercise_dir:
             messagebox.showwarning("No Tests", "Tests are not available for this exercise")
             return
+        if self._test_running:
+            return
+        
+        editor = get_workbench().get_editor_notebook().get_current_editor()
+        if editor is None:
+            messagebox.showwarning("No Code", "Open the file with your solution in the editor first")
+            return
+        source = editor.get_text_widget().get("1.0", "end-1c")
+        filename = editor.get_filename() or "<editor>"
+        test_file = os.path.join(self.current_exercise_dir, 'tests.toml')
+        exercise_dir = self.current_exercise_dir
         
-        # Import here to avoid circular dependency
-        from .checker import check_code
-        check_code()
+        self._test_running = True
+        if self.run_button:
+            self.run_button.state(["disabled"])
+        self.results_panel.pack(side=tk.BOTTOM, fill=tk.X, before=self.button_frame)
+        self.results_panel.show_running()
+        
+        # Finished by _poll_test_results once the results are shown
+        trace = PROFILER.start("test", os.path.basename(exercise_dir))
+        
+        def run():
+            try:
+                # Round trip to the runner worker: compiling, loading the
+                # suite and running it
+                with PROFILER.span("worker_run", trace):
+                    report = self.test_worker.run(source, filename, [test_file], cwd=exercise_dir)
+            except Exception as e:
+                report = {"success": False, "loaded": False, "error": f"{type(e).__name__}: {e}"}
+                if trace is not None:
+                    trace.error = report["error"]
+            self._test_results.put((exercise_dir, report, trace))
+        
+        threading.Thread(target=run, daemon=True).start()
+        self.after(RESULTS_POLL_MS, self._poll_test_results)
+    
+    def _poll_test_results(self):
+        try:
+            exercise_dir, report, trace = self._test_results.get_nowait()
+        except queue.Empty:
+            self.after(RESULTS_POLL_MS, self._poll_test_results)
+            return
+        
+        self._test_running = False
+        if self.run_button:
+            self.run_button.state(["!disabled"])
+        # The student moved on to another exercise meanwhile
+        if exercise_dir == self.current_exercise_dir:
+            with PROFILER.span("show_results", trace):
+                self.results_panel.show_report(report)
+        PROFILER.finish(trace)
     
     def show_solution(self):
         """Show the solution for the current exercise"""
@@ -114,195 +216,8 @@ class ExerciseView(ttk.Frame):
     
     def _sanitize_html(self, html_content):
         """Remove potentially dangerous HTML elements"""
-        # Remove script tags
-        cleaned = re.sub(r'<script.*?</script>', '', html_content, flags=re.DOTALL | re.IGNORECASE)
-        # Remove inline event handlers
-        cleaned = re.sub(r'\son\w+\s*=\s*["\'].*?["\']', '', cleaned, flags=re.IGNORECASE)
-        # Remove javascript: protocol
-        cleaned = re.sub(r'javascript:', '', cleaned, flags=re.IGNORECASE)
-        
-        return cleaned
+        return rendering.sanitize_html(html_content)
     
     def _create_full_html(self, content):
         """Create a full HTML document with GitHub-style CSS"""
-        return f"""
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen', 
-                         'Ubuntu', 'Cantarell', 'Helvetica Neue', sans-serif;
-            line-height: 1.6;
-            color: #24292f;
-            background-color: #f6f8fa;
-            margin: 0;
-            padding: 0px; 
-            font-size: 19px;
-        }}
-        
-        .container {{
-            max-width: 900px;
-            margin: 0 auto;
-            background-color: #ffffff;
-            padding: 40px 60px;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.12), 0 1px 2px rgba(0,0,0,0.24);
-            border-radius: 0px;
-        }}
-        
-        h1 {{
-            color: #1f2328;
-            border-bottom: 1px solid #d0d7de;
-            padding-bottom: 0.3em;
-            margin-top: 24px;
-            margin-bottom: 16px;
-            font-size: 2.1em;
-            font-weight: 600;
-        }}
-        
-        h2 {{
-            color: #1f2328;
-            border-bottom: 1px solid #d0d7de;
-            padding-bottom: 0.3em;
-            margin-top: 24px;
-            margin-bottom: 16px;
-            font-size: 1.6em;
-            font-weight: 600;
-        }}
-        
-        h3 {{
-            color: #1f2328;
-            margin-top: 24px;
-            margin-bottom: 16px;
-            font-size: 1.3em;
-            font-weight: 600;
-        }}
-        
-        p {{
-            margin-top: 0;
-            margin-bottom: 16px;
-            font-size: 17px;
-        }}
-        
-        code {{
-            background-color: rgba(175,184,193,0.2);
-            padding: 0.2em 0.4em;
-            border-radius: 6px;
-            font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
-            font-size: 15px;
-        }}
-        
-        pre {{
-            background-color: #f6f8fa;
-            padding: 16px;
-            border-radius: 6px;
-            border: 1px solid #d0d7de;
-            margin: 16px 0;
-            overflow-x: auto;
-            line-height: 1.45;
-            font-size: 15px;
-        }}
-        
-        pre code {{
-            background: none;
-            padding: 0;
-            border: none;
-            font-size: 15px;
-        }}
-        
-        blockquote {{
-            border-left: 4px solid #d0d7de;
-            padding: 0 16px;
-            margin: 16px 0;
-            color: #57606a;
-        }}
-        
-        ul, ol {{
-            padding-left: 2em;
-            margin: 16px 0;
-        }}
-        
-        li {{
-            margin: 0.25em 0;
-            font-size: 17px;
-        }}
-        
-        a {{
-            color: #0969da;
-            text-decoration: none;
-        }}
-        
-        a:hover {{
-            text-decoration: underline;
-        }}
-        
-        img {{
-            max-width: 100%;
-            height: auto;
-            border-radius: 6px;
-            margin: 16px 0;
-        }}
-        
-        table {{
-            border-collapse: collapse;
-            width: 100%;
-            margin: 16px 0;
-            display: block;
-            overflow-x: auto;
-        }}
-        
-        th, td {{
-            border: 1px solid #d0d7de;
-            padding: 6px 13px;
-            text-align: left;
-        }}
-        
-        th {{
-            background-color: #f6f8fa;
-            font-weight: 600;
-        }}
-        
-        tr:nth-child(even) {{
-            background-color: #f6f8fa;
-        }}
-        
-        hr {{
-            border: none;
-            border-bottom: 1px solid #d0d7de;
-            margin: 24px 0;
-        }}
-        
-        .hint {{
-            background-color: #fff8c5;
-            border: 1px solid #d4c827;
-            border-radius: 6px;
-            padding: 16px;
-            margin: 16px 0;
-        }}
-        
-        .important {{
-            background-color: #ddf4ff;
-            border: 1px solid #54aeff;
-            border-radius: 6px;
-            padding: 16px;
-            margin: 16px 0;
-        }}
-        
-        .warning {{
-            background-color: #fff5b1;
-            border: 1px solid #bf8700;
-            border-radius: 6px;
-            padding: 16px;
-            margin: 16px 0;
-        }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        {content}
-    </div>
-</body>
-</html>
-"""
+        return rendering.create_full_html(content)
@@ -0,0 +1,108 @@
+"""
+Live exercise updates from the server's /api/events stream
+
+A background thread keeps one server-sent events connection open and
+queues the messages; the UI drains the queue from the Tk main loop
+(Tk widgets must not be touched from other threads). Reconnects with
+Last-Event-ID after network errors, so nothing is missed in between.
+
+No Thonny imports, so it can be used (and tried out) standalone:
+
+    updates = LiveUpdates("http://localhost:5000/api")
+    updates.start()
+    ...
+    for event_type, data in updates.pending():
+        print(event_type, data)
+"""
+import json
+import queue
+import threading
+import urllib.error
+import urllib.request
+
+
+# No data (not even a heartbeat) for this long means the connection is dead
+READ_TIMEOUT = 45.0
+MAX_RECONNECT_DELAY = 60.0
+
+
+class LiveUpdates(threading.Thread):
+    """
+    Follow the server's event stream
+
+    Args:
+        api_url: Base URL of the API (e.g. "http://localhost:5000/api")
+        keys: Only events for these "bucket/code" exercises (default: all)
+    """
+
+    def __init__(self, api_url, keys=None):
+        super().__init__(name="course-checker-live-updates", daemon=True)
+        self.url = api_url.rstrip("/") + "/events"
+        if keys:
+            self.url += "?" + "&".join(f"exercise={key}" for key in sorted(keys))
+        self.last_event_id = None
+        self.reconnect_delay = 3.0
+        self.connected = False
+        self._queue = queue.Queue()
+        self._stop_event = threading.Event()
+
+    def pending(self):
+        """Drain queued events: [(event_type, data), ...]"""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        delay = self.reconnect_delay
+        while not self._stop_event.is_set():
+            try:
+                self._follow()
+                delay = self.reconnect_delay
+            except (OSError, urllib.error.URLError, ValueError):
+                # Server down or restarting: back off, then resume where we were
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+            self.connected = False
+            self._stop_event.wait(delay)
+
+    def _follow(self):
+        headers = {"Accept": "text/event-stream"}
+        if self.last_event_id:
+            headers["Last-Event-ID"] = self.last_event_id
+        request = urllib.request.Request(self.url, headers=headers)
+        with urllib.request.urlopen(request, timeout=READ_TIMEOUT) as response:
+            self.connected = True
+            event_type, data = "message", []
+            for raw_line in response:
+                if self._stop_event.is_set():
+                    return
+                line = raw_line.decode("utf-8").rstrip("\r\n")
+                if not line:
+                    if data:
+                        self._dispatch(event_type, "\n".join(data))
+                    event_type, data = "message", []
+                    continue
+                if line.startswith(":"):
+                    continue  # heartbeat
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "id":
+                    self.last_event_id = value
+                elif field == "event":
+                    event_type = value
+                elif field == "data":
+                    data.append(value)
+                elif field == "retry" and value.isdigit():
+                    self.reconnect_delay = int(value) / 1000
+
+    def _dispatch(self, event_type, payload):
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            data = payload
+        self._queue.put((event_type, data))
@@ -0,0 +1,197 @@
+"""
+Opt-in timing instrumentation for the plugin
+
+Each "Pull Ex" or test run is recorded as a trace made of named phases
+timed with perf_counter_ns. The last N traces are kept in a ring buffer.
+When profiling is disabled, trace() and span() return a shared no-op
+context manager, so the instrumented code pays almost nothing.
+"""
+import collections
+import cProfile
+import io
+import pstats
+import threading
+import time
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullContext()
+
+
+class Trace:
+    """Timing of one pull or test run"""
+
+    def __init__(self, kind, label):
+        self.kind = kind
+        self.label = label
+        self.started_at = time.time()
+        self.spans = []
+        self.total_ns = 0
+        self.error = None
+
+    def format(self):
+        """One-line summary in milliseconds"""
+        phases = " | ".join(f"{name} {ns / 1e6:.1f}" for name, ns in self.spans)
+        status = f"  ERROR: {self.error}" if self.error else ""
+        return f"{self.kind} {self.label}: total {self.total_ns / 1e6:.1f} ms | {phases}{status}"
+
+
+class _TraceContext:
+    def __init__(self, profiler, kind, label):
+        self.profiler = profiler
+        self.trace = Trace(kind, label)
+
+    def __enter__(self):
+        self.profiler._local.trace = self.trace
+        self._start = time.perf_counter_ns()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.total_ns = time.perf_counter_ns() - self._start
+        if exc is not None:
+            self.trace.error = str(exc)
+        self.profiler._local.trace = None
+        self.profiler._finish(self.trace)
+        return False
+
+
+class _SpanContext:
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.spans.append((self.name, time.perf_counter_ns() - self._start))
+        return False
+
+
+class Profiler:
+    """
+    Collects traces and optional cProfile captures
+
+    Args:
+        history: number of traces kept in the ring buffer
+        log_file: if set, every finished trace is appended to this file
+        on_trace: optional callback(trace), e.g. to print to the Shell
+    """
+
+    def __init__(self, enabled=False, history=50, log_file=None, on_trace=None):
+        self.enabled = enabled
+        self.traces = collections.deque(maxlen=history)
+        self.log_file = log_file
+        self.on_trace = on_trace
+        self._local = threading.local()
+        self._capture = None
+
+    def trace(self, kind, label=""):
+        """Context manager recording one pull/test run"""
+        if not self.enabled:
+            return _NULL
+        return _TraceContext(self, kind, label)
+
+    def span(self, name, trace=None):
+        """Context manager timing one phase of the current trace (or of trace)"""
+        if not self.enabled:
+            return _NULL
+        if trace is None:
+            trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return _NULL
+        return _SpanContext(trace, name)
+
+    def start(self, kind, label=""):
+        """
+        Begin a trace that outlives the calling block, e.g. a test run on a
+        background thread whose results a later UI callback shows. Time its
+        phases with span(name, trace) and end it with finish(trace).
+
+        Returns:
+            The Trace, or None when profiling is disabled
+        """
+        if not self.enabled:
+            return None
+        trace = Trace(kind, label)
+        trace.started_ns = time.perf_counter_ns()
+        return trace
+
+    def finish(self, trace):
+        """End a trace begun with start() (None is ignored)"""
+        if trace is None:
+            return
+        trace.total_ns = time.perf_counter_ns() - trace.started_ns
+        self._finish(trace)
+
+    def _finish(self, trace):
+        self.traces.append(trace)
+        line = trace.format()
+        if self.log_file:
+            try:
+                stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(trace.started_at))
+                with open(self.log_file, "a", encoding="utf-8") as f:
+                    f.write(f"{stamp} {line}\n")
+            except OSError as e:
+                print(f"Could not write profile log: {e}")
+        if self.on_trace:
+            self.on_trace(trace)
+
+    def summary(self):
+        """Per-phase mean/max over the traces in the ring buffer"""
+        if not self.traces:
+            return "No traces recorded (is profiling enabled?)\n"
+
+        totals = collections.defaultdict(list)
+        for trace in list(self.traces):
+            totals[(trace.kind, "total")].append(trace.total_ns)
+            for name, ns in trace.spans:
+                totals[(trace.kind, name)].append(ns)
+
+        lines = [f"Last {len(self.traces)} trace(s), times in ms:"]
+        lines.append(f"  {'kind':<6} {'phase':<20} {'n':>4} {'mean':>9} {'max':>9}")
+        for (kind, name), values in totals.items():
+            mean = sum(values) / len(values) / 1e6
+            lines.append(f"  {kind:<6} {name:<20} {len(values):>4} {mean:>9.2f} {max(values) / 1e6:>9.2f}")
+        return "\n".join(lines) + "\n"
+
+    @property
+    def capturing(self):
+        return self._capture is not None
+
+    def start_capture(self):
+        """Start a cProfile capture (profiles the calling thread, i.e. the UI thread)"""
+        if self._capture is None:
+            self._capture = cProfile.Profile()
+            self._capture.enable()
+
+    def stop_capture(self, dump_path=None, limit=25):
+        """
+        Stop the cProfile capture
+
+        Args:
+            dump_path: if given, raw pstats data is written there
+                       (open later with pstats or snakeviz)
+        Returns:
+            text report of the top functions by cumulative time
+        """
+        if self._capture is None:
+            return "No capture running\n"
+        capture, self._capture = self._capture, None
+        capture.disable()
+        if dump_path:
+            capture.dump_stats(dump_path)
+        out = io.StringIO()
+        pstats.Stats(capture, stream=out).sort_stats("cumulative").print_stats(limit)
+        return out.getvalue()
+
+
+PROFILER = Profiler()
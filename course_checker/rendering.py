@@ -0,0 +1,225 @@
+"""
+Exercise rendering shared by the plugin and the offline build
+
+Pure functions only (no Thonny/Tk imports), so build.py can load this
+file directly and produce exactly the HTML ExerciseView would.
+"""
+import re
+
+try:
+    from markdown2 import Markdown
+except ImportError:
+    Markdown = None
+
+
+MARKDOWN_EXTRAS = ['fenced-code-blocks', 'tables', 'break-on-newline', 'code-friendly']
+
+
+def create_converter():
+    """Markdown converter configured like ExerciseView's"""
+    if Markdown is None:
+        raise ImportError("markdown2 is not installed")
+    return Markdown(extras=MARKDOWN_EXTRAS)
+
+
+def sanitize_html(html_content):
+    """Remove potentially dangerous HTML elements"""
+    # Remove script tags
+    cleaned = re.sub(r'<script.*?</script>', '', html_content, flags=re.DOTALL | re.IGNORECASE)
+    # Remove inline event handlers
+    cleaned = re.sub(r'\son\w+\s*=\s*["\'].*?["\']', '', cleaned, flags=re.IGNORECASE)
+    # Remove javascript: protocol
+    cleaned = re.sub(r'javascript:', '', cleaned, flags=re.IGNORECASE)
+    
+    return cleaned
+
+
+def render_fragment(markdown_content, converter=None):
+    """Markdown to a sanitized HTML fragment"""
+    converter = converter or create_converter()
+    return sanitize_html(converter.convert(markdown_content))
+
+
+def create_full_html(content):
+    """Create a full HTML document with GitHub-style CSS"""
+    return f"""
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {{
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen', 
+                         'Ubuntu', 'Cantarell', 'Helvetica Neue', sans-serif;
+            line-height: 1.6;
+            color: #24292f;
+            background-color: #f6f8fa;
+            margin: 0;
+            padding: 0px; 
+            font-size: 19px;
+        }}
+        
+        .container {{
+            max-width: 900px;
+            margin: 0 auto;
+            background-color: #ffffff;
+            padding: 40px 60px;
+            box-shadow: 0 1px 3px rgba(0,0,0,0.12), 0 1px 2px rgba(0,0,0,0.24);
+            border-radius: 0px;
+        }}
+        
+        h1 {{
+            color: #1f2328;
+            border-bottom: 1px solid #d0d7de;
+            padding-bottom: 0.3em;
+            margin-top: 24px;
+            margin-bottom: 16px;
+            font-size: 2.1em;
+            font-weight: 600;
+        }}
+        
+        h2 {{
+            color: #1f2328;
+            border-bottom: 1px solid #d0d7de;
+            padding-bottom: 0.3em;
+            margin-top: 24px;
+            margin-bottom: 16px;
+            font-size: 1.6em;
+            font-weight: 600;
+        }}
+        
+        h3 {{
+            color: #1f2328;
+            margin-top: 24px;
+            margin-bottom: 16px;
+            font-size: 1.3em;
+            font-weight: 600;
+        }}
+        
+        p {{
+            margin-top: 0;
+            margin-bottom: 16px;
+            font-size: 17px;
+        }}
+        
+        code {{
+            background-color: rgba(175,184,193,0.2);
+            padding: 0.2em 0.4em;
+            border-radius: 6px;
+            font-family: 'Consolas', 'Monaco', 'Courier New', monospace;
+            font-size: 15px;
+        }}
+        
+        pre {{
+            background-color: #f6f8fa;
+            padding: 16px;
+            border-radius: 6px;
+            border: 1px solid #d0d7de;
+            margin: 16px 0;
+            overflow-x: auto;
+            line-height: 1.45;
+            font-size: 15px;
+        }}
+        
+        pre code {{
+            background: none;
+            padding: 0;
+            border: none;
+            font-size: 15px;
+        }}
+        
+        blockquote {{
+            border-left: 4px solid #d0d7de;
+            padding: 0 16px;
+            margin: 16px 0;
+            color: #57606a;
+        }}
+        
+        ul, ol {{
+            padding-left: 2em;
+            margin: 16px 0;
+        }}
+        
+        li {{
+            margin: 0.25em 0;
+            font-size: 17px;
+        }}
+        
+        a {{
+            color: #0969da;
+            text-decoration: none;
+        }}
+        
+        a:hover {{
+            text-decoration: underline;
+        }}
+        
+        img {{
+            max-width: 100%;
+            height: auto;
+            border-radius: 6px;
+            margin: 16px 0;
+        }}
+        
+        table {{
+            border-collapse: collapse;
+            width: 100%;
+            margin: 16px 0;
+            display: block;
+            overflow-x: auto;
+        }}
+        
+        th, td {{
+            border: 1px solid #d0d7de;
+            padding: 6px 13px;
+            text-align: left;
+        }}
+        
+        th {{
+            background-color: #f6f8fa;
+            font-weight: 600;
+        }}
+        
+        tr:nth-child(even) {{
+            background-color: #f6f8fa;
+        }}
+        
+        hr {{
+            border: none;
+            border-bottom: 1px solid #d0d7de;
+            margin: 24px 0;
+        }}
+        
+        .hint {{
+            background-color: #fff8c5;
+            border: 1px solid #d4c827;
+            border-radius: 6px;
+            padding: 16px;
+            margin: 16px 0;
+        }}
+        
+        .important {{
+            background-color: #ddf4ff;
+            border: 1px solid #54aeff;
+            border-radius: 6px;
+            padding: 16px;
+            margin: 16px 0;
+        }}
+        
+        .warning {{
+            background-color: #fff5b1;
+            border: 1px solid #bf8700;
+            border-radius: 6px;
+            padding: 16px;
+            margin: 16px 0;
+        }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        {content}
+    </div>
+</body>
+</html>
+"""
@@ -0,0 +1,116 @@
+"""
+Test results shown under the exercise: a summary line and one row per test
+
+Takes the report of test_worker.TestWorker.run (test_runner's --json
+document). No Thonny imports.
+"""
+import tkinter as tk
+from tkinter import ttk
+
+
+PASSED_COLOR = "#1a7f37"
+FAILED_COLOR = "#cf222e"
+# Rows shown before the remaining results are summarized in one line
+MAX_ROWS = 200
+
+
+def _details(entry):
+    """One-line explanation of a failed test"""
+    parts = []
+    if entry.get("call"):
+        parts.append(entry["call"])
+    if "error" in entry:
+        parts.append(entry["error"])
+    else:
+        if "expected" in entry:
+            parts.append(f"expected {entry['expected']}")
+        if "got" in entry:
+            parts.append(f"got {entry['got']}")
+    return " — ".join(parts)
+
+
+def _load_error(report):
+    """Why the code or the tests couldn't be loaded, from the captured output"""
+    if report.get("error"):
+        return report["error"]
+    lines = [line.strip() for line in report.get("output", "").splitlines()]
+    for line in reversed(lines):
+        if line.startswith(("✗", "⚠")):
+            return line.lstrip("✗⚠ ")
+    return "The code could not be loaded"
+
+
+class ResultsPanel(ttk.Frame):
+
+    def __init__(self, master):
+        ttk.Frame.__init__(self, master)
+
+        self.summary = ttk.Label(self, anchor=tk.W)
+        self.summary.pack(side=tk.TOP, fill=tk.X, padx=5, pady=(5, 2))
+
+        tree_frame = ttk.Frame(self)
+        tree_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.tree = ttk.Treeview(
+            tree_frame, columns=("result", "test", "details"), show="headings", height=6
+        )
+        self.tree.heading("result", text="")
+        self.tree.heading("test", text="Test")
+        self.tree.heading("details", text="Details")
+        self.tree.column("result", width=30, stretch=False, anchor=tk.CENTER)
+        self.tree.column("test", width=200, stretch=False)
+        self.tree.column("details", width=300)
+        self.tree.tag_configure("passed", foreground=PASSED_COLOR)
+        self.tree.tag_configure("failed", foreground=FAILED_COLOR)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # Full text of the selected row (details are often longer than the column)
+        self.detail = ttk.Label(self, anchor=tk.W, justify=tk.LEFT, wraplength=500)
+        self.detail.pack(side=tk.TOP, fill=tk.X, padx=5, pady=(2, 5))
+        self.tree.bind("<<TreeviewSelect>>", self._show_selected)
+        self.bind("<Configure>", lambda event: self.detail.configure(wraplength=max(event.width - 10, 100)))
+
+        self._row_details = {}
+
+    def show_running(self):
+        self._clear()
+        self.summary.configure(text="Running tests…", foreground="")
+
+    def show_report(self, report):
+        self._clear()
+        if not report.get("loaded") or not report.get("total"):
+            self.summary.configure(text="✗ Could not run the tests", foreground=FAILED_COLOR)
+            self.detail.configure(text=_load_error(report))
+            return
+
+        passed, total = report.get("passed", 0), report.get("total", 0)
+        if report.get("success"):
+            self.summary.configure(text=f"✓ All {total} tests passed", foreground=PASSED_COLOR)
+        else:
+            self.summary.configure(text=f"✗ {passed} of {total} tests passed", foreground=FAILED_COLOR)
+
+        # Failures first; passed generated cases aren't listed by the runner
+        entries = sorted(report.get("tests", []), key=lambda entry: entry.get("passed", False))
+        for entry in entries[:MAX_ROWS]:
+            name = entry.get("description") or f"Test {entry.get('test')}"
+            details = "" if entry.get("passed") else _details(entry)
+            item = self.tree.insert(
+                "", tk.END,
+                values=("✓" if entry.get("passed") else "✗", name, details),
+                tags=("passed" if entry.get("passed") else "failed",),
+            )
+            self._row_details[item] = f"{name}\n{details}" if details else name
+        if len(entries) > MAX_ROWS:
+            self.tree.insert("", tk.END, values=("", f"… {len(entries) - MAX_ROWS} more", ""))
+
+    def _clear(self):
+        self.tree.delete(*self.tree.get_children())
+        self._row_details = {}
+        self.detail.configure(text="")
+
+    def _show_selected(self, event=None):
+        selection = self.tree.selection()
+        if selection:
+            self.detail.configure(text=self._row_details.get(selection[0], ""))
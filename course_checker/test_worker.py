@@ -0,0 +1,131 @@
+"""
+Runs exercise tests in a separate, long-lived process
+
+The code is sent as text (an unsaved editor buffer works) to
+tests/test_runner.py --worker, which keeps compiled code and parsed test
+files cached between runs. Student code never runs inside Thonny: a crash
+or an endless loop only costs a restart of the worker.
+
+No Thonny imports.
+"""
+import json
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+
+
+RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tests", "test_runner.py")
+# Seconds a run may take before the worker is killed
+TIMEOUT = 30
+
+
+class TestWorker:
+    """
+    Client of one runner process, started on first use
+
+    Args:
+        python: Interpreter for the runner (default: the one running Thonny)
+        timeout: Seconds per run
+    """
+
+    def __init__(self, python=None, timeout=TIMEOUT):
+        self.python = python or sys.executable
+        self.timeout = timeout
+        self._process = None
+        self._replies = None
+        self._lock = threading.Lock()
+
+    def run(self, source, filename, test_files, cwd=None):
+        """
+        Run test files against source (blocking; call from a background thread)
+
+        Returns:
+            The runner's --json report ({"success", "loaded", "passed",
+            "failed", "total", "tests", "output"}); on a timeout or a dead
+            worker {"success": False, "loaded": False, "error": message}
+        """
+        request = json.dumps({
+            "source": source,
+            "filename": filename,
+            "tests": [os.path.abspath(path) for path in test_files],
+            "cwd": cwd,
+        }) + "\n"
+        with self._lock:
+            # A worker that died since the last run is replaced once
+            for attempt in range(2):
+                try:
+                    process = self._start()
+                    process.stdin.write(request)
+                    process.stdin.flush()
+                except OSError as e:
+                    self._stop()
+                    if attempt:
+                        return _failure(f"Could not start the test runner: {e}")
+                    continue
+                try:
+                    line = self._replies.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._stop()
+                    return _failure(f"Tests did not finish within {self.timeout} seconds (endless loop?)")
+                if line is None:
+                    self._stop()
+                    return _failure("The test runner stopped unexpectedly")
+                try:
+                    return json.loads(line)
+                except ValueError:
+                    self._stop()
+                    return _failure("Invalid reply from the test runner")
+
+    def close(self):
+        with self._lock:
+            self._stop()
+
+    def _start(self):
+        if self._process is not None and self._process.poll() is None:
+            return self._process
+        self._process = subprocess.Popen(
+            [self.python, RUNNER, "--worker"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding="utf-8",
+            bufsize=1,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0),
+            # Own process group, so _stop also ends processes the tests started
+            start_new_session=(os.name == "posix"),
+        )
+        self._replies = queue.Queue()
+        threading.Thread(
+            target=_read_replies, args=(self._process.stdout, self._replies), daemon=True
+        ).start()
+        return self._process
+
+    def _stop(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                # Whole tree (differential checks' worker processes too)
+                subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                               creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0))
+                process.kill()
+        except OSError:
+            pass
+        process.wait()
+
+
+def _read_replies(stream, replies):
+    for line in stream:
+        replies.put(line)
+    replies.put(None)
+
+
+def _failure(message):
+    return {"success": False, "loaded": False, "error": message}
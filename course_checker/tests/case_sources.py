@@ -0,0 +1,97 @@
+"""
+Streaming test case sources for TestRunner
+
+Besides the [[test]] tables, a tests.toml can declare generators whose
+cases are produced lazily, so suites with 100k+ cases run in flat memory:
+
+    [[generator]]
+    file = "cases.jsonl"       # one JSON test object per line
+
+    [[generator]]
+    file = "gen.py"            # Python file defining generate(rng, count)
+    generate = "generate"      # optional, name of the generator function
+    seed = 42                  # seeds the random.Random passed as rng
+    count = 100000             # optional cap on the number of cases
+    function = "add"           # any other keys are defaults for every case
+
+Each case is a dict in the [[test]] format (function, args, returns, ...).
+"""
+import itertools
+import json
+import os
+import random
+
+try:
+    from . import code_cache
+except ImportError:
+    import code_cache
+
+
+GENERATOR_KEYS = {"file", "generate", "seed", "count"}
+
+
+class CaseSourceError(Exception):
+    """Raised when a generator file is missing or yields something invalid"""
+
+
+def iter_tests(tests, exercise_dir):
+    """
+    Yield (test, streamed) pairs: the [[test]] tables first, then the cases
+    of each [[generator]] as they are produced
+    """
+    for test in tests.get('test', []):
+        yield test, False
+    for spec in tests.get('generator', []):
+        for case in iter_generator(spec, exercise_dir):
+            yield case, True
+
+
+def iter_generator(spec, exercise_dir):
+    """Lazily yield the cases of one [[generator]] entry"""
+    file_name = spec.get('file')
+    if not file_name:
+        raise CaseSourceError("Each [[generator]] needs a file")
+    path = os.path.join(exercise_dir, file_name)
+    if not os.path.isfile(path):
+        raise CaseSourceError(f"Generator file not found: {path}")
+
+    defaults = {k: v for k, v in spec.items() if k not in GENERATOR_KEYS}
+    count = spec.get('count')
+
+    if path.endswith('.jsonl'):
+        cases = _iter_jsonl(path)
+    elif path.endswith('.py'):
+        cases = _iter_python(path, spec.get('generate', 'generate'), spec.get('seed', 0), count)
+    else:
+        raise CaseSourceError(f"Unsupported generator file (use .jsonl or .py): {file_name}")
+
+    if count is not None:
+        cases = itertools.islice(cases, count)
+
+    for case in cases:
+        if not isinstance(case, dict):
+            raise CaseSourceError(f"{file_name} produced a {type(case).__name__}, expected a test dict")
+        yield {**defaults, **case} if defaults else case
+
+
+def _iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise CaseSourceError(f"{os.path.basename(path)} line {line_number}: {e}")
+
+
+def _iter_python(path, function_name, seed, count):
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    namespace = {}
+    exec(code_cache.compile_source(source, path), namespace)
+    generate = namespace.get(function_name)
+    if not callable(generate):
+        raise CaseSourceError(f"{os.path.basename(path)} has no function '{function_name}'")
+    return iter(generate(random.Random(seed), count))
@@ -0,0 +1,233 @@
+"""
+Compiled student code and reusable namespaces for TestRunner
+
+compile_source() caches code objects by source hash, in memory and on disk
+(marshal + interpreter magic number, like __pycache__), so the same
+submission is compiled once no matter how many test files run against it.
+
+NamespaceSnapshot executes the module once and hands out cheap clones:
+functions are re-bound to the clone's globals and mutable module-level
+data is deep-copied, so one test group mutating a global list (or a
+mutable default argument) can't leak into the next group. Modules whose
+classes, closures or other callables hold on to the original globals can't
+be cloned that way: the first clone is the namespace executed for the
+snapshot, and later ones execute the cached code object again, silently
+and fed the input the first run read, so students see their module's
+output and prompts once.
+"""
+import copy
+import hashlib
+import importlib.util
+import io
+import marshal
+import os
+import sys
+import tempfile
+import types
+
+
+CACHE_DIR = os.environ.get("COURSE_CHECKER_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "course_checker", "bytecode"
+)
+MEMORY_CACHE_SIZE = 128
+
+_memory = {}
+
+
+def source_hash(source, filename=""):
+    """Key for a compiled module: the filename ends up in tracebacks, so it counts"""
+    return hashlib.sha256(f"{filename}\0{source}".encode("utf-8")).hexdigest()
+
+
+def _disk_path(key):
+    return os.path.join(CACHE_DIR, key[:2], key[2:] + ".pyc")
+
+
+def _load_from_disk(key):
+    try:
+        with open(_disk_path(key), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if not data.startswith(magic):
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (ValueError, EOFError, TypeError):
+        return None
+
+
+def _save_to_disk(key, code):
+    path = _disk_path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(importlib.util.MAGIC_NUMBER)
+            f.write(marshal.dumps(code))
+        os.replace(tmp_path, path)
+    except OSError:
+        # The cache is an optimization; a read-only home must not break grading
+        pass
+
+
+def compile_source(source, filename):
+    """
+    Compile source, reusing a cached code object when the source is unchanged
+
+    Raises:
+        SyntaxError, like compile()
+    """
+    key = source_hash(source, filename)
+    code = _memory.get(key)
+    if code is None:
+        code = _load_from_disk(key)
+        if code is None:
+            code = compile(source, filename, "exec")
+            _save_to_disk(key, code)
+        if len(_memory) >= MEMORY_CACHE_SIZE:
+            _memory.pop(next(iter(_memory)))
+        _memory[key] = code
+    return code
+
+
+def _rebind(func, namespace, memo):
+    """Copy of func whose globals are namespace"""
+    defaults = func.__defaults__
+    if defaults:
+        try:
+            defaults = copy.deepcopy(defaults, memo)
+        except Exception:
+            pass
+    clone = types.FunctionType(func.__code__, namespace, func.__name__, defaults, func.__closure__)
+    clone.__kwdefaults__ = copy.copy(func.__kwdefaults__)
+    clone.__dict__.update(func.__dict__)
+    clone.__qualname__ = func.__qualname__
+    clone.__doc__ = func.__doc__
+    clone.__module__ = func.__module__
+    clone.__annotations__ = func.__annotations__
+    return clone
+
+
+# Shared as-is by clones: immutable, or not safely copyable anyway
+_SHARED_TYPES = (types.ModuleType, types.BuiltinFunctionType,
+                 int, float, complex, bool, str, bytes, type(None))
+
+
+def _is_imported_class(cls):
+    """Whether cls can be found in the module it says it comes from"""
+    module = sys.modules.get(getattr(cls, "__module__", None))
+    return module is not None and getattr(module, cls.__qualname__, None) is cls
+
+
+def _needs_exec(namespace):
+    """
+    Whether clones must re-run the module rather than copy namespace
+
+    Methods of classes the module defines, closures (decorated functions),
+    partials, bound methods of module data and other callables keep using
+    the globals they were created with, so copying the dict would leave them
+    reading the snapshot's values instead of the clone's.
+    """
+    for name, value in namespace.items():
+        if name == "__builtins__" or isinstance(value, _SHARED_TYPES):
+            continue
+        if isinstance(value, type):
+            if not _is_imported_class(value):
+                return True
+        elif isinstance(value, types.FunctionType):
+            if value.__globals__ is namespace and value.__closure__:
+                return True
+        elif isinstance(value, types.MethodType):
+            if any(value.__self__ is other for other in namespace.values()):
+                return True
+        elif callable(value) or not _is_imported_class(type(value)):
+            return True
+    return False
+
+
+class _RecordingInput:
+    """sys.stdin stand-in remembering what was read, to replay it later"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.read_text = []
+
+    def _record(self, text):
+        self.read_text.append(text)
+        return text
+
+    def read(self, *args):
+        return self._record(self.stream.read(*args))
+
+    def readline(self, *args):
+        return self._record(self.stream.readline(*args))
+
+    def readlines(self, *args):
+        lines = self.stream.readlines(*args)
+        self._record("".join(lines))
+        return lines
+
+    def __iter__(self):
+        return iter(self.readline, "")
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class NamespaceSnapshot:
+    """A student module executed once, cloned per test group"""
+
+    def __init__(self, code, source=None):
+        # Kept for consumers that re-run the module elsewhere (worker processes)
+        self.source = source
+        self.code = code
+        self.namespace = {}
+        stdin = sys.stdin
+        sys.stdin = _RecordingInput(stdin)
+        try:
+            exec(code, self.namespace)
+        finally:
+            self.input_read = "".join(sys.stdin.read_text)
+            sys.stdin = stdin
+        self.reexec = _needs_exec(self.namespace)
+        # Handed out by the first clone() of a module that must be re-run
+        self._unused = self.namespace if self.reexec else None
+
+    def _rerun(self):
+        """The module executed again, its output discarded and input replayed"""
+        namespace = {}
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin, sys.stdout = io.StringIO(self.input_read), io.StringIO()
+        try:
+            exec(self.code, namespace)
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+        return namespace
+
+    def clone(self):
+        """Fresh globals dict equivalent to re-running the module"""
+        if self.reexec:
+            if self._unused is not None:
+                namespace, self._unused = self._unused, None
+                return namespace
+            return self._rerun()
+        original = self.namespace
+        namespace = dict(original)
+        memo = {}
+        # Functions first, so data that refers to them (a dict of handlers)
+        # gets the re-bound copies through the memo
+        for name, value in original.items():
+            if isinstance(value, types.FunctionType) and value.__globals__ is original:
+                namespace[name] = memo[id(value)] = _rebind(value, namespace, memo)
+        for name, value in original.items():
+            if (name == "__builtins__" or isinstance(value, _SHARED_TYPES)
+                    or isinstance(value, (type, types.FunctionType, types.MethodType))):
+                continue
+            try:
+                namespace[name] = copy.deepcopy(value, memo)
+            except Exception:
+                # Locks, open files, generators... keep the shared object
+                pass
+        return namespace
@@ -0,0 +1,214 @@
+"""
+Result comparison and display for TestRunner
+
+- exact comparison by default (plain ==), as before
+- rtol/atol on a test enable float tolerance: |got - expected| <= atol + rtol * |expected|
+- large numeric sequences and NumPy arrays are compared vectorized when
+  numpy is installed, and only the first few mismatching indices are reported
+- values are formatted with bounded length, so a million-element result
+  prints as a short prefix instead of a wall of text
+"""
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+MAX_MISMATCHES = 5
+MAX_ITEMS = 20
+MAX_CHARS = 1000
+
+# Below this length a Python loop is as fast as converting to arrays
+VECTORIZE_MIN = 64
+
+
+class Comparison:
+    """Outcome of compare(): ok flag and up to N (path, got, expected) mismatches"""
+
+    def __init__(self, ok, mismatches=None):
+        self.ok = ok
+        self.mismatches = mismatches or []
+
+    def __bool__(self):
+        return self.ok
+
+
+def _is_array(value):
+    return np is not None and isinstance(value, np.ndarray)
+
+
+def _is_sequence(value):
+    return isinstance(value, (list, tuple)) or _is_array(value)
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return np is not None and isinstance(value, np.number)
+
+
+def compare(actual, expected, rtol=None, atol=None, max_mismatches=MAX_MISMATCHES):
+    """
+    Compare a function's result with the expected value
+
+    Returns:
+        Comparison (truthy when equal)
+    """
+    tolerant = rtol is not None or atol is not None
+
+    if not tolerant and not _is_array(actual) and not _is_array(expected):
+        # Fast path, and keeps plain == semantics for ordinary results
+        try:
+            if actual == expected:
+                return Comparison(True)
+        except Exception:
+            pass
+
+    mismatches = []
+    _collect(actual, expected, rtol or 0.0, atol or 0.0, tolerant, "", mismatches, max_mismatches)
+
+    if not mismatches and not tolerant and not (_is_array(actual) or _is_array(expected)):
+        # Equal element by element but == said no (e.g. tuple vs list)
+        mismatches.append(("", f"{type(actual).__name__} value", f"{type(expected).__name__} value"))
+    return Comparison(not mismatches, mismatches)
+
+
+def _collect(actual, expected, rtol, atol, tolerant, path, out, limit):
+    """Append (path, got, expected) mismatches to out, stopping at limit"""
+    if len(out) >= limit:
+        return
+
+    if _is_array(actual) or _is_array(expected):
+        _collect_arrays(actual, expected, rtol, atol, tolerant, path, out, limit)
+        return
+
+    if _is_sequence(actual) and _is_sequence(expected):
+        if len(actual) != len(expected):
+            out.append((f"{path} length", len(actual), len(expected)))
+        pair = _numeric_pair(actual, expected)
+        if pair is not None:
+            _collect_arrays(pair[0], pair[1], rtol, atol, tolerant, path, out, limit)
+            return
+        for i, (a, e) in enumerate(zip(actual, expected)):
+            if len(out) >= limit:
+                return
+            _collect(a, e, rtol, atol, tolerant, f"{path}[{i}]", out, limit)
+        return
+
+    if isinstance(actual, dict) and isinstance(expected, dict):
+        for key in expected:
+            if len(out) >= limit:
+                return
+            if key not in actual:
+                out.append((f"{path}[{key!r}]", "<missing>", expected[key]))
+            else:
+                _collect(actual[key], expected[key], rtol, atol, tolerant, f"{path}[{key!r}]", out, limit)
+        for key in actual:
+            if len(out) >= limit:
+                return
+            if key not in expected:
+                out.append((f"{path}[{key!r}]", actual[key], "<missing>"))
+        return
+
+    if not _scalar_equal(actual, expected, rtol, atol, tolerant):
+        out.append((path, actual, expected))
+
+
+def _scalar_equal(actual, expected, rtol, atol, tolerant):
+    if tolerant and _is_number(actual) and _is_number(expected):
+        if math.isnan(actual) or math.isnan(expected):
+            return math.isnan(actual) and math.isnan(expected)
+        return abs(actual - expected) <= atol + rtol * abs(expected)
+    try:
+        return bool(actual == expected)
+    except Exception:
+        return False
+
+
+def _numeric_pair(actual, expected):
+    """Both sequences as 1-D numeric arrays, or None if that isn't possible/worth it"""
+    if np is None or max(len(actual), len(expected)) < VECTORIZE_MIN:
+        return None
+    try:
+        a = np.asarray(actual)
+        e = np.asarray(expected)
+    except (ValueError, TypeError):
+        return None
+    if a.ndim != 1 or e.ndim != 1 or a.dtype.kind not in "biuf" or e.dtype.kind not in "biuf":
+        return None
+    return a, e
+
+
+def _collect_arrays(actual, expected, rtol, atol, tolerant, path, out, limit):
+    try:
+        a = np.asarray(actual)
+        e = np.asarray(expected)
+    except (ValueError, TypeError):
+        out.append((path, actual, expected))
+        return
+
+    if a.ndim > 1 or e.ndim > 1:
+        if a.shape != e.shape:
+            out.append((f"{path} shape", a.shape, e.shape))
+            return
+    elif len(a) != len(e) and not any(p == f"{path} length" for p, _, _ in out):
+        out.append((f"{path} length", len(a), len(e)))
+
+    if a.ndim == 1 and e.ndim == 1:
+        n = min(len(a), len(e))
+        a, e = a[:n], e[:n]
+
+    numeric = a.dtype.kind in "biuf" and e.dtype.kind in "biuf"
+    if numeric and tolerant:
+        equal = np.isclose(a, e, rtol=rtol, atol=atol, equal_nan=True)
+    else:
+        equal = np.asarray(a == e)
+        if equal.shape != a.shape:
+            out.append((path, actual, expected))
+            return
+
+    bad = np.flatnonzero(~equal)[:limit - len(out)]
+    for flat_index in bad:
+        index = np.unravel_index(flat_index, a.shape)
+        label = "".join(f"[{int(i)}]" for i in index)
+        out.append((f"{path}{label}", a[index].item(), e[index].item()))
+
+
+def format_value(value, max_items=MAX_ITEMS, max_chars=MAX_CHARS):
+    """Format a value for display, truncating large containers and long text"""
+    text = _format(value, max_items)
+    if len(text) > max_chars:
+        text = text[:max_chars] + f"... ({len(text) - max_chars} more chars)"
+    return text
+
+
+def _format(value, max_items):
+    if isinstance(value, str):
+        if len(value) > MAX_CHARS:
+            return f'"{value[:MAX_CHARS]}..." ({len(value)} chars)'
+        return f'"{value}"'
+    if _is_array(value):
+        items = value.ravel()[:max_items].tolist()
+        more = value.size - len(items)
+        body = ", ".join(_format(v, max_items) for v in items)
+        if more > 0:
+            body += f", ... ({more} more)"
+        return f"array([{body}], shape={value.shape}, dtype={value.dtype})"
+    if isinstance(value, list):
+        body = ", ".join(_format(v, max_items) for v in value[:max_items])
+        if len(value) > max_items:
+            body += f", ... ({len(value) - max_items} more)"
+        return "[" + body + "]"
+    if isinstance(value, dict):
+        items = [f"{k}: {_format(v, max_items)}" for k, v in list(value.items())[:max_items]]
+        if len(value) > max_items:
+            items.append(f"... ({len(value) - max_items} more)")
+        return "{" + ", ".join(items) + "}"
+    if isinstance(value, (tuple, set, frozenset)) and len(value) > max_items:
+        items = list(value)[:max_items]
+        return f"{type(value).__name__}({_format(items, max_items)[:-1]}, ... ({len(value) - max_items} more)])"
+    return str(value)
@@ -0,0 +1,273 @@
+"""
+Shared read-only datasets for data exercises
+
+An exercise declares its datasets in tests.toml:
+
+    [[dataset]]
+    name = "iris"
+    file = "res/iris.csv"      # relative to the exercise directory
+    delimiter = ","            # optional
+
+The CSV is converted once into one .npy file per column under
+<exercise>/.datasets/<name>/. Tests then receive the columns as read-only
+memory-mapped arrays, so every grading process on the machine shares the
+same page-cache pages instead of parsing and holding its own copy.
+In a test, an argument written as an inline table is replaced by the data:
+
+    args = [{ dataset = "iris" }]                          # dict of column arrays
+    args = [{ dataset = "iris", column = "sepal_length" }] # one array
+"""
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+CACHE_DIR_NAME = ".datasets"
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+
+class DatasetError(Exception):
+    """Raised when a dataset is missing, malformed or numpy is unavailable"""
+
+
+class DatasetNotFound(DatasetError):
+    """The dataset isn't declared, or its file doesn't exist"""
+
+
+def _require_numpy():
+    if np is None:
+        raise DatasetError("Datasets need numpy (pip install numpy)")
+
+
+def find_spec(specs, name):
+    """Return the [[dataset]] entry called name"""
+    for spec in specs:
+        if spec.get("name") == name:
+            return spec
+    raise DatasetNotFound(f"Dataset '{name}' is not declared in tests.toml")
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _column_array(values):
+    """Narrowest of int64 / float64 / str that holds every value"""
+    stripped = [v.strip() for v in values]
+    try:
+        return np.array([int(v) for v in stripped], dtype=np.int64)
+    except ValueError:
+        pass
+    try:
+        return np.array([float(v) if v else np.nan for v in stripped], dtype=np.float64)
+    except ValueError:
+        pass
+    return np.array(values, dtype=str)
+
+
+def convert_csv(source, target_dir, delimiter=","):
+    """
+    Convert a CSV file with a header row into per-column .npy files
+
+    Returns:
+        the metadata dict written to target_dir/meta.json
+    """
+    _require_numpy()
+
+    try:
+        with open(source, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            try:
+                header = next(reader)
+            except StopIteration:
+                raise DatasetError(f"Dataset file is empty: {source}")
+            columns = [[] for _ in header]
+            for row in reader:
+                if not row:
+                    continue
+                for i, values in enumerate(columns):
+                    values.append(row[i] if i < len(row) else "")
+    except (UnicodeDecodeError, csv.Error, TypeError) as e:
+        raise DatasetError(f"Dataset file is not valid CSV: {source}: {e}")
+
+    st = os.stat(source)
+    meta = {
+        "version": FORMAT_VERSION,
+        "source_sha256": _sha256(source),
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "rows": len(columns[0]) if columns else 0,
+        "columns": [],
+    }
+
+    os.makedirs(target_dir, exist_ok=True)
+    for i, (name, values) in enumerate(zip(header, columns)):
+        array = _column_array(values)
+        # Column names can be anything, so files are numbered
+        file_name = f"col_{i:03d}.npy"
+        np.save(os.path.join(target_dir, file_name), array, allow_pickle=False)
+        meta["columns"].append({"name": name.strip(), "file": file_name, "dtype": str(array.dtype)})
+
+    with open(os.path.join(target_dir, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, META_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_fresh(meta, source, cache_dir):
+    if not meta or meta.get("version") != FORMAT_VERSION:
+        return False
+    st = os.stat(source)
+    if (meta["source_size"], meta["source_mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+        return True
+    # Touched but maybe not changed (e.g. re-copied course material)
+    if meta["source_size"] != st.st_size or meta["source_sha256"] != _sha256(source):
+        return False
+    # Same content: remember the new mtime so the file isn't hashed again
+    # for every test argument that uses it
+    meta["source_mtime_ns"] = st.st_mtime_ns
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, os.path.join(cache_dir, META_FILE))
+    except OSError:
+        # Read-only cache (e.g. shared course material): still fresh
+        pass
+    return True
+
+
+def ensure_dataset(exercise_dir, spec):
+    """
+    Convert the dataset if the cached copy is missing or stale
+
+    Safe to call from several processes at once: each converts into its
+    own temporary directory and the first rename wins.
+
+    Returns:
+        (cache_dir, meta)
+    """
+    _require_numpy()
+
+    name = spec.get("name")
+    file_name = spec.get("file")
+    if not name or not file_name:
+        raise DatasetError("Each [[dataset]] needs a name and a file")
+
+    source = os.path.join(exercise_dir, file_name)
+    if not os.path.isfile(source):
+        raise DatasetNotFound(f"Dataset file not found: {source}")
+
+    cache_root = os.path.join(exercise_dir, CACHE_DIR_NAME)
+    cache_dir = os.path.join(cache_root, name)
+    meta = _read_meta(cache_dir)
+    if _is_fresh(meta, source, cache_dir):
+        return cache_dir, meta
+
+    os.makedirs(cache_root, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f".{name}-", dir=cache_root)
+    try:
+        meta = convert_csv(source, tmp_dir, spec.get("delimiter", ","))
+        # mkdtemp creates 0700; graders may run as other users
+        os.chmod(tmp_dir, 0o755)
+        if os.path.exists(cache_dir):
+            # Move the stale copy aside; processes still mapping its
+            # files keep their pages until they drop them
+            stale_dir = tempfile.mkdtemp(prefix=f".{name}-stale-", dir=cache_root)
+            try:
+                os.replace(cache_dir, os.path.join(stale_dir, name))
+            except OSError:
+                pass
+            shutil.rmtree(stale_dir, ignore_errors=True)
+        try:
+            os.rename(tmp_dir, cache_dir)
+        except OSError:
+            # Another process published a fresh copy first
+            meta = _read_meta(cache_dir) or meta
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return cache_dir, meta
+
+
+# Per-process cache of opened datasets: {cache_dir: (meta, {column: array})}
+_OPENED = {}
+
+
+def load_dataset(exercise_dir, spec):
+    """
+    Return {column_name: read-only memory-mapped array}
+
+    Arrays are opened once per process and reused by later tests; each
+    call gets its own dict so a test adding keys can't leak into the next.
+    """
+    cache_dir, meta = ensure_dataset(exercise_dir, spec)
+    opened = _OPENED.get(cache_dir)
+    if opened is not None and opened[0]["source_sha256"] == meta["source_sha256"]:
+        return dict(opened[1])
+
+    arrays = {
+        column["name"]: np.load(os.path.join(cache_dir, column["file"]), mmap_mode="r")
+        for column in meta["columns"]
+    }
+    _OPENED[cache_dir] = (meta, arrays)
+    return dict(arrays)
+
+
+def resolve_arg(arg, exercise_dir, specs):
+    """Replace a {dataset = ..., column = ...} argument with the loaded data"""
+    if not (isinstance(arg, dict) and "dataset" in arg and set(arg) <= {"dataset", "column"}):
+        return arg
+    data = load_dataset(exercise_dir, find_spec(specs, arg["dataset"]))
+    column = arg.get("column")
+    if column is None:
+        return data
+    if column not in data:
+        raise DatasetError(f"Dataset '{arg['dataset']}' has no column '{column}'")
+    return data[column]
+
+
+def main():
+    """Convert every dataset declared in a tests.toml (e.g. before class)"""
+    import sys
+    try:
+        import tomllib
+    except ImportError:
+        import tomli as tomllib
+
+    if len(sys.argv) != 2:
+        print("Usage: python datasets.py <tests.toml>")
+        sys.exit(1)
+
+    test_file = sys.argv[1]
+    with open(test_file, "rb") as f:
+        specs = tomllib.load(f).get("dataset", [])
+    exercise_dir = os.path.dirname(os.path.abspath(test_file))
+    for spec in specs:
+        cache_dir, meta = ensure_dataset(exercise_dir, spec)
+        print(f"{spec['name']}: {meta['rows']} rows, {len(meta['columns'])} columns -> {cache_dir}")
+
+
+if __name__ == "__main__":
+    main()
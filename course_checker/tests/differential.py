@@ -0,0 +1,338 @@
+"""
+Differential testing against the reference solution
+
+A [[differential]] entry in tests.toml runs the student's function and the
+reference solution's function side by side on randomly generated inputs:
+
+    [[differential]]
+    function = "add"
+    reference = "solution.py"   # optional, relative to the exercise directory
+    cases = 5000                # optional (default 1000)
+    seed = 1                    # optional
+    batch = 500                 # cases per worker task (optional)
+    workers = 4                 # worker processes, 1 = in-process (optional)
+    timeout = 20                # seconds for all cases in worker processes (optional)
+    args = [
+        { type = "int", min = -100, max = 100 },
+        { type = "list", of = { type = "int", min = 0, max = 9 }, max_len = 20 },
+    ]
+
+Argument types: int, float, bool, str (alphabet, min_len, max_len),
+list (of, min_len, max_len), choice (values), const (value).
+
+Cases are split into batches and run across worker processes. A failing
+case is then shrunk in the main process to a minimal counterexample.
+Inputs on which the reference itself raises are skipped as invalid.
+
+Worker processes still running after `timeout` (an endless loop in the
+student's code) are killed. COURSE_CHECKER_DIFFERENTIAL_WORKERS caps the
+number of worker processes; the grader sets it to 1, since it already runs
+one test run per CPU.
+"""
+import collections
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import string
+import time
+
+try:
+    from . import code_cache, comparison
+except ImportError:
+    import code_cache
+    import comparison
+
+
+DEFAULT_CASES = 1000
+DEFAULT_BATCH = 500
+MAX_WORKERS = int(os.environ.get('COURSE_CHECKER_DIFFERENTIAL_WORKERS') or 4)
+DEFAULT_TIMEOUT = 20.0
+MAX_SHRINK_STEPS = 500
+FAILURES_PER_BATCH = 3
+
+
+class DifferentialError(Exception):
+    """Raised for an invalid [[differential]] entry or missing reference"""
+
+
+# --- input generation -------------------------------------------------------
+
+def generate_value(spec, rng):
+    """Random value described by an argument spec"""
+    kind = spec.get('type', 'int')
+    if kind == 'int':
+        return rng.randint(spec.get('min', -1000), spec.get('max', 1000))
+    if kind == 'float':
+        return rng.uniform(spec.get('min', -1000.0), spec.get('max', 1000.0))
+    if kind == 'bool':
+        return rng.random() < 0.5
+    if kind == 'str':
+        alphabet = spec.get('alphabet', string.ascii_letters + string.digits)
+        length = rng.randint(spec.get('min_len', 0), spec.get('max_len', 10))
+        return ''.join(rng.choice(alphabet) for _ in range(length))
+    if kind == 'list':
+        length = rng.randint(spec.get('min_len', 0), spec.get('max_len', 10))
+        item_spec = spec.get('of', {'type': 'int'})
+        return [generate_value(item_spec, rng) for _ in range(length)]
+    if kind == 'choice':
+        return rng.choice(spec['values'])
+    if kind == 'const':
+        return spec['value']
+    raise DifferentialError(f"Unknown argument type: {kind}")
+
+
+def generate_case(arg_specs, seed, index):
+    """Arguments for case number index (deterministic for a given seed)"""
+    rng = random.Random(seed * 1_000_003 + index)
+    return [generate_value(spec, rng) for spec in arg_specs]
+
+
+# --- shrinking ----------------------------------------------------------------
+
+def _toward(value, target):
+    """Int candidates between target and value, closest to target first"""
+    if value == target:
+        return []
+    candidates = [target]
+    half = target + (value - target) // 2
+    if half not in (target, value):
+        candidates.append(half)
+    step = value - 1 if value > target else value + 1
+    if step not in candidates:
+        candidates.append(step)
+    return candidates
+
+
+def shrink_value(value, spec):
+    """Simpler candidate values for value, simplest first"""
+    kind = spec.get('type', 'int')
+    if kind == 'int':
+        low, high = spec.get('min', -1000), spec.get('max', 1000)
+        return _toward(value, min(max(0, low), high))
+    if kind == 'float':
+        low, high = spec.get('min', -1000.0), spec.get('max', 1000.0)
+        target = min(max(0.0, low), high)
+        candidates = [target, float(round(value)), value / 2]
+        return [c for c in candidates if c != value and low <= c <= high]
+    if kind == 'bool':
+        return [False] if value else []
+    if kind == 'str':
+        min_len = spec.get('min_len', 0)
+        alphabet = spec.get('alphabet', string.ascii_letters + string.digits)
+        candidates = []
+        if len(value) > min_len:
+            candidates += [value[:max(min_len, len(value) // 2)], value[1:], value[:-1]]
+        simplest = alphabet[0] * len(value)
+        if value != simplest:
+            candidates.append(simplest)
+        return [c for c in candidates if len(c) >= min_len and c != value]
+    if kind == 'list':
+        min_len = spec.get('min_len', 0)
+        item_spec = spec.get('of', {'type': 'int'})
+        candidates = []
+        if len(value) > min_len:
+            if min_len == 0:
+                candidates.append([])
+            half = max(min_len, len(value) // 2)
+            candidates += [value[:half], value[len(value) - half:]]
+            candidates += [value[:i] + value[i + 1:] for i in range(min(len(value), 20))]
+        for i, item in enumerate(value[:20]):
+            for smaller in shrink_value(item, item_spec)[:2]:
+                candidates.append(value[:i] + [smaller] + value[i + 1:])
+        return [c for c in candidates if len(c) >= min_len and c != value]
+    if kind == 'choice':
+        values = spec['values']
+        return [values[0]] if value != values[0] else []
+    return []
+
+
+def shrink(args, arg_specs, fails, max_steps=MAX_SHRINK_STEPS):
+    """Greedily simplify args while fails(args) stays true"""
+    steps = 0
+    improved = True
+    while improved and steps < max_steps:
+        improved = False
+        for i, (value, spec) in enumerate(zip(args, arg_specs)):
+            for candidate in shrink_value(value, spec):
+                steps += 1
+                trial = args[:i] + [candidate] + args[i + 1:]
+                if fails(trial):
+                    args = trial
+                    improved = True
+                    break
+                if steps >= max_steps:
+                    return args
+            if improved:
+                break
+    return args
+
+
+# --- running ------------------------------------------------------------------
+
+# Per-process LRU cache of executed modules: {source hash: namespace}. The
+# test runner worker lives as long as the editor, and every edit of the
+# student's code is a new entry, so only the last few are kept
+MAX_MODULES = 8
+_modules = collections.OrderedDict()
+
+
+def _load_module(filename, source):
+    key = code_cache.source_hash(source, filename)
+    namespace = _modules.get(key)
+    if namespace is None:
+        namespace = {}
+        with contextlib.redirect_stdout(io.StringIO()):
+            exec(code_cache.compile_source(source, filename), namespace)
+        _modules[key] = namespace
+        while len(_modules) > MAX_MODULES:
+            _modules.popitem(last=False)
+    else:
+        _modules.move_to_end(key)
+    return namespace
+
+
+def check_case(student_func, reference_func, args, rtol=None, atol=None):
+    """
+    Run both functions on args
+
+    Returns:
+        None if they agree (or the reference rejects the input),
+        otherwise (got, expected, error)
+    """
+    try:
+        expected = reference_func(*args)
+    except Exception:
+        return None
+    try:
+        got = student_func(*args)
+    except Exception as e:
+        return (None, expected, f"{type(e).__name__}: {e}")
+    if comparison.compare(got, expected, rtol, atol):
+        return None
+    return (got, expected, None)
+
+
+def _run_batch(task):
+    """Worker entry point: run cases [start, stop) and report failures"""
+    (student, reference, function, arg_specs, seed, start, stop, rtol, atol) = task
+    student_func = _load_module(*student).get(function)
+    reference_func = _load_module(*reference)[function]
+    failures = []
+    failed = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for index in range(start, stop):
+            args = generate_case(arg_specs, seed, index)
+            if student_func is None:
+                result = (None, None, f"Function '{function}' not found")
+            else:
+                result = check_case(student_func, reference_func, args, rtol, atol)
+            if result is not None:
+                failed += 1
+                if len(failures) < FAILURES_PER_BATCH:
+                    failures.append((index, args))
+    return stop - start, failed, failures
+
+
+class DifferentialResult:
+    def __init__(self, function, cases, failed, elapsed, workers, counterexample=None):
+        self.function = function
+        self.cases = cases
+        self.failed = failed
+        self.elapsed = elapsed
+        self.workers = workers
+        # (args, got, expected, error) after shrinking
+        self.counterexample = counterexample
+
+    @property
+    def ok(self):
+        return self.failed == 0
+
+
+def run_differential(spec, student, exercise_dir):
+    """
+    Run one [[differential]] entry
+
+    Args:
+        spec: the TOML table
+        student: (filename, source) of the student's code
+        exercise_dir: directory holding the reference solution
+    Returns:
+        DifferentialResult
+    """
+    function = spec.get('function')
+    arg_specs = spec.get('args', [])
+    if not function:
+        raise DifferentialError("[[differential]] needs a function")
+
+    reference_path = os.path.join(exercise_dir, spec.get('reference', 'solution.py'))
+    try:
+        with open(reference_path, 'r', encoding='utf-8') as f:
+            reference = (reference_path, f.read())
+    except OSError:
+        raise DifferentialError(f"Reference solution not found: {reference_path}")
+    if function not in _load_module(*reference):
+        raise DifferentialError(f"Reference solution has no function '{function}'")
+
+    cases = spec.get('cases', DEFAULT_CASES)
+    seed = spec.get('seed', 0)
+    batch = max(1, spec.get('batch', DEFAULT_BATCH))
+    rtol, atol = spec.get('rtol'), spec.get('atol')
+    workers = min(spec.get('workers', os.cpu_count() or 1), MAX_WORKERS)
+    timeout = spec.get('timeout', DEFAULT_TIMEOUT)
+    tasks = [
+        (student, reference, function, arg_specs, seed, start, min(start + batch, cases), rtol, atol)
+        for start in range(0, cases, batch)
+    ]
+
+    started = time.perf_counter()
+    if workers > 1 and len(tasks) > 1:
+        try:
+            pool = multiprocessing.Pool(min(workers, len(tasks)))
+        except (OSError, RuntimeError):
+            # No usable worker processes here; fall back to in-process
+            pool = None
+        if pool is not None:
+            # Leaving the block terminates the workers, finished or not
+            with pool:
+                try:
+                    results = pool.map_async(_run_batch, tasks).get(timeout)
+                except multiprocessing.TimeoutError:
+                    raise DifferentialError(f"Random cases did not finish within {timeout:g}s (endless loop?)")
+        else:
+            workers = 1
+            results = [_run_batch(task) for task in tasks]
+    else:
+        workers = 1
+        results = [_run_batch(task) for task in tasks]
+
+    failed = sum(r[1] for r in results)
+    failures = [f for r in results for f in r[2]]
+
+    counterexample = None
+    if failures:
+        counterexample = _minimal_counterexample(failures, student, reference, function,
+                                                 arg_specs, rtol, atol)
+
+    return DifferentialResult(function, cases, failed, time.perf_counter() - started,
+                              workers, counterexample)
+
+
+def _minimal_counterexample(failures, student, reference, function, arg_specs, rtol, atol):
+    """Shrink the first failing case and describe the outcome"""
+    student_func = _load_module(*student).get(function)
+    reference_func = _load_module(*reference)[function]
+    _, args = min(failures)
+
+    if student_func is None:
+        return (args, None, None, f"Function '{function}' not found")
+
+    def fails(trial):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return check_case(student_func, reference_func, trial, rtol, atol) is not None
+
+    args = shrink(args, arg_specs, fails)
+    with contextlib.redirect_stdout(io.StringIO()):
+        got, expected, error = check_case(student_func, reference_func, args, rtol, atol)
+    return (args, got, expected, error)
@@ -0,0 +1,192 @@
+"""
+Persistent cache of grading results
+
+Results are keyed by (normalized source hash, suite hash):
+
+- the source hash is taken over the AST, so edits that only touch
+  whitespace or comments map to the same key (and so do identical copies
+  handed in by different students)
+- the suite hash covers the tests.toml files, everything they reference
+  (generator files, dataset CSVs, the reference solution of a
+  [[differential]] check) and the grading code itself, so fixing a test
+  suite invalidates exactly the results graded against it
+
+Stored in SQLite (WAL mode), which handles several grading processes
+sharing one cache file.
+"""
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib
+
+
+DEFAULT_PATH = os.environ.get("COURSE_CHECKER_RESULTS_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "course_checker", "results.sqlite3"
+)
+
+# Grading code whose changes must invalidate cached results
+RUNNER_DIR = os.path.dirname(os.path.abspath(__file__))
+RUNNER_MODULES = ("test_runner.py", "comparison.py", "case_sources.py", "datasets.py",
+                  "differential.py", "code_cache.py")
+
+# Fields of the run that produced a result (what the code printed, which
+# includes file paths; when and how long), not of the code: identical code
+# handed in by another student must not see them
+RUN_FIELDS = ("output", "cached", "graded_at", "duration")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    source_hash TEXT NOT NULL,
+    suite_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (source_hash, suite_hash)
+)
+"""
+
+
+def normalized_source_hash(source):
+    """
+    Hash of the code's AST (positions excluded)
+
+    Code that doesn't parse is hashed as text; it fails the same way anyway.
+    """
+    if isinstance(source, bytes):
+        source = source.decode("utf-8", errors="replace")
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return "raw-" + hashlib.sha256(source.encode("utf-8")).hexdigest()
+    dump = ast.dump(tree, annotate_fields=False, include_attributes=False)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+def _suite_dependencies(test_file):
+    """Files a tests.toml pulls in, besides itself"""
+    exercise_dir = os.path.dirname(os.path.abspath(test_file))
+    try:
+        with open(test_file, "rb") as f:
+            tests = tomllib.load(f)
+    except (OSError, tomllib.TOMLDecodeError):
+        return []
+    names = [spec.get("file") for spec in tests.get("generator", [])]
+    names += [spec.get("file") for spec in tests.get("dataset", [])]
+    names += [spec.get("reference", "solution.py") for spec in tests.get("differential", [])]
+    return [os.path.join(exercise_dir, name) for name in names if isinstance(name, str)]
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+# {tuple of test files: (((path, stat key), ...), hash)}
+_suite_memo = {}
+_memo_lock = threading.Lock()
+
+
+def suite_hash(test_files):
+    """
+    Hash of one or more test files, their dependencies and the grading code
+
+    Memoized on the files' mtimes and sizes, so a burst of submissions for
+    the same exercise doesn't re-read the suite each time.
+    """
+    test_files = tuple(os.path.abspath(path) for path in test_files)
+    memo = _suite_memo.get(test_files)
+    if memo is not None and all(_stat_key(path) == key for path, key in memo[0]):
+        return memo[1]
+
+    paths = list(test_files)
+    for test_file in test_files:
+        paths += _suite_dependencies(test_file)
+    paths += [os.path.join(RUNNER_DIR, name) for name in RUNNER_MODULES]
+
+    digest = hashlib.sha256()
+    stats = []
+    for path in paths:
+        stats.append((path, _stat_key(path)))
+        digest.update(os.path.basename(path).encode("utf-8") + b"\0")
+        try:
+            with open(path, "rb") as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        except OSError:
+            digest.update(b"<missing>")
+    value = digest.hexdigest()
+    with _memo_lock:
+        _suite_memo[test_files] = (tuple(stats), value)
+    return value
+
+
+def shareable(result):
+    """result without its RUN_FIELDS"""
+    return {key: value for key, value in result.items() if key not in RUN_FIELDS}
+
+
+class ResultsCache:
+    """SQLite-backed {(source_hash, suite_hash): result dict}"""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # sqlite3 connections can't be shared between threads
+        self._local = threading.local()
+        self._connect().execute(_SCHEMA)
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, source_hash, suite_hash):
+        """Cached result dict, or None"""
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                "SELECT result FROM results WHERE source_hash = ? AND suite_hash = ?",
+                (source_hash, suite_hash),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE results SET hits = hits + 1 WHERE source_hash = ? AND suite_hash = ?",
+                (source_hash, suite_hash),
+            )
+        except sqlite3.Error:
+            # The cache is an optimization; a locked or broken file means "grade it"
+            return None
+        # Entries written before RUN_FIELDS were left out
+        return shareable(json.loads(row[0]))
+
+    def put(self, source_hash, suite_hash, result):
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO results (source_hash, suite_hash, result, created) "
+                "VALUES (?, ?, ?, ?)",
+                (source_hash, suite_hash, json.dumps(shareable(result)), time.time()),
+            )
+        except sqlite3.Error:
+            pass
+
+    def stats(self):
+        """{"entries", "hits", "suites"}"""
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(hits), 0), COUNT(DISTINCT suite_hash) FROM results"
+        ).fetchone()
+        return {"entries": row[0], "hits": row[1], "suites": row[2]}
@@ -0,0 +1,196 @@
+"""
+Content roots: one per course
+
+Each course has its own exercise tree, catalog, search index, file cache
+and content watcher, so a large course's rescan or rebuild only touches
+its own state; requests for the other courses never wait on it.
+
+Without a course config the server has a single root laid out as before
+(serverstr/ and res/ in the working directory, or EXERCISE_BUILD_DIR). With
+EXERCISE_COURSES pointing at a TOML file, courses are mounted under
+/courses/<name>/api/... (the default course also stays at /api/...):
+
+    # Shared resource directories, searched after each course's own
+    res = ["res"]
+    default = "python101"
+
+    [courses.python101]
+    content = "python101/serverstr"
+    res = ["python101/res"]
+    cache_entries = 512          # open file descriptors
+    payload_cache_entries = 2048 # rendered exercise responses
+
+    [courses.datascience]
+    build = "build/datascience/current"   # a build.py output (read mode)
+
+Relative paths are resolved against the config file's directory.
+"""
+import os
+import re
+import threading
+
+import bundles
+import search
+from catalog import Catalog, exercise_changes
+from fileserve import FileCache
+from middleware import CoalescingCache
+from pathindex import PathIndex
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib
+
+
+# Name of the course of a server without a course config
+DEFAULT_COURSE = "main"
+DEFAULT_CACHE_ENTRIES = 256
+DEFAULT_PAYLOAD_ENTRIES = 1024
+COURSE_NAME = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_.-]*$')
+
+
+class ContentRoot:
+    """
+    One course's exercise tree and everything derived from it
+
+    Args:
+        name: Course name (the <course> of /courses/<course>/api/...)
+        base_dir: Exercise tree (<bucket>/<code>/index.md)
+        res_dirs: Global resource directories, searched in order
+        build_tree: The build's server/ directory when serving a build (read mode)
+        cache_entries: Open file descriptors this course may keep cached
+        payload_cache_entries: Rendered exercise responses kept in memory
+    """
+
+    def __init__(self, name, base_dir, res_dirs, build_tree=None, cache_entries=DEFAULT_CACHE_ENTRIES,
+                 payload_cache_entries=DEFAULT_PAYLOAD_ENTRIES):
+        self.name = name
+        self.base_dir = os.path.abspath(base_dir)
+        self.res_dirs = [os.path.abspath(path) for path in res_dirs]
+        self.build_tree = os.path.abspath(build_tree) if build_tree else None
+        if self.build_tree:
+            self.index_file = os.path.join(self.build_tree, 'catalog.json')
+            self.search_file = os.path.join(self.build_tree, 'search.json')
+        else:
+            self.index_file = None
+            self.search_file = None
+        self.catalog = Catalog(self.base_dir, index_file=self.index_file)
+        # Which request paths name a file, and where (see pathindex.py)
+        self.paths = PathIndex(self.base_dir, self.res_dirs)
+        self.search = None
+        self.file_cache = FileCache(max_entries=cache_entries)
+        self.payloads = CoalescingCache("exercise", max_entries=payload_cache_entries)
+        self.chunk_index = bundles.ChunkIndex()
+        # Dataset conversions (server.py) and refreshes, per course
+        self.dataset_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @classmethod
+    def from_build(cls, name, build_dir, res_dirs=(), **options):
+        """A build.py output directory; its own res/ comes before res_dirs"""
+        build_tree = os.path.join(os.path.abspath(build_dir), 'server')
+        return cls(
+            name,
+            os.path.join(build_tree, 'exercises'),
+            [os.path.join(build_tree, 'res')] + list(res_dirs),
+            build_tree=build_tree,
+            **options
+        )
+
+    @property
+    def watch_dirs(self):
+        """Directories whose changes concern this course"""
+        tree = self.build_tree or self.base_dir
+        return [tree] + [path for path in self.res_dirs if not path.startswith(tree + os.sep)]
+
+    def load(self):
+        """Scan the tree (or read the build's index), list its files and load the search index"""
+        self.catalog.refresh()
+        self.paths.rebuild(self.catalog.buckets)
+        self.search = self._load_search()
+        return self
+
+    def _load_search(self):
+        """The build's search index in read mode, otherwise one built from the tree"""
+        if self.search_file and os.path.isfile(self.search_file):
+            try:
+                return search.SearchIndex.load(self.search_file)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not load {self.search_file}: {e}")
+        return search.build_index(self.base_dir, self.catalog.buckets)
+
+    def update(self, changed):
+        """
+        Bring the catalog, file listing and search index up to date after a
+        content change
+
+        Returns:
+            {(bucket, code): [changed files]} (see catalog.exercise_changes)
+        """
+        with self._refresh_lock:
+            self.catalog.refresh()
+            if self.build_tree:
+                # A new build replaced the whole tree, index included
+                self.paths.rebuild(self.catalog.buckets)
+                self.search = self._load_search()
+            else:
+                self.paths.update(self.catalog.buckets, changed)
+                self.search.update_paths(self.base_dir, changed)
+        return exercise_changes(self.base_dir, changed)
+
+
+def single_root(build_dir=None):
+    """
+    The root of a server without a course config: build_dir in read mode,
+    otherwise serverstr/ and res/ in the working directory
+    """
+    if build_dir:
+        return ContentRoot.from_build(DEFAULT_COURSE, build_dir)
+    root = ContentRoot(DEFAULT_COURSE, 'serverstr', ['res'])
+    os.makedirs(root.base_dir, exist_ok=True)
+    os.makedirs(root.res_dirs[0], exist_ok=True)
+    return root
+
+
+def load_config(path):
+    """
+    Read a course config (see the module docstring)
+
+    Returns:
+        ({name: ContentRoot}, default course name)
+
+    Raises:
+        ValueError: Invalid config
+    """
+    with open(path, 'rb') as f:
+        config = tomllib.load(f)
+    config_dir = os.path.dirname(os.path.abspath(path))
+
+    def resolve(value):
+        return os.path.join(config_dir, os.path.expanduser(value))
+
+    shared_res = [resolve(p) for p in config.get('res', [])]
+    courses = config.get('courses')
+    if not isinstance(courses, dict) or not courses:
+        raise ValueError(f"{path}: no [courses.<name>] tables")
+
+    roots = {}
+    for name, spec in courses.items():
+        if not COURSE_NAME.match(name):
+            raise ValueError(f"{path}: invalid course name {name!r}")
+        options = {
+            'cache_entries': int(spec.get('cache_entries', DEFAULT_CACHE_ENTRIES)),
+            'payload_cache_entries': int(spec.get('payload_cache_entries', DEFAULT_PAYLOAD_ENTRIES)),
+        }
+        res_dirs = [resolve(p) for p in spec.get('res', [])] + shared_res
+        if 'build' in spec:
+            roots[name] = ContentRoot.from_build(name, resolve(spec['build']), res_dirs, **options)
+        elif 'content' in spec:
+            roots[name] = ContentRoot(name, resolve(spec['content']), res_dirs, **options)
+        else:
+            raise ValueError(f"{path}: course {name!r} needs 'content' or 'build'")
+
+    default = config.get('default', next(iter(roots)))
+    if default not in roots:
+        raise ValueError(f"{path}: default course {default!r} is not configured")
+    return roots, default
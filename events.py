@@ -0,0 +1,260 @@
+"""
+Live content events (server-sent events)
+
+The content watcher publishes one small message per changed exercise;
+clients (the Thonny plugin) subscribe to /api/events and refresh what
+they show instead of polling.
+
+- EventBus keeps the last events in a ring buffer. Event ids carry a
+  per-process epoch, so a client reconnecting with Last-Event-ID gets
+  exactly what it missed, or a "reset" when that is no longer known
+  (server restarted, or it was away for too long)
+- EventStreamServer serves the stream on stdlib asyncio: hundreds of
+  idle connections cost one thread, not one worker thread each. serve.py
+  runs it in the gunicorn master, next to the content watcher
+"""
+import asyncio
+import collections
+import json
+import secrets
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+
+BUFFER_SIZE = 1000
+HEARTBEAT_SECONDS = 15.0
+# Client reconnect delay sent with the stream ("retry:" field)
+RETRY_MILLISECONDS = 3000
+MAX_CONNECTIONS = 1000
+MAX_REQUEST_HEADER_BYTES = 16 * 1024
+
+Event = collections.namedtuple("Event", "seq type data")
+
+
+def format_event(event_id, event_type, data):
+    """One SSE message"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def matches(event, keys, course=None):
+    """
+    Whether an exercise event concerns one of keys ("bucket/code"; empty
+    means all) of course (None means any)
+    """
+    if event.type != "exercise":
+        return True
+    if course is not None and event.data.get("course") != course:
+        return False
+    return not keys or f"{event.data['bucket']}/{event.data['code']}" in keys
+
+
+class EventBus:
+    """
+    Thread-safe ring buffer of events with blocking and callback waiters
+    """
+
+    def __init__(self, capacity=BUFFER_SIZE):
+        self.epoch = secrets.token_hex(4)
+        self._events = collections.deque(maxlen=capacity)
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._listeners = []
+
+    def _event_id(self, seq):
+        return f"{self.epoch}-{seq}"
+
+    @property
+    def last_id(self):
+        return self._event_id(self._seq)
+
+    def publish(self, event_type, data):
+        """Append an event and wake every waiting stream"""
+        with self._condition:
+            self._seq += 1
+            self._events.append(Event(self._seq, event_type, data))
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener()
+
+    def add_listener(self, callback):
+        """Call callback() (from the publishing thread) after each event"""
+        with self._condition:
+            self._listeners.append(callback)
+
+    def _position(self, last_id):
+        """Sequence number a client has seen, or None if unknown to this bus"""
+        epoch, _, seq = (last_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        oldest = self._events[0].seq if self._events else self._seq + 1
+        if seq > self._seq or seq < oldest - 1:
+            return None
+        return seq
+
+    def read(self, last_id, keys=(), course=None):
+        """
+        SSE messages a client has not seen yet
+
+        Args:
+            last_id: Last event id the client received (None for a new client)
+            keys: Only exercise events for these "bucket/code" keys
+            course: Only exercise events of this course
+
+        Returns:
+            (messages, new last_id); a "reset" message when last_id is
+            unknown, telling the client to reload whatever it shows
+        """
+        with self._condition:
+            if last_id is None:
+                return [], self.last_id
+            seq = self._position(last_id)
+            if seq is None:
+                return [format_event(self.last_id, "reset", {})], self.last_id
+            messages = [
+                format_event(self._event_id(event.seq), event.type, event.data)
+                for event in self._events
+                if event.seq > seq and matches(event, keys, course)
+            ]
+            return messages, self.last_id
+
+    def wait(self, last_id, timeout):
+        """Block until there are events after last_id (or timeout)"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.last_id != last_id, timeout)
+
+
+def stream(bus, last_id, keys=(), duration=None, heartbeat=HEARTBEAT_SECONDS, course=None):
+    """
+    Blocking SSE generator for a thread-per-request server (Flask)
+
+    Ends after duration seconds; the client reconnects with Last-Event-ID.
+    """
+    deadline = time.monotonic() + duration if duration else None
+    yield f"retry: {RETRY_MILLISECONDS}\n\n"
+    messages, last_id = bus.read(last_id, keys, course)
+    while True:
+        if messages:
+            yield "".join(messages)
+        elif not bus.wait(last_id, heartbeat):
+            yield ": keepalive\n\n"
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        messages, last_id = bus.read(last_id, keys, course)
+
+
+class EventStreamServer:
+    """
+    Minimal HTTP server for the event stream only, on asyncio
+
+    GET <path>[?exercise=bucket/code...][&course=name] with an optional
+    Last-Event-ID header (or ?last_event_id=) streams events until the
+    client leaves.
+    """
+
+    def __init__(self, bus, host="0.0.0.0", port=5001, path="/api/events",
+                 heartbeat=HEARTBEAT_SECONDS, max_connections=MAX_CONNECTIONS):
+        self.bus = bus
+        self.host = host
+        self.port = port
+        self.path = path
+        self.heartbeat = heartbeat
+        self.max_connections = max_connections
+        self.connections = 0
+        self._loop = None
+        self._changed = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Serve from a daemon thread; returns once listening"""
+        thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name="event-stream", daemon=True)
+        thread.start()
+        self._ready.wait(10)
+        return thread
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.bus.add_listener(self._notify)
+        server = await asyncio.start_server(self._handle, self.host, self.port,
+                                            limit=MAX_REQUEST_HEADER_BYTES)
+        self._ready.set()
+        async with server:
+            await server.serve_forever()
+
+    def _notify(self):
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        # Wake everyone waiting on the current event, then start a new one
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _handle(self, reader, writer):
+        try:
+            request = await self._read_request(reader)
+            if request is None:
+                return
+            method, target, headers = request
+            url = urlsplit(target)
+            if method != "GET" or url.path != self.path:
+                await self._respond(writer, "404 Not Found", b'{"error": "Resource not found"}')
+                return
+            if self.connections >= self.max_connections:
+                await self._respond(writer, "503 Service Unavailable", b'{"error": "Too many event streams"}',
+                                    extra=f"Retry-After: {RETRY_MILLISECONDS // 1000}\r\n")
+                return
+            query = parse_qs(url.query)
+            last_id = headers.get("last-event-id") or (query.get("last_event_id") or [None])[0]
+            self.connections += 1
+            try:
+                course = (query.get("course") or [None])[0]
+                await self._stream(writer, last_id, set(query.get("exercise", [])), course)
+            finally:
+                self.connections -= 1
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readuntil(b"\r\n")).decode("latin-1").split()
+        if len(request_line) != 3:
+            return None
+        headers = {}
+        while True:
+            line = (await reader.readuntil(b"\r\n")).decode("latin-1")
+            if line == "\r\n":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return request_line[0], request_line[1], headers
+
+    async def _respond(self, writer, status, body, extra=""):
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n{extra}Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream(self, writer, last_id, keys, course=None):
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Access-Control-Allow-Origin: *\r\nConnection: close\r\n\r\n"
+            + f"retry: {RETRY_MILLISECONDS}\n\n".encode("utf-8")
+        )
+        await writer.drain()
+        while True:
+            # Taken before reading, so an event published in between still wakes us
+            changed = self._changed
+            messages, last_id = self.bus.read(last_id, keys, course)
+            if messages:
+                writer.write("".join(messages).encode("utf-8"))
+            else:
+                try:
+                    await asyncio.wait_for(changed.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+            await writer.drain()
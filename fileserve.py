@@ -0,0 +1,262 @@
+"""
+Static File Serving
+Fast path for exercise files and resources
+
+- one stat() per candidate path: it answers "is this a regular file?" and
+  gives the size/mtime used for caching, ETag and Content-Length
+- open descriptors are cached with their stat key and reused across requests
+- whole files go through wsgi.file_wrapper, which gunicorn turns into
+  os.sendfile(), so the bytes never pass through Python
+- single byte ranges get 206 Partial Content (also via sendfile)
+
+Cached descriptors are shared by concurrent requests, so nothing may move
+their file offset: reads use os.pread and sendfile is given explicit offsets.
+"""
+import collections
+import os
+import stat
+import threading
+
+from flask import Response, request
+from werkzeug.http import http_date
+
+import metrics
+
+
+BLOCK_SIZE = 256 * 1024
+
+
+class _Entry:
+    """An open descriptor plus the stat result it was opened for"""
+
+    def __init__(self, path, fd, st):
+        self.path = path
+        self.fd = fd
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.key = _stat_key(st)
+        self.etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+        self.users = 0
+        self.retired = False
+
+
+def _stat_key(st):
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class FileCache:
+    """
+    LRU cache of open file descriptors keyed by absolute path
+
+    Entries are reference counted: an evicted or replaced entry is only
+    closed once the last response using it has finished.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def acquire(self, path):
+        """
+        Return an entry for path, or None if it isn't a regular file
+
+        The caller must release() the entry when done with it.
+        """
+        try:
+            st = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+
+        key = _stat_key(st)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key == key:
+                self._entries.move_to_end(path)
+                entry.users += 1
+                metrics.record_cache("file", True)
+                return entry
+
+        metrics.record_cache("file", False)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        new_entry = _Entry(path, fd, st)
+        new_entry.users = 1
+
+        with self._lock:
+            stale = self._entries.pop(path, None)
+            if stale is not None:
+                self._retire(stale)
+            self._entries[path] = new_entry
+            while len(self._entries) > self.max_entries:
+                _, oldest = self._entries.popitem(last=False)
+                self._retire(oldest)
+        return new_entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.users -= 1
+            if entry.retired and entry.users == 0:
+                os.close(entry.fd)
+
+    def _retire(self, entry):
+        # Called with the lock held
+        entry.retired = True
+        if entry.users == 0:
+            os.close(entry.fd)
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                _, entry = self._entries.popitem()
+                self._retire(entry)
+
+
+class _FileSlice:
+    """
+    File-like view of bytes [start, stop) of a descriptor
+
+    fileno() lets a server with sendfile support send it directly;
+    read() is the fallback and uses pread so the descriptor's offset
+    is never moved. close() runs on_close once; the WSGI server calls
+    it (directly or through its file wrapper) when the response is done.
+    """
+
+    def __init__(self, fd, start, stop, on_close=None):
+        self._fd = fd
+        self._pos = start
+        self._stop = stop
+        self._on_close = on_close
+
+    def fileno(self):
+        return self._fd
+
+    def read(self, size=-1):
+        remaining = self._stop - self._pos
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b""
+        data = os.pread(self._fd, size, self._pos)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        on_close, self._on_close = self._on_close, None
+        if on_close is not None:
+            on_close()
+
+    def __iter__(self):
+        while True:
+            data = self.read(BLOCK_SIZE)
+            if not data:
+                return
+            yield data
+
+
+def requested_range(entry, ranges, if_range):
+    """
+    (start, stop) for a satisfiable single-range request, None to send the
+    whole file, or False if the range can't be satisfied
+
+    Args:
+        ranges: Parsed Range header (werkzeug Range or None)
+        if_range: Parsed If-Range header (werkzeug IfRange)
+    """
+    if ranges is None or ranges.units != "bytes":
+        return None
+    # If-Range: only honour the range when the client's copy is current
+    if if_range.etag is not None and if_range.etag != entry.etag.strip('"'):
+        return None
+    if if_range.date is not None and int(entry.mtime) > if_range.date.timestamp():
+        return None
+    if len(ranges.ranges) != 1:
+        # Multipart ranges aren't worth it here; a full 200 is allowed
+        return None
+    byte_range = ranges.range_for_length(entry.size)
+    if byte_range is None:
+        return False
+    return byte_range
+
+
+def not_modified(entry, if_none_match, if_modified_since):
+    """
+    Whether the client's copy is current
+
+    Args:
+        if_none_match: Parsed If-None-Match header (werkzeug ETags)
+        if_modified_since: Parsed If-Modified-Since header (datetime or None)
+    """
+    if if_none_match:
+        return if_none_match.contains(entry.etag.strip('"'))
+    if if_modified_since is not None:
+        return int(entry.mtime) <= if_modified_since.timestamp()
+    return False
+
+
+def send_file_fast(path, mimetype, cache):
+    """
+    Serve path from the descriptor cache
+
+    Returns:
+        a Response, or None if path is not a regular file (caller 404s
+        or tries the next candidate)
+    """
+    entry = cache.acquire(path)
+    if entry is None:
+        return None
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": entry.etag,
+        "Last-Modified": http_date(entry.mtime),
+    }
+
+    if not_modified(entry, request.if_none_match, request.if_modified_since):
+        cache.release(entry)
+        return Response(status=304, headers=headers)
+
+    byte_range = requested_range(entry, request.range, request.if_range)
+    if byte_range is False:
+        cache.release(entry)
+        headers["Content-Range"] = f"bytes */{entry.size}"
+        return Response(status=416, headers=headers)
+
+    private_fd = None
+    if byte_range is None:
+        status = 200
+        start, stop = 0, entry.size
+        fd = entry.fd
+    else:
+        status = 206
+        start, stop = byte_range
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{entry.size}"
+        # gunicorn's sendfile starts at the descriptor's current offset,
+        # so a partial response gets its own descriptor positioned at start
+        private_fd = os.open(path, os.O_RDONLY)
+        os.lseek(private_fd, start, os.SEEK_SET)
+        fd = private_fd
+
+    def cleanup():
+        if private_fd is not None:
+            os.close(private_fd)
+        cache.release(entry)
+
+    # direct_passthrough hands the body to the server untouched, so the
+    # server (not Response.close) is what calls body.close() -> cleanup
+    body = _FileSlice(fd, start, stop, on_close=cleanup)
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None:
+        body = file_wrapper(body, BLOCK_SIZE)
+
+    response = Response(body, status=status, headers=headers, mimetype=mimetype,
+                        direct_passthrough=True)
+    response.content_length = stop - start
+    return response
@@ -0,0 +1,570 @@
+"""
+Submission Grading
+Content-addressed submission store and a bounded grading queue
+
+Request threads only hash, store and enqueue a submission; grading runs on
+dispatcher threads, each driving one test_runner.py subprocess at a time
+(--json output), so the pool is isolated from student code that loops
+forever, exits the interpreter or crashes. The runner gets a one-time token
+on stdin before the student's code runs, and only a report line carrying it,
+with an exit code that agrees with it, counts; printing a fake report is
+not enough to pass. (Student code runs in the runner's process, so code
+that patches the runner itself needs OS-level sandboxing to be stopped.)
+
+On-disk layout below the grading directory:
+
+    blobs/ab/abcdef....py        submitted source, by sha256 (duplicates collapse)
+    submissions/<id>.json        bucket, exercise, source hash, submit time
+    results/<id>.json            grading result, written once grading finished
+    queued/<id>.json             pid of the process grading it, until then
+
+Server workers can be replaced at any time (serve.py reloads them when
+content changes), taking their queues with them. Each process therefore
+looks for queued submissions whose process is gone, when it starts and
+then every RECOVER_INTERVAL seconds, and grades them itself.
+
+A submission id is derived from (bucket, exercise, source hash), so the same
+code submitted twice for the same exercise is the same submission and is
+graded once. State lives on disk, so any server process can answer for a
+submission that another process graded.
+
+With a results cache (results_cache.py) a submission whose code matches an
+earlier one up to comments and formatting, graded against the same suite,
+is answered from the cache without being queued.
+
+With an attempt store (analytics.py) every accepted submission is also
+recorded as one student's attempt, and every result as its outcome, for
+class-wide statistics.
+"""
+import hashlib
+import json
+import os
+import queue
+import secrets
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import metrics
+
+RUNNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'course_checker', 'tests')
+# Appended, so the runner's helper modules never shadow installed packages
+if RUNNER_DIR not in sys.path:
+    sys.path.append(RUNNER_DIR)
+import results_cache
+
+RUNNER = os.path.join(RUNNER_DIR, 'test_runner.py')
+
+# How often a long-poll checks for a result graded by another process
+POLL_INTERVAL = 0.2
+# How often each process looks for submissions orphaned by a dead one
+RECOVER_INTERVAL = 10.0
+
+
+class QueueFull(Exception):
+    """Raised when the grading queue is at capacity"""
+
+
+def _write_json(path, data):
+    """Write JSON atomically (readers see the old file or the new one)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class SubmissionStore:
+    """Submissions and results on disk, sources stored by content hash"""
+
+    def __init__(self, root):
+        self.root = root
+        for name in ('blobs', 'submissions', 'results', 'queued'):
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+
+    def blob_path(self, source_hash):
+        return os.path.join(self.root, 'blobs', source_hash[:2], source_hash + '.py')
+
+    def put_source(self, source_bytes):
+        """Store source once; returns its sha256"""
+        source_hash = hashlib.sha256(source_bytes).hexdigest()
+        path = self.blob_path(source_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(source_bytes)
+            os.replace(tmp_path, path)
+        return source_hash
+
+    def submissions(self):
+        """All submission records"""
+        directory = os.path.join(self.root, 'submissions')
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.json'):
+                record = _read_json(os.path.join(directory, name))
+                if record is not None:
+                    yield record
+
+    def read_source(self, source_hash):
+        with open(self.blob_path(source_hash), 'rb') as f:
+            return f.read()
+
+    def delete_result(self, submission_id):
+        try:
+            os.unlink(os.path.join(self.root, 'results', submission_id + '.json'))
+        except FileNotFoundError:
+            pass
+
+    def submission(self, submission_id):
+        return _read_json(os.path.join(self.root, 'submissions', submission_id + '.json'))
+
+    def save_submission(self, record):
+        _write_json(os.path.join(self.root, 'submissions', record['id'] + '.json'), record)
+
+    def result(self, submission_id):
+        return _read_json(os.path.join(self.root, 'results', submission_id + '.json'))
+
+    def save_result(self, submission_id, result):
+        _write_json(os.path.join(self.root, 'results', submission_id + '.json'), result)
+
+    def claim_path(self, submission_id):
+        return os.path.join(self.root, 'queued', submission_id + '.json')
+
+    def claim(self, submission_id, exercise_dir):
+        """Mark a submission as queued in this process"""
+        _write_json(self.claim_path(submission_id), {'pid': os.getpid(), 'exercise_dir': exercise_dir})
+
+    def release(self, submission_id):
+        try:
+            os.unlink(self.claim_path(submission_id))
+        except FileNotFoundError:
+            pass
+
+    def take_over(self, submission_id):
+        """
+        Claim a queued submission whose process has died
+
+        Returns:
+            The claim ({"pid", "exercise_dir"}) if this process got it, else None
+        """
+        claim = _read_json(self.claim_path(submission_id))
+        if claim is None or _alive(claim['pid']):
+            return None
+        # One process wins the takeover of a given dead claim
+        token = self.claim_path(submission_id) + f".{claim['pid']}.takeover"
+        try:
+            os.close(os.open(token, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        try:
+            # Someone else may have taken it over between reading and locking
+            current = _read_json(self.claim_path(submission_id))
+            if current is None or current['pid'] != claim['pid']:
+                return None
+            self.claim(submission_id, claim['exercise_dir'])
+        finally:
+            os.unlink(token)
+        return claim
+
+    def orphans(self):
+        """Ids of claimed submissions without a result"""
+        directory = os.path.join(self.root, 'queued')
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                sub_id = name[:-len('.json')]
+                if self.result(sub_id) is None:
+                    yield sub_id
+
+
+def _kill_group(process):
+    """Kill a runner started in its own session, and everything it started"""
+    if os.name != 'posix':
+        process.kill()
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def parse_report(stdout, stderr, returncode, nonce):
+    """
+    The runner's report from its output: the last line carrying nonce,
+    accepted only if the exit code agrees with its "success"
+
+    Returns:
+        (result, complete) as for Grader._grade
+    """
+    prefix = nonce + ' '
+    report = None
+    for line in reversed(stdout.splitlines()):
+        if line.startswith(prefix):
+            try:
+                report = json.loads(line[len(prefix):])
+            except ValueError:
+                pass
+            break
+    if isinstance(report, dict) and report.get('success') is (returncode == 0):
+        return report, True
+    # Student code exited the interpreter before the report was written,
+    # or its output isn't what the runner wrote
+    return {
+        'success': False,
+        'error': f"Test run ended unexpectedly (exit code {returncode})",
+        'output': (stdout + stderr)[-2000:],
+    }, False
+
+
+def submission_id(bucket, exercise_code, source_hash, course=None):
+    key = f"{course}:{bucket}/{exercise_code}" if course else f"{bucket}/{exercise_code}"
+    return hashlib.sha256(f"{key}\0{source_hash}".encode('utf-8')).hexdigest()[:32]
+
+
+class _Job:
+    def __init__(self, record, exercise_dir):
+        self.record = record
+        self.exercise_dir = exercise_dir
+        self.status = 'queued'
+        self.done = threading.Event()
+
+
+class Grader:
+    """
+    Bounded grading queue served by `workers` dispatcher threads
+
+    Threads are started lazily, in the process that first submits: with a
+    preloading server (serve.py) the module is imported in the master and
+    threads would not survive the fork into workers.
+    """
+
+    def __init__(self, root, workers=2, max_pending=500, timeout=30.0, cache=None, attempts=None):
+        self.store = SubmissionStore(root)
+        self.cache = cache
+        self.attempts = attempts
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._queue = queue.Queue(maxsize=max_pending)
+        # Jobs queued or running in this process, by submission id
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._started_pid = None
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        if self._started_pid == os.getpid():
+            return
+        with self._lock:
+            if self._started_pid == os.getpid():
+                return
+            # After a fork the parent's threads and jobs don't exist here
+            self._jobs = {}
+            for i in range(self.workers):
+                threading.Thread(target=self._dispatch, name=f'grader-{i}', daemon=True).start()
+            threading.Thread(target=self._recover_forever, name='grader-recovery', daemon=True).start()
+            self._started_pid = os.getpid()
+
+    def recover(self):
+        """
+        Queue the submissions of processes that died before grading them
+
+        Blocks while the queue is full. Returns the number recovered.
+        """
+        recovered = 0
+        for sub_id in list(self.store.orphans()):
+            if sub_id in self._jobs:
+                continue
+            claim = self.store.take_over(sub_id)
+            if claim is None:
+                continue
+            record = self.store.submission(sub_id)
+            if record is None:
+                # Its process died between claiming and storing it
+                self.store.release(sub_id)
+                continue
+            job = _Job(record, claim['exercise_dir'])
+            with self._lock:
+                self._jobs[sub_id] = job
+            self._queue.put(job)
+            recovered += 1
+        return recovered
+
+    def _recover_forever(self):
+        while True:
+            try:
+                self.recover()
+            except Exception as e:
+                print(f"Warning: could not recover queued submissions: {e}")
+            time.sleep(RECOVER_INTERVAL)
+
+    def submit(self, bucket, exercise_code, exercise_dir, source_bytes, student=None, course=None,
+               attempt=True):
+        """
+        Store and enqueue a submission (never waits for grading)
+
+        course (see courses.py) tells apart exercises with the same bucket
+        and code in different courses. With attempt=False (regrading) the
+        submission is not recorded as a new attempt.
+
+        Returns:
+            (record, status) where status is "queued", "running" or "done"
+        Raises:
+            QueueFull when the queue is at capacity
+        """
+        self._ensure_started()
+        # Grading runs in a scratch directory
+        exercise_dir = os.path.abspath(exercise_dir)
+        source_hash = self.store.put_source(source_bytes)
+        sub_id = submission_id(bucket, exercise_code, source_hash, course)
+
+        record, status = self._submit(bucket, exercise_code, exercise_dir, source_bytes, source_hash,
+                                      sub_id, student, course)
+        if attempt and self.attempts is not None:
+            self.attempts.add_attempt(course, bucket, exercise_code, student, sub_id)
+        return record, status
+
+    def _submit(self, bucket, exercise_code, exercise_dir, source_bytes, source_hash, sub_id, student, course):
+        job = self._jobs.get(sub_id)
+        if job is not None:
+            return job.record, job.status
+        if self.store.result(sub_id) is not None:
+            return self.store.submission(sub_id), 'done'
+
+        record = {
+            'id': sub_id,
+            'bucket': bucket,
+            'exercise': exercise_code,
+            'source_sha256': source_hash,
+            'submitted_at': time.time(),
+        }
+        if student:
+            record['student'] = student
+        if course:
+            record['course'] = course
+
+        if self.cache is not None:
+            tests_file = os.path.join(exercise_dir, 'tests.toml')
+            record['cache_key'] = [results_cache.normalized_source_hash(source_bytes),
+                                   results_cache.suite_hash([tests_file])]
+            cached = self.cache.get(*record['cache_key'])
+            metrics.record_cache("grading", cached is not None)
+            if cached is not None:
+                result = dict(cached, cached=True, output="", graded_at=time.time(), duration=0.0)
+                self.store.save_submission(record)
+                self.store.save_result(sub_id, result)
+                if self.attempts is not None:
+                    self.attempts.add_outcome(sub_id, result)
+                return record, 'done'
+
+        with self._lock:
+            # Another request may have queued the same code meanwhile
+            job = self._jobs.get(sub_id)
+            if job is not None:
+                return job.record, job.status
+            job = _Job(record, exercise_dir)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFull()
+            self._jobs[sub_id] = job
+            # Claimed before a dispatcher can finish (and release) it
+            self.store.claim(sub_id, exercise_dir)
+
+        self.store.save_submission(record)
+        return record, 'queued'
+
+    def regrade(self, bucket, exercise_code, exercise_dir, wait=3600.0, course=None):
+        """
+        Grade an exercise's stored submissions again, e.g. after a test suite fix
+
+        One submission per distinct (normalized) code is graded; the others
+        are then answered by the results cache. Blocks until done.
+
+        Returns:
+            {"submissions": n, "graded": n, "cached": n}
+        """
+        records = [r for r in self.store.submissions()
+                   if r['bucket'] == bucket and r['exercise'] == exercise_code
+                   and r.get('course') == course]
+        groups = {}
+        for record in records:
+            source = self.store.read_source(record['source_sha256'])
+            groups.setdefault(results_cache.normalized_source_hash(source), []).append((record, source))
+            self.store.delete_result(record['id'])
+
+        counts = {'submissions': len(records), 'graded': 0, 'cached': 0}
+        # First the representatives, then everything else (cache hits by then)
+        for batch in ([group[0] for group in groups.values()],
+                      [item for group in groups.values() for item in group[1:]]):
+            ids = []
+            for record, source in batch:
+                while True:
+                    try:
+                        submitted, status = self.submit(bucket, exercise_code, exercise_dir, source,
+                                                        record.get('student'), course, attempt=False)
+                        break
+                    except QueueFull:
+                        time.sleep(POLL_INTERVAL)
+                ids.append(submitted['id'])
+                counts['cached' if status == 'done' else 'graded'] += 1
+            for sub_id in ids:
+                self.status(sub_id, wait=wait)
+        return counts
+
+    def status(self, sub_id, wait=0.0):
+        """
+        Current state of a submission, waiting up to `wait` seconds for it to finish
+
+        Returns:
+            {"id", "status", "submission", "result"?} or None if unknown
+        """
+        # Polling clients also get orphaned submissions recovered
+        self._ensure_started()
+        deadline = time.monotonic() + wait
+        job = self._jobs.get(sub_id)
+        if job is not None and wait > 0:
+            job.done.wait(wait)
+        result = self.store.result(sub_id)
+        # Possibly queued in another server process: poll the result file
+        while result is None and job is None and time.monotonic() < deadline:
+            time.sleep(min(POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            result = self.store.result(sub_id)
+
+        record = job.record if job is not None else self.store.submission(sub_id)
+        if record is None:
+            return None
+        if result is not None:
+            status = 'done'
+        elif job is not None:
+            status = job.status
+        else:
+            status = 'queued'
+        response = {'id': sub_id, 'status': status, 'submission': record}
+        if result is not None:
+            response['result'] = result
+        return response
+
+    def _dispatch(self):
+        while True:
+            job = self._queue.get()
+            job.status = 'running'
+            started = time.perf_counter()
+            try:
+                result, complete = self._grade(job)
+            except Exception as e:
+                result, complete = {'success': False, 'error': f"Grading failed: {e}"}, False
+            # Only complete reports are cached, not timeouts or crashed runs
+            if self.cache is not None and complete and 'cache_key' in job.record:
+                self.cache.put(*job.record['cache_key'], result)
+            result['graded_at'] = time.time()
+            result['duration'] = round(time.perf_counter() - started, 3)
+            self.store.save_result(job.record['id'], result)
+            self.store.release(job.record['id'])
+            if self.attempts is not None:
+                self.attempts.add_outcome(job.record['id'], result)
+            metrics.GRADING_DURATION.observe(time.perf_counter() - started)
+            with self._lock:
+                job.status = 'done'
+                self._jobs.pop(job.record['id'], None)
+            job.done.set()
+
+    def _grade(self, job):
+        """
+        Run test_runner.py --json on the stored source
+
+        Returns:
+            (result, complete): complete is True for a genuine report of a
+            finished run, False for timeouts and runs that ended early
+        """
+        tests_file = os.path.join(job.exercise_dir, 'tests.toml')
+        code_file = self.store.blob_path(job.record['source_sha256'])
+        nonce = secrets.token_hex(16)
+        # Student code runs in an empty scratch directory, in a process
+        # group of its own so that processes it (or a differential check)
+        # starts die with it
+        with tempfile.TemporaryDirectory(prefix='grading-') as scratch:
+            process = subprocess.Popen(
+                [sys.executable, RUNNER, '--json', '--report-nonce', code_file, tests_file],
+                cwd=scratch, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                text=True, start_new_session=(os.name == 'posix'),
+                # The grading pool already uses every CPU
+                env=dict(os.environ, COURSE_CHECKER_DIFFERENTIAL_WORKERS='1'),
+            )
+            try:
+                stdout, stderr = process.communicate(nonce + '\n', timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                _kill_group(process)
+                process.communicate()
+                return {'success': False, 'error': f"Timed out after {self.timeout:g}s"}, False
+            finally:
+                _kill_group(process)
+
+        return parse_report(stdout, stderr, process.returncode, nonce)
+
+
+def main():
+    import argparse
+
+    import analytics
+
+    parser = argparse.ArgumentParser(description='Submission grading tools')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    regrade_parser = subparsers.add_parser('regrade', help='Grade stored submissions of an exercise again')
+    regrade_parser.add_argument('bucket')
+    regrade_parser.add_argument('exercise_code')
+    regrade_parser.add_argument('--content-dir', default='serverstr', help='Exercise tree (default: ./serverstr)')
+    regrade_parser.add_argument('--grading-dir', default=os.environ.get('EXERCISE_GRADING_DIR', 'grading'),
+                                help='Grading directory (default: ./grading)')
+    regrade_parser.add_argument('--course', help='Course of the exercise when the server uses a course config')
+    regrade_parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    grading_dir = os.path.abspath(args.grading_dir)
+    cache = results_cache.ResultsCache(
+        os.environ.get('GRADING_CACHE') or os.path.join(grading_dir, 'results.sqlite3')
+    )
+    # Regraded results replace the outcomes the statistics are computed from
+    attempts = analytics.AttemptStore(
+        os.environ.get('GRADING_ATTEMPTS') or os.path.join(grading_dir, 'attempts.sqlite3')
+    )
+    grader = Grader(grading_dir, workers=args.workers, cache=cache, attempts=attempts)
+    exercise_dir = os.path.join(args.content_dir, args.bucket, args.exercise_code)
+    if not os.path.isfile(os.path.join(exercise_dir, 'tests.toml')):
+        print(f"ERROR: No tests.toml in {exercise_dir}")
+        return 1
+
+    started = time.perf_counter()
+    counts = grader.regrade(args.bucket, args.exercise_code, exercise_dir, course=args.course)
+    print(f"{counts['submissions']} submission(s): {counts['graded']} graded, "
+          f"{counts['cached']} from cache ({time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Markdown resource rewriting
+Shared by server.py (per request) and build.py (once, with a placeholder URL)
+"""
+import re
+
+
+def process_markdown_resources(markdown_content, resource_base_url, has_local_res):
+    """
+    Process markdown to fix resource paths
+    
+    Converts:
+        - res/image.png -> {resource_base_url}/image.png
+        - ![alt](res/image.png) -> ![alt]({resource_base_url}/image.png)
+    """
+    # Fix markdown image syntax: ![alt](res/...)
+    markdown_content = re.sub(
+        r'!\[([^\]]*)\]\(res/([^)]+)\)',
+        rf'![\1]({resource_base_url}/\2)',
+        markdown_content
+    )
+    
+    # Fix HTML img tags: <img src="res/...">
+    markdown_content = re.sub(
+        r'<img\s+([^>]*\s+)?src=["\']res/([^"\']+)["\']',
+        rf'<img \1src="{resource_base_url}/\2"',
+        markdown_content
+    )
+    
+    # Fix plain res/ references in text (less common); the lookbehind
+    # leaves the .../res/ at the end of URLs rewritten above alone
+    markdown_content = re.sub(
+        r'(?<![\w/.-])res/(\S+)',
+        rf'{resource_base_url}/\1',
+        markdown_content
+    )
+    
+    return markdown_content
@@ -0,0 +1,251 @@
+"""
+Request Metrics
+Low-overhead counters, gauges and histograms rendered in Prometheus text format
+
+Every metric keeps one small list per thread and a thread only ever writes
+to its own list, so recording a value takes no lock. Totals are summed when
+/metrics is scraped. Values are per process: with several gunicorn workers
+each worker reports its own numbers.
+"""
+import bisect
+import os
+import threading
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Shards:
+    """Per-thread value lists summed on read"""
+
+    def __init__(self, size):
+        self._size = size
+        self._shards = {}
+
+    def local(self):
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            shard = [0] * self._size
+            # dict item assignment is atomic, no lock needed
+            self._shards[ident] = shard
+        return shard
+
+    def totals(self):
+        totals = [0] * self._size
+        for shard in list(self._shards.values()):
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    """Base class: a metric family with optional labels"""
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=(), registry=None):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        (REGISTRY if registry is None else registry).append(self)
+
+    def labels(self, *values):
+        """Return the child for one combination of label values"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _label_str(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(list(self._children.items()), key=lambda item: item[0]):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    """Single summed value (counter or gauge child)"""
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        self._shards.local()[0] += amount
+
+    def dec(self, amount=1):
+        self._shards.local()[0] -= amount
+
+    def get(self):
+        return self._shards.totals()[0]
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_str(values)} {_num(child.get())}"]
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down
+
+    With function=..., the value is computed at scrape time instead
+    (useful for things like open file counts).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), function=None, registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self.function = function
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def get(self):
+        if self.function is not None:
+            return self.function()
+        return self.labels().get()
+
+    def render(self):
+        if self.function is None:
+            return super().render()
+        value = self.function()
+        if value is None:
+            return []
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_num(value)}"]
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_str(values)} {_num(child.get())}"]
+
+
+class _HistogramChild:
+    """Bucket counts plus sum and count in one per-thread list"""
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._shards = _Shards(len(buckets) + 3)
+
+    def observe(self, value):
+        shard = self._shards.local()
+        shard[bisect.bisect_left(self._buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    def totals(self):
+        return self._shards.totals()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (e.g. request durations in seconds)"""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        totals = child.totals()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), totals):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _num(bound)
+            lines.append(f"{self.name}_bucket{self._label_str(values, [('le', le)])} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_str(values)} {_num(totals[-2])}")
+        lines.append(f"{self.name}_count{self._label_str(values)} {totals[-1]}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def count_open_files():
+    """Number of open file descriptors of this process (Linux only)"""
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+
+def render(registry=None):
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in (REGISTRY if registry is None else registry):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = []
+
+REQUEST_LATENCY = Histogram(
+    "exercise_request_duration_seconds", "Request handling time by route",
+    ["route", "method"],
+)
+REQUESTS = Counter(
+    "exercise_requests_total", "Requests by route and status",
+    ["route", "method", "status"],
+)
+REQUEST_BYTES = Counter(
+    "exercise_request_bytes_total", "Request body bytes received by route", ["route"],
+)
+RESPONSE_BYTES = Counter(
+    "exercise_response_bytes_total", "Response body bytes sent by route", ["route"],
+)
+IN_FLIGHT = Gauge(
+    "exercise_requests_in_flight", "Requests currently being handled",
+)
+CACHE_REQUESTS = Counter(
+    "exercise_cache_requests_total", "Cache lookups by cache and result (hit/miss)",
+    ["cache", "result"],
+)
+GRADING_DURATION = Histogram(
+    "exercise_grading_duration_seconds", "Time to grade one submission",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0),
+)
+OPEN_FILES = Gauge(
+    "exercise_open_files", "Open file descriptors in this process",
+    function=count_open_files,
+)
+
+
+def record_cache(cache, hit):
+    """Count one lookup in the named cache"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
@@ -0,0 +1,247 @@
+"""
+Request coalescing and rate limiting
+
+- SingleFlight: concurrent calls with the same key share one computation.
+  CoalescingCache puts it behind a small LRU cache, so when a whole class
+  opens the same exercise at once it is read and rendered once
+- RateLimitMiddleware: WSGI middleware with a token bucket per client,
+  answering 429 Too Many Requests (with Retry-After) when a client, e.g.
+  a plugin stuck in a loop, goes over its rate
+
+Counters live in process memory: under gunicorn each worker limits on its
+own, so a client gets up to (workers x rate) in total.
+"""
+import collections
+import json
+import math
+import threading
+import time
+
+import metrics
+
+
+RATE_LIMITED = metrics.Counter(
+    "exercise_rate_limited_total", "Requests refused by the rate limiter",
+)
+COALESCED = metrics.Counter(
+    "exercise_coalesced_requests_total", "Cache misses answered by another request's computation",
+    ["cache"],
+)
+
+# Paths never limited (monitoring), also under /courses/<course>
+EXEMPT_PATHS = ('/health', '/metrics')
+# Client buckets kept before idle (full) ones are dropped
+MAX_CLIENTS = 100000
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run a function once per key at a time; concurrent callers wait for its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function):
+        """
+        Returns:
+            (value, shared): shared is True when another caller computed it
+
+        Raises:
+            Whatever function raised, in every waiting caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+
+class CoalescingCache:
+    """
+    LRU cache whose misses are computed once, however many requests ask
+
+    Exceptions are not cached (every waiting caller gets them). Keys should
+    include whatever invalidates the value (e.g. the catalog generation).
+    """
+
+    def __init__(self, name, max_entries=1024):
+        self.name = name
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+                metrics.record_cache(self.name, True)
+                return value
+        metrics.record_cache(self.name, False)
+        value, shared = self._flight.do(key, lambda: self._fill(key, compute))
+        if shared:
+            COALESCED.labels(self.name).inc()
+        return value
+
+    def _fill(self, key, compute):
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class TokenBuckets:
+    """
+    One token bucket per client key: rate tokens per second, up to burst
+
+    A bucket is two numbers; idle clients (whose bucket has refilled) are
+    dropped when there are more than max_clients.
+    """
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_clients = max_clients
+        # {key: [tokens, last update (monotonic)]}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, now=None):
+        """
+        Take one token
+
+        Returns:
+            0.0 if allowed, otherwise seconds until a token is available
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_clients:
+                    self._prune(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens >= 1.0:
+                bucket[0] = tokens - 1.0
+                return 0.0
+            bucket[0] = tokens
+            return (1.0 - tokens) / self.rate
+
+    def _prune(self, now):
+        full = self.burst / self.rate
+        self._buckets = {key: bucket for key, bucket in self._buckets.items() if now - bucket[1] < full}
+
+
+def client_address(value, trusted_hops=1):
+    """
+    Client address from a forwarding header such as X-Forwarded-For
+
+    Each proxy appends the address it received the request from, and a
+    client can put anything before that, so only entries added by our own
+    proxies can be trusted: with one reverse proxy the rightmost, with
+    trusted_hops proxies in a chain the trusted_hops-th from the right.
+
+    Returns:
+        The address, or None if value is empty
+    """
+    addresses = [address.strip() for address in value.split(',') if address.strip()]
+    if not addresses:
+        return None
+    return addresses[-min(max(trusted_hops, 1), len(addresses))]
+
+
+def is_exempt(path, exempt=EXEMPT_PATHS):
+    """Whether path is one of exempt, directly or under /courses/<course>"""
+    if path.startswith('/courses/'):
+        course, _, rest = path[len('/courses/'):].partition('/')
+        if course:
+            path = '/' + rest
+    return path in exempt
+
+
+def too_many_requests(wait):
+    """
+    Body of a 429 response
+
+    Returns:
+        (retry_after seconds, JSON body bytes)
+    """
+    RATE_LIMITED.inc()
+    retry_after = max(1, math.ceil(wait))
+    return retry_after, json.dumps({"error": "Too many requests", "retry_after": retry_after}).encode('utf-8')
+
+
+class RateLimitMiddleware:
+    """
+    Token-bucket rate limiting per client around a WSGI app
+
+    Args:
+        app: The wrapped WSGI application (e.g. flask_app.wsgi_app)
+        rate: Sustained requests per second per client
+        burst: Requests a client may make at once after being idle
+        key_header: Request header naming the client (e.g. "X-Forwarded-For"
+                    behind a reverse proxy). Default: the connection's
+                    remote address
+        trusted_hops: Reverse proxies in front of the server that append
+                      to key_header; the address the outermost one added
+                      is used (see client_address)
+        exempt: Paths that are never limited, also under /courses/<course>
+    """
+
+    def __init__(self, app, rate, burst, key_header=None, trusted_hops=1, exempt=EXEMPT_PATHS):
+        self.app = app
+        self.buckets = TokenBuckets(rate, burst)
+        self.key_environ = 'HTTP_' + key_header.upper().replace('-', '_') if key_header else None
+        self.trusted_hops = trusted_hops
+        self.exempt = frozenset(exempt)
+
+    def client_key(self, environ):
+        if self.key_environ:
+            address = client_address(environ.get(self.key_environ, ''), self.trusted_hops)
+            if address:
+                return address
+        return environ.get('REMOTE_ADDR', '')
+
+    def __call__(self, environ, start_response):
+        if is_exempt(environ.get('PATH_INFO', ''), self.exempt):
+            return self.app(environ, start_response)
+        wait = self.buckets.take(self.client_key(environ))
+        if not wait:
+            return self.app(environ, start_response)
+
+        retry_after, body = too_many_requests(wait)
+        start_response('429 Too Many Requests', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+        ])
+        return [body]
@@ -0,0 +1,148 @@
+"""
+Allowlist of servable files
+
+Built from directory listings whenever a course is scanned. A request is
+valid exactly when its path components name a listed file, so one dict
+lookup both validates it and says where the file is, including the
+exercise res/ > global res/ precedence. Nothing a client sends is ever
+joined onto a directory: "..", absolute paths, backslashes or encoded
+tricks can only match if a file with that literal name was listed, and
+listings never contain such names. No stat() or path normalisation per
+request; the file is only opened when it is sent.
+
+Hidden files and directories and __pycache__ are not listed (nor watched,
+see catalog.snapshot_tree), nor are symlinks to files outside the listed
+directory; symlinked directories aren't descended into.
+"""
+import os
+
+from catalog import exercise_changes
+
+
+SKIPPED_DIRS = ('__pycache__',)
+
+
+def list_files(directory):
+    """
+    Files below directory
+
+    Returns:
+        {"relative/path": "/abs/path", ...} ("/" separators); empty if
+        the directory doesn't exist
+    """
+    files = {}
+    real_dir = os.path.join(os.path.realpath(directory), '')
+    for dir_path, dir_names, file_names in os.walk(directory):
+        dir_names[:] = [d for d in dir_names if not d.startswith('.') and d not in SKIPPED_DIRS]
+        rel_dir = os.path.relpath(dir_path, directory)
+        prefix = '' if rel_dir == '.' else rel_dir.replace(os.sep, '/') + '/'
+        for name in file_names:
+            if name.startswith('.'):
+                continue
+            path = os.path.join(dir_path, name)
+            if os.path.islink(path) and not os.path.realpath(path).startswith(real_dir):
+                continue
+            files[prefix + name] = path
+    return files
+
+
+def _compressed(listings):
+    """Absolute paths that have a pre-compressed .gz next to them"""
+    return frozenset(
+        path
+        for files in listings
+        for rel, path in files.items()
+        if rel + '.gz' in files
+    )
+
+
+class PathIndex:
+    """
+    Known files of one course: its exercises and global resource directories
+
+    Lookups are lock-free: updates build new dicts and swap them in.
+
+    Args:
+        base_dir: Exercise tree (<bucket>/<code>/...)
+        res_dirs: Global resource directories, in lookup order
+    """
+
+    def __init__(self, base_dir, res_dirs):
+        self.base_dir = os.path.abspath(base_dir)
+        self.res_dirs = [os.path.abspath(path) for path in res_dirs]
+        # {(bucket, code): {"relative/path": abs path}}
+        self._exercises = {}
+        # One listing per res dir, and the merged view (first dir wins)
+        self._layers = [{} for _ in self.res_dirs]
+        self._resources = {}
+        # Paths with a .gz variant (build trees)
+        self.compressed = frozenset()
+
+    def __len__(self):
+        return sum(len(files) for files in self._exercises.values()) + len(self._resources)
+
+    def rebuild(self, buckets):
+        """List every exercise of buckets ({bucket: [codes]}) and every res dir"""
+        self._exercises = {
+            (bucket, code): list_files(os.path.join(self.base_dir, bucket, code))
+            for bucket, codes in buckets.items()
+            for code in codes
+        }
+        self._set_layers([list_files(path) for path in self.res_dirs])
+
+    def update(self, buckets, changed):
+        """
+        List again what changed files (as reported by catalog.ContentWatcher) touch
+
+        Args:
+            buckets: The refreshed catalog listing
+            changed: Changed file paths
+        """
+        touched = exercise_changes(self.base_dir, changed)
+        exercises = {}
+        for bucket, codes in buckets.items():
+            for code in codes:
+                key = (bucket, code)
+                files = self._exercises.get(key)
+                if files is None or key in touched:
+                    files = list_files(os.path.join(self.base_dir, bucket, code))
+                exercises[key] = files
+        self._exercises = exercises
+
+        layers = list(self._layers)
+        for i, res_dir in enumerate(self.res_dirs):
+            prefix = res_dir + os.sep
+            if any(os.path.abspath(path).startswith(prefix) for path in changed):
+                layers[i] = list_files(res_dir)
+        self._set_layers(layers)
+
+    def _set_layers(self, layers):
+        resources = {}
+        for files in reversed(layers):
+            resources.update(files)
+        self._layers = layers
+        self._resources = resources
+        self.compressed = _compressed(list(self._exercises.values()) + layers)
+
+    def exercise_files(self, bucket, code):
+        """{"relative/path": abs path} of an exercise, or None if it isn't in the catalog"""
+        return self._exercises.get((bucket, code))
+
+    def exercise_dir(self, bucket, code):
+        """Absolute directory of a cataloged exercise, or None"""
+        if (bucket, code) not in self._exercises:
+            return None
+        return os.path.join(self.base_dir, bucket, code)
+
+    def exercise_file(self, bucket, code, rel):
+        """Absolute path of bucket/code/rel, or None if no such file was listed"""
+        files = self._exercises.get((bucket, code))
+        return files.get(rel) if files is not None else None
+
+    def global_resource(self, rel):
+        """First res dir's copy of rel, or None"""
+        return self._resources.get(rel)
+
+    def resource(self, bucket, code, rel):
+        """The exercise's res/rel, else the global resource rel, else None"""
+        return self.exercise_file(bucket, code, 'res/' + rel) or self._resources.get(rel)
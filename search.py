@@ -0,0 +1,463 @@
+"""
+Full-text search over exercise markdown
+
+Inverted index of every index.md: title, headings, body text and the
+identifiers in code, ranked with BM25. Prefix queries ("pri*") and
+autocomplete use a sorted vocabulary and bisect.
+
+Postings are kept compactly: per term one array of document ids and one
+of (field-weighted) term frequencies, scored with numpy when installed. Updating an exercise appends it as a
+new document and tombstones the old one; tombstones are compacted away
+once they make up a quarter of the index.
+"""
+import base64
+import bisect
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import threading
+import zlib
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from catalog import exercise_changes, extract_title
+
+
+# Field weights (BM25F-style): a match in the title counts three times
+# as much as one in the body
+TITLE_WEIGHT = 3.0
+HEADING_WEIGHT = 2.0
+CODE_WEIGHT = 1.5
+BODY_WEIGHT = 1.0
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Vocabulary terms a prefix query expands to (most frequent first)
+MAX_PREFIX_EXPANSIONS = 50
+MIN_TERM_LENGTH = 2
+
+INDEX_FORMAT = 1
+# doc_buckets value of a removed document
+REMOVED = 0xFFFFFFFF
+# Below this many documents the pure-Python scorer is as fast
+VECTORIZE_MIN = 256
+
+_WORD = re.compile(r"\w+")
+_IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_LINK_TARGET = re.compile(r"\]\([^)]*\)")
+_URL = re.compile(r"\w+://\S+")
+_INLINE_CODE = re.compile(r"`([^`]+)`")
+
+
+def tokenize(text):
+    """Lowercased word tokens"""
+    return [word for word in _WORD.findall(text.lower()) if len(word) >= MIN_TERM_LENGTH]
+
+
+def code_terms(code):
+    """Identifiers in code, plus the parts of snake_case names"""
+    terms = []
+    for identifier in _IDENTIFIER.findall(code):
+        identifier = identifier.lower()
+        if len(identifier) >= MIN_TERM_LENGTH:
+            terms.append(identifier)
+        if "_" in identifier.strip("_"):
+            terms.extend(part for part in identifier.split("_") if len(part) >= MIN_TERM_LENGTH)
+    return terms
+
+
+def analyze(markdown_content):
+    """
+    Split markdown into weighted terms
+
+    Returns:
+        (title, {term: weighted frequency}, number of tokens)
+    """
+    title = extract_title(markdown_content)
+    weights = {}
+    length = 0
+
+    def add(terms, weight, counted=True):
+        nonlocal length
+        for term in terms:
+            weights[term] = weights.get(term, 0.0) + weight
+        if counted:
+            length += len(terms)
+
+    in_fence = False
+    for line in markdown_content.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```") or stripped.startswith("~~~"):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            add(code_terms(line), CODE_WEIGHT)
+            continue
+        # Link/image targets and URLs are not content
+        line = _URL.sub(" ", _LINK_TARGET.sub("]", line))
+        for code in _INLINE_CODE.findall(line):
+            add(code_terms(code), CODE_WEIGHT)
+        line = _INLINE_CODE.sub(" ", line)
+        if stripped.startswith("#"):
+            add(tokenize(line), HEADING_WEIGHT)
+        else:
+            add(tokenize(line), BODY_WEIGHT)
+
+    if title:
+        # The title's heading line was counted already; top up its weight
+        add(tokenize(title), TITLE_WEIGHT - HEADING_WEIGHT, counted=False)
+    return title, weights, length
+
+
+def parse_query(query):
+    """
+    Split a query into (exact terms, prefixes)
+
+    A word ending in "*" is a prefix: "pri*" matches print, prime, ...
+    """
+    terms = []
+    prefixes = []
+    for word in query.lower().split():
+        if word.endswith("*"):
+            prefixes.extend(tokenize(word.rstrip("*")))
+        else:
+            terms.extend(tokenize(word))
+    return terms, prefixes
+
+
+class SearchIndex:
+    """
+    BM25 index of exercises, keyed by "bucket/code"
+
+    Safe to query from request threads while a watcher thread updates it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Per document id
+        self.doc_keys = []
+        self.doc_titles = []
+        self.doc_lengths = array("f")
+        # Bucket number (see bucket_numbers), REMOVED for tombstones
+        self.doc_buckets = array("I")
+        self.bucket_numbers = {}
+        # {"bucket/code": document id}
+        self.doc_ids = {}
+        # {term: (array of document ids, array of weighted frequencies)}
+        self.postings = {}
+        self.total_length = 0.0
+        self.removed = 0
+        # Sorted vocabulary for prefix lookups
+        self.terms = []
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def _append_doc(self, key, title, length):
+        bucket = key.partition("/")[0]
+        number = self.bucket_numbers.setdefault(bucket, len(self.bucket_numbers))
+        doc_id = len(self.doc_keys)
+        self.doc_keys.append(key)
+        self.doc_titles.append(title)
+        self.doc_lengths.append(length)
+        self.doc_buckets.append(number)
+        self.doc_ids[key] = doc_id
+        self.total_length += length
+        return doc_id
+
+    def add(self, key, markdown_content):
+        """Index (or re-index) one exercise"""
+        title, weights, length = analyze(markdown_content)
+        with self._lock:
+            self._remove(key)
+            doc_id = self._append_doc(key, title, length)
+            for term, weight in weights.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("I"), array("f"))
+                    bisect.insort(self.terms, term)
+                posting[0].append(doc_id)
+                posting[1].append(weight)
+            self._maybe_compact()
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+            self._maybe_compact()
+
+    def _remove(self, key):
+        doc_id = self.doc_ids.pop(key, None)
+        if doc_id is None:
+            return
+        self.doc_keys[doc_id] = None
+        self.doc_titles[doc_id] = None
+        self.doc_buckets[doc_id] = REMOVED
+        self.total_length -= self.doc_lengths[doc_id]
+        self.removed += 1
+
+    def _maybe_compact(self):
+        if self.removed and self.removed * 4 >= len(self.doc_keys):
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned documents and renumber the rest"""
+        old_keys, old_titles, old_lengths = self.doc_keys, self.doc_titles, self.doc_lengths
+        self.doc_keys, self.doc_titles, self.doc_lengths = [], [], array("f")
+        self.doc_buckets = array("I")
+        self.doc_ids = {}
+        self.total_length = 0.0
+        remap = {}
+        for old_id, key in enumerate(old_keys):
+            if key is not None:
+                remap[old_id] = self._append_doc(key, old_titles[old_id], old_lengths[old_id])
+
+        postings = {}
+        for term, (ids, weights) in self.postings.items():
+            new_ids, new_weights = array("I"), array("f")
+            for doc_id, weight in zip(ids, weights):
+                new_id = remap.get(doc_id)
+                if new_id is not None:
+                    new_ids.append(new_id)
+                    new_weights.append(weight)
+            if new_ids:
+                postings[term] = (new_ids, new_weights)
+        self.postings = postings
+        self.terms = sorted(postings)
+        self.removed = 0
+
+    def _expand(self, prefix, limit):
+        """Vocabulary terms starting with prefix, most frequent first"""
+        terms = self.terms
+        start = bisect.bisect_left(terms, prefix)
+        end = bisect.bisect_left(terms, prefix + "\uffff", start)
+        return heapq.nlargest(limit, terms[start:end], key=lambda term: len(self.postings[term][0]))
+
+    def search(self, query, limit=DEFAULT_LIMIT, bucket=None):
+        """
+        Rank exercises for a query
+
+        Args:
+            query: Words; a trailing "*" makes a word a prefix
+            limit: Maximum number of results
+            bucket: Only exercises of this bucket
+
+        Returns:
+            {"total": matching exercises, "results": [{"bucket", "code", "title", "score"}, ...]}
+        """
+        terms, prefixes = parse_query(query)
+        limit = max(1, min(limit, MAX_LIMIT))
+        with self._lock:
+            query_terms = set(terms)
+            for prefix in prefixes:
+                query_terms.update(self._expand(prefix, MAX_PREFIX_EXPANSIONS))
+            postings = [self.postings[term] for term in sorted(query_terms) if term in self.postings]
+
+            if bucket is None:
+                wanted = None
+            else:
+                wanted = self.bucket_numbers.get(bucket)
+                if wanted is None:
+                    return {"total": 0, "results": []}
+            if not self.doc_ids or not postings:
+                return {"total": 0, "results": []}
+
+            if np is not None and len(self.doc_keys) >= VECTORIZE_MIN:
+                total, top = self._rank_numpy(postings, wanted, limit)
+            else:
+                total, top = self._rank_python(postings, wanted, limit)
+
+            results = []
+            for score, doc_id in top:
+                bucket_name, _, code = self.doc_keys[doc_id].partition("/")
+                results.append({
+                    "bucket": bucket_name,
+                    "code": code,
+                    "title": self.doc_titles[doc_id],
+                    "score": round(score, 4),
+                })
+        return {"total": total, "results": results}
+
+    def _idf(self, frequency):
+        # Tombstones still count towards the document frequency,
+        # a small skew until the next compaction
+        live = len(self.doc_ids)
+        return math.log(1.0 + (live - frequency + 0.5) / (frequency + 0.5))
+
+    def _rank_python(self, postings, wanted, limit):
+        average_length = self.total_length / len(self.doc_ids) or 1.0
+        lengths = self.doc_lengths
+        scores = {}
+        for ids, weights in postings:
+            idf = self._idf(len(ids))
+            for doc_id, tf in zip(ids, weights):
+                norm = K1 * (1.0 - B + B * lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (K1 + 1.0) / (tf + norm)
+
+        buckets = self.doc_buckets
+        matches = [
+            (score, doc_id) for doc_id, score in scores.items()
+            if buckets[doc_id] != REMOVED and (wanted is None or buckets[doc_id] == wanted)
+        ]
+        return len(matches), heapq.nsmallest(limit, matches, key=_rank_key)
+
+    def _rank_numpy(self, postings, wanted, limit):
+        # Copies, not views: a view would stop the arrays from growing
+        lengths = np.array(self.doc_lengths, dtype=np.float64)
+        buckets = np.array(self.doc_buckets, dtype=np.uint32)
+        average_length = self.total_length / len(self.doc_ids) or 1.0
+        norm = K1 * (1.0 - B + B * lengths / average_length)
+
+        scores = np.zeros(len(lengths))
+        for ids, weights in postings:
+            ids = np.array(ids, dtype=np.intp)
+            tf = np.array(weights, dtype=np.float64)
+            contributions = self._idf(len(ids)) * tf * (K1 + 1.0) / (tf + norm[ids])
+            scores += np.bincount(ids, weights=contributions, minlength=len(scores))
+
+        mask = scores > 0
+        mask &= buckets != REMOVED if wanted is None else buckets == wanted
+        candidates = np.flatnonzero(mask)
+        if len(candidates) > limit:
+            # Everything scoring at least the limit-th best, ties included
+            candidate_scores = scores[candidates]
+            threshold = np.partition(candidate_scores, len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[candidate_scores >= threshold]
+        top = sorted(((float(scores[doc_id]), int(doc_id)) for doc_id in candidates), key=_rank_key)
+        return int(np.count_nonzero(mask)), top[:limit]
+
+    def suggest(self, prefix, limit=10):
+        """
+        Autocomplete the last word of prefix
+
+        Returns:
+            ["print", "prime", ...] (most frequent first), completing the
+            last word and keeping the words before it
+        """
+        words = prefix.lower().split()
+        if not words or prefix[-1:].isspace():
+            return []
+        stem = " ".join(words[:-1])
+        with self._lock:
+            completions = self._expand(words[-1], max(1, min(limit, MAX_LIMIT)))
+        return [f"{stem} {term}" if stem else term for term in completions]
+
+    def update_paths(self, base_dir, paths):
+        """
+        Re-index the exercises touched by changed file paths
+
+        Args:
+            base_dir: Exercise tree (<bucket>/<code>/index.md)
+            paths: Changed files (as reported by catalog.ContentWatcher)
+
+        Returns:
+            Number of exercises re-indexed or removed
+        """
+        changes = exercise_changes(base_dir, paths)
+        for bucket, code in sorted(changes):
+            key = f"{bucket}/{code}"
+            try:
+                with open(os.path.join(base_dir, bucket, code, "index.md"), "r", encoding="utf-8") as f:
+                    self.add(key, f.read())
+            except (OSError, UnicodeDecodeError):
+                self.remove(key)
+        return len(changes)
+
+    def to_dict(self):
+        """
+        JSON-serializable form (see from_dict)
+
+        Postings are stored as three packed arrays (zlib + base64): term
+        offsets, then all document ids and all weights back to back in term
+        order.
+        """
+        with self._lock:
+            if self.removed:
+                self._compact()
+            terms = sorted(self.postings)
+            offsets, ids, weights = array("I", [0]), array("I"), array("f")
+            for term in terms:
+                ids.extend(self.postings[term][0])
+                weights.extend(self.postings[term][1])
+                offsets.append(len(ids))
+            return {
+                "format": INDEX_FORMAT,
+                "byteorder": sys.byteorder,
+                "docs": [[key, title, length] for key, title, length
+                         in zip(self.doc_keys, self.doc_titles, self.doc_lengths)],
+                "terms": terms,
+                "offsets": _pack(offsets),
+                "ids": _pack(ids),
+                "weights": _pack(weights),
+            }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Index from to_dict(); ValueError for an incompatible format"""
+        if data.get("format") != INDEX_FORMAT or data.get("byteorder") != sys.byteorder:
+            raise ValueError("Unsupported search index format")
+        index = cls()
+        for key, title, length in data["docs"]:
+            index._append_doc(key, title, length)
+        offsets = _unpack("I", data["offsets"])
+        ids = _unpack("I", data["ids"])
+        weights = _unpack("f", data["weights"])
+        for position, term in enumerate(data["terms"]):
+            start, end = offsets[position], offsets[position + 1]
+            index.postings[term] = (ids[start:end], weights[start:end])
+        index.terms = sorted(index.postings)
+        return index
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def _rank_key(match):
+    """Best score first; ties go to the older document"""
+    score, doc_id = match
+    return -score, doc_id
+
+
+def _pack(values):
+    return base64.b64encode(zlib.compress(values.tobytes(), 1)).decode("ascii")
+
+
+def _unpack(typecode, data):
+    values = array(typecode)
+    values.frombytes(zlib.decompress(base64.b64decode(data)))
+    return values
+
+
+def build_index(base_dir, buckets):
+    """
+    Index every exercise of a tree
+
+    Args:
+        base_dir: Exercise tree
+        buckets: {"bucket": ["code", ...]} (see catalog.scan_exercises)
+    """
+    index = SearchIndex()
+    for bucket, codes in sorted(buckets.items()):
+        for code in codes:
+            try:
+                with open(os.path.join(base_dir, bucket, code, "index.md"), "r", encoding="utf-8") as f:
+                    index.add(f"{bucket}/{code}", f.read())
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Warning: Not indexing {bucket}/{code}: {e}")
+    return index
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Production entry point for the Exercise API
+Runs server.py under gunicorn with pre-forked, multi-threaded workers
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import signal
+import sys
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    print("ERROR: Need gunicorn for production mode (pip install gunicorn)")
+    sys.exit(1)
+
+
+class ExerciseServer(BaseApplication):
+    """Embedded gunicorn application serving server.app"""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Imported here so it happens once, in the master, before forking
+        import server
+        return server.app
+
+
+def make_when_ready(watch, watch_interval, host, events_port):
+    """
+    Build the hook gunicorn calls in the master before workers fork
+
+    Freezing the GC moves the preloaded app and catalog out of the
+    collector's reach, so workers don't dirty (and copy) those pages.
+
+    The master also serves /api/events (see events.py) on events_port:
+    it owns the content watcher that publishes the events, and its
+    asyncio loop holds idle streams without tying up worker threads.
+    """
+    def when_ready(arbiter):
+        import server
+        from events import EventStreamServer
+
+        gc.freeze()
+
+        if events_port:
+            EventStreamServer(server.EVENTS, host, events_port).start()
+            arbiter.log.info("Event stream listening at http://%s:%d/api/events", host, events_port)
+
+        if not watch:
+            return
+
+        def on_change(root, changed):
+            arbiter.log.info("Content of course %s changed (%d file(s)), reloading workers",
+                             root.name, len(changed))
+            # Only this course is rescanned; the others keep their state
+            server.on_content_change(root, changed)
+            gc.freeze()
+            # Graceful reload: new workers fork from the refreshed master,
+            # old ones finish their in-flight requests before exiting
+            os.kill(arbiter.pid, signal.SIGHUP)
+
+        server.start_watchers(on_change, interval=watch_interval)
+
+    return when_ready
+
+
+def build_options(args):
+    """Translate CLI arguments into gunicorn settings"""
+    options = {
+        "bind": f"{args.host}:{args.port}",
+        "workers": args.workers,
+        "worker_class": "gthread",
+        "threads": args.threads,
+        # Bounded request queue: pending connections in the listen
+        # backlog plus at most worker_connections per worker
+        "backlog": args.backlog,
+        "worker_connections": args.max_connections,
+        "preload_app": True,
+        "timeout": args.timeout,
+        "graceful_timeout": args.timeout,
+        "keepalive": 5,
+        "accesslog": "-" if args.access_log else None,
+        "when_ready": make_when_ready(args.watch, args.watch_interval, args.host, args.events_port),
+    }
+    return options
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Run the Exercise API with multiple workers")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=4,
+                        help="request threads per worker (default: 4)")
+    parser.add_argument("--backlog", type=int, default=128,
+                        help="max pending connections waiting to be accepted (default: 128)")
+    parser.add_argument("--max-connections", type=int, default=64,
+                        help="max concurrent connections per worker (default: 64)")
+    parser.add_argument("--timeout", type=int, default=30,
+                        help="worker timeout and graceful shutdown period in seconds (default: 30)")
+    parser.add_argument("--no-watch", dest="watch", action="store_false",
+                        help="don't reload workers when exercise content changes")
+    parser.add_argument("--watch-interval", type=float, default=2.0,
+                        help="content polling interval in seconds (default: 2)")
+    parser.add_argument("--events-port", type=int, default=None,
+                        help="port of the /api/events stream (default: --port + 1, 0 to disable)")
+    parser.add_argument("--rate-limit", type=float, default=None,
+                        help="requests per second per client and worker (default: 0, no limit)")
+    parser.add_argument("--rate-burst", type=float, default=None,
+                        help="requests a client may make at once (default: 200)")
+    parser.add_argument("--rate-limit-header", default=None,
+                        help="header naming the client behind a reverse proxy (e.g. X-Forwarded-For)")
+    parser.add_argument("--rate-limit-trusted-hops", type=int, default=None,
+                        help="reverse proxies appending to --rate-limit-header; the address added "
+                             "by the outermost one is used (default: 1)")
+    parser.add_argument("--access-log", action="store_true", help="log every request to stdout")
+    args = parser.parse_args()
+    if args.events_port is None:
+        args.events_port = args.port + 1
+    if args.events_port:
+        # Workers redirect /api/events there (read when server.py is imported)
+        os.environ["EXERCISE_EVENTS_PORT"] = str(args.events_port)
+
+    # Read when server.py is imported
+    for name, value in (("EXERCISE_RATE_LIMIT", args.rate_limit), ("EXERCISE_RATE_BURST", args.rate_burst),
+                        ("EXERCISE_RATE_LIMIT_HEADER", args.rate_limit_header),
+                        ("EXERCISE_RATE_LIMIT_TRUSTED_HOPS", args.rate_limit_trusted_hops)):
+        if value is not None:
+            os.environ[name] = str(value)
+
+    ExerciseServer(build_options(args)).run()
+
+
+if __name__ == "__main__":
+    main()
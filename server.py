@@ -2,46 +2,270 @@
 Flask API Server for Exercise System
 Serves exercises with proper resource handling
 """
-from flask import Flask, jsonify, send_from_directory, abort, request
-from werkzeug.utils import safe_join
+from flask import Flask, Response, jsonify, abort, redirect, request, g, stream_with_context
+import importlib.util
 import os
 import mimetypes
+import threading
+import time
+from functools import partial
+from urllib.parse import urlencode, urlsplit
+
+import analytics
+import bundles
+import courses
+import events
+import metrics
+import middleware
+import search
+from catalog import DEFAULT_PAGE_SIZE, ContentWatcher
+from fileserve import send_file_fast
+from markdown_resources import process_markdown_resources
+
+# Grading helpers live next to the plugin's test runner and have no
+# Thonny dependencies, so the server loads them from there. datasets.py is
+# loaded by path: a top-level "datasets" could be an installed package
+RUNNER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'course_checker', 'tests')
+_datasets_spec = importlib.util.spec_from_file_location(
+    'course_checker_datasets', os.path.join(RUNNER_DIR, 'datasets.py'))
+datasets = importlib.util.module_from_spec(_datasets_spec)
+_datasets_spec.loader.exec_module(datasets)
+import grading
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    import tomli as tomllib
 
 app = Flask(__name__)
 
-# Configuration
-BASE_DIR = os.path.abspath('serverstr')  # Absolute path for security
-GLOBAL_RES_DIR = os.path.abspath('res')   # Global resources directory
+# Pure read mode: serve a tree compiled by build.py (e.g. build/current)
+# instead of the source directories
+BUILD_DIR = os.environ.get('EXERCISE_BUILD_DIR')
+# Several courses, each mounted under /courses/<name>/api/... (see courses.py)
+COURSES_FILE = os.environ.get('EXERCISE_COURSES')
+
+# Substituted in pre-built markdown/HTML (same value as build.RESOURCE_PLACEHOLDER)
+RESOURCE_PLACEHOLDER = '{{RESOURCE_BASE_URL}}'
 
-# Security: Ensure directories exist
-os.makedirs(BASE_DIR, exist_ok=True)
-os.makedirs(GLOBAL_RES_DIR, exist_ok=True)
+# Configuration: {name: ContentRoot}; the default course is also served
+# without the /courses/<name> prefix
+if COURSES_FILE:
+    COURSES, DEFAULT_COURSE = courses.load_config(COURSES_FILE)
+else:
+    COURSES = {courses.DEFAULT_COURSE: courses.single_root(BUILD_DIR)}
+    DEFAULT_COURSE = courses.DEFAULT_COURSE
 
+# Exercise listings and search indexes are built once at import time; with
+# a preloading production server (serve.py) the workers share them copy-on-write
+for _root in COURSES.values():
+    _root.load()
 
-def validate_path(base, *parts):
+# Content change notifications for /api/events (see events.py)
+EVENTS = events.EventBus()
+# Set by serve.py: the stream is served by its asyncio server on this port
+EVENTS_PORT = os.environ.get('EXERCISE_EVENTS_PORT')
+# Thread-per-request streams (development server) are capped and end
+# after a while; clients reconnect with Last-Event-ID
+MAX_EVENT_STREAMS = 32
+EVENT_STREAM_SECONDS = 300
+_event_streams = 0
+_event_streams_lock = threading.Lock()
+metrics.Gauge(
+    "exercise_event_streams", "Open /api/events streams served by this process",
+    function=lambda: _event_streams,
+)
+
+
+def on_content_change(root, changed):
     """
-    Safely join paths and validate they're within base directory
-    Prevents directory traversal attacks
+    Bring a course's catalog and search index up to date and notify
+    subscribed clients (content watcher callback)
     """
-    try:
-        full_path = safe_join(base, *parts)
-        if full_path and os.path.commonpath([base, full_path]) == base:
-            return full_path
-    except (ValueError, TypeError):
-        pass
-    return None
+    for (bucket, code), files in sorted(root.update(changed).items()):
+        # Pre-compressed build outputs change together with their source
+        files = sorted({name[:-3] if name.endswith('.gz') else name for name in files})
+        EVENTS.publish('exercise', {
+            "course": root.name,
+            "bucket": bucket,
+            "code": code,
+            "files": files,
+            "removed": code not in root.catalog.buckets.get(bucket, ()),
+        })
+
+
+def start_watchers(on_change, interval=2.0):
+    """
+    One content watcher per course, calling on_change(root, changed), so
+    scanning a large course doesn't delay noticing changes in the others
+    """
+    for root in COURSES.values():
+        ContentWatcher(root.watch_dirs, partial(on_change, root), interval=interval,
+                       name=f"content-watcher-{root.name}").start()
+
+
+# Open descriptors for exercise files and resources, a budget per course
+# (see fileserve.py)
+metrics.Gauge(
+    "exercise_file_cache_entries", "Open descriptors held by the file caches",
+    function=lambda: sum(len(root.file_cache) for root in COURSES.values()),
+)
+
+# Submissions and grading (see grading.py); results are shared on disk
+# by all server processes
+GRADING_DIR = os.path.abspath(os.environ.get('EXERCISE_GRADING_DIR', 'grading'))
+GRADER = grading.Grader(
+    GRADING_DIR,
+    workers=int(os.environ.get('GRADING_WORKERS', os.cpu_count() or 2)),
+    max_pending=int(os.environ.get('GRADING_QUEUE_SIZE', 500)),
+    timeout=float(os.environ.get('GRADING_TIMEOUT', 30)),
+    # Identical code (up to comments/formatting) is graded once per test suite
+    cache=grading.results_cache.ResultsCache(
+        os.environ.get('GRADING_CACHE') or os.path.join(GRADING_DIR, 'results.sqlite3')
+    ),
+    # Attempts and outcomes for /stats (see analytics.py)
+    attempts=analytics.AttemptStore(
+        os.environ.get('GRADING_ATTEMPTS') or os.path.join(GRADING_DIR, 'attempts.sqlite3')
+    ),
+)
+metrics.Gauge(
+    "exercise_grading_queue_depth", "Submissions waiting for a grading worker",
+    function=GRADER.pending,
+)
+MAX_SUBMISSION_BYTES = 256 * 1024
+MAX_BULK_SUBMISSIONS = 500
+MAX_RESULT_WAIT = 60.0
+# Suggested client back-off when the grading queue is full
+RETRY_AFTER_SECONDS = 5
+MAX_QUERY_LENGTH = 200
+# Chunk-level bundle sync (see bundles.py)
+MAX_SYNC_FILES = 100000
+MAX_CHUNKS_PER_REQUEST = 256
+# Per-client rate limit (see middleware.py), off unless EXERCISE_RATE_LIMIT
+# is set: keyed on the remote address, a whole class behind one NAT or proxy
+# would share a bucket
+RATE_LIMIT = float(os.environ.get('EXERCISE_RATE_LIMIT', 0))
+RATE_BURST = float(os.environ.get('EXERCISE_RATE_BURST', 200))
+# Header naming the client behind a reverse proxy (e.g. X-Forwarded-For),
+# and how many proxies append to it
+RATE_LIMIT_HEADER = os.environ.get('EXERCISE_RATE_LIMIT_HEADER')
+RATE_LIMIT_TRUSTED_HOPS = int(os.environ.get('EXERCISE_RATE_LIMIT_TRUSTED_HOPS', 1))
+if RATE_LIMIT > 0:
+    app.wsgi_app = middleware.RateLimitMiddleware(app.wsgi_app, RATE_LIMIT, RATE_BURST, RATE_LIMIT_HEADER,
+                                                  RATE_LIMIT_TRUSTED_HOPS)
+# Query parameters that switch /api/exercises to the paginated listing
+LISTING_PARAMS = ('bucket', 'prefix', 'limit', 'cursor', 'fields')
+
+
+def course_route(rule, **options):
+    """Register a view for the default course (rule) and for each course (/courses/<course>rule)"""
+    def decorator(view):
+        app.route(rule, **options)(view)
+        app.route('/courses/<course>' + rule, **options)(view)
+        return view
+    return decorator
+
+
+@app.url_value_preprocessor
+def _select_course(endpoint, values):
+    """Make the request's course available as g.root"""
+    course = values.pop('course', None) if values else None
+    g.root = COURSES.get(course or DEFAULT_COURSE)
+    g.api_prefix = f"/courses/{course}" if course else ""
+    if g.root is None:
+        abort(404, description=f"Unknown course: {course}")
+
+
+def _api_url(path):
+    """Absolute URL of an API path, under the course prefix the request came in on"""
+    return request.url_root.rstrip('/') + g.api_prefix + path
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+    metrics.IN_FLIGHT.inc()
+
+
+@app.after_request
+def _count_response(response):
+    route = _route_label()
+    metrics.REQUESTS.labels(route, request.method, str(response.status_code)).inc()
+    metrics.REQUEST_BYTES.labels(route).inc(request.content_length or 0)
+    metrics.RESPONSE_BYTES.labels(route).inc(response.content_length or 0)
+    return response
+
+
+@app.teardown_request
+def _record_request_time(error=None):
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    metrics.IN_FLIGHT.dec()
+    metrics.REQUEST_LATENCY.labels(_route_label(), request.method).observe(
+        time.perf_counter() - started
+    )
+
+
+def _route_label():
+    """Route template (not the raw path) so label cardinality stays bounded"""
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
 
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint with catalog freshness and queue depth"""
+    status = {name: _course_health(root) for name, root in COURSES.items()}
     return jsonify({
         "status": "ok",
-        "message": "Exercise API is running"
+        "message": "Exercise API is running",
+        # Default course, as before courses existed
+        **status[DEFAULT_COURSE],
+        "courses": status,
+        "grading": _grading_health(),
+        # Requests being handled by this process, including this one
+        "in_flight": metrics.IN_FLIGHT.get(),
     })
 
 
-@app.route('/api/exercises/<bucket>/<exercise_code>', methods=['GET'])
+@app.route('/courses/<course>/health', methods=['GET'])
+def course_health_check():
+    """Health of one course"""
+    return jsonify({
+        "status": "ok",
+        "message": "Exercise API is running",
+        **_course_health(g.root),
+        "grading": _grading_health(),
+        "in_flight": metrics.IN_FLIGHT.get(),
+    })
+
+
+def _grading_health():
+    # Submissions waiting in this process; a full queue answers 503
+    return {"queue_depth": GRADER.pending(), "max_pending": GRADER.max_pending}
+
+
+def _course_health(root):
+    catalog = root.catalog
+    catalog_age = catalog.age()
+    return {
+        "catalog": {
+            "generation": catalog.generation,
+            "age_seconds": round(catalog_age, 3) if catalog_age is not None else None,
+            "buckets": len(catalog.buckets),
+            "exercises": sum(len(codes) for codes in catalog.buckets.values()),
+        },
+        "search": {"documents": len(root.search), "terms": len(root.search.postings)},
+    }
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics for this process"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@course_route('/api/exercises/<bucket>/<exercise_code>', methods=['GET'])
 def get_exercise(bucket, exercise_code):
     """
     Get exercise with all its metadata
@@ -55,56 +279,76 @@ def get_exercise(bucket, exercise_code):
             "files": ["tests.toml", "solution.py", ...]
         }
     """
-    # Build and validate directory path
-    dir_path = validate_path(BASE_DIR, bucket, exercise_code)
+    root = g.root
+    resource_base_url = _api_url(f"/api/exercises/{bucket}/{exercise_code}/res")
+    include_html = bool(root.catalog.index_file) and request.args.get('include') == 'html'
+    render = _render_built_exercise if root.catalog.index_file else _render_exercise
     
-    if not dir_path or not os.path.isdir(dir_path):
+    # Responses are cached until the catalog changes; when a whole class
+    # opens an uncached exercise at once, one request renders it and the
+    # others wait for its result (see middleware.py)
+    key = (root.catalog.generation, bucket, exercise_code, resource_base_url, include_html)
+    try:
+        body, status = root.payloads.get(key, partial(
+            render, root, bucket, exercise_code, resource_base_url, include_html
+        ))
+    except (OSError, UnicodeDecodeError) as e:
         return jsonify({
+            "error": f"Failed to read index.md: {str(e)}"
+        }), 500
+    return Response(body, status=status, mimetype='application/json')
+
+
+def _json_body(payload, status=200):
+    return app.json.dumps(payload).encode('utf-8'), status
+
+
+def _render_exercise(root, bucket, exercise_code, resource_base_url, include_html=False):
+    """
+    get_exercise's (JSON body, status) from the source tree
+
+    Raises:
+        OSError: index.md can't be read
+    """
+    # Known exercise? (see pathindex.py: the lookup is the validation)
+    exercise_files = root.paths.exercise_files(bucket, exercise_code)
+    
+    if exercise_files is None:
+        return _json_body({
             "error": "Exercise not found",
             "bucket": bucket,
             "exercise_code": exercise_code
-        }), 404
+        }, 404)
     
     # Check for index.md
-    index_path = os.path.join(dir_path, "index.md")
-    if not os.path.isfile(index_path):
-        return jsonify({
+    index_path = exercise_files.get("index.md")
+    if index_path is None:
+        return _json_body({
             "error": "Exercise index.md not found",
             "bucket": bucket,
             "exercise_code": exercise_code
-        }), 404
+        }, 404)
     
     # Read markdown content
-    try:
-        with open(index_path, 'r', encoding='utf-8') as f:
-            markdown_content = f.read()
-    except Exception as e:
-        return jsonify({
-            "error": f"Failed to read index.md: {str(e)}"
-        }), 500
+    with open(index_path, 'r', encoding='utf-8') as f:
+        markdown_content = f.read()
     
     # Get list of available files
-    try:
-        files = [f for f in os.listdir(dir_path) if os.path.isfile(os.path.join(dir_path, f))]
-    except Exception:
-        files = []
+    files = sorted(rel for rel in exercise_files if '/' not in rel)
     
     # Check for specific files
     has_tests = "tests.toml" in files
     has_solution = "solution.py" in files
-    has_local_res = os.path.isdir(os.path.join(dir_path, "res"))
-    
-    # Build resource base URL
-    resource_base_url = request.url_root.rstrip('/') + f"/api/exercises/{bucket}/{exercise_code}/res"
+    has_local_res = any(rel.startswith("res/") for rel in exercise_files)
     
     # Process markdown to fix resource paths
-    processed_markdown = _process_markdown_resources(
+    processed_markdown = process_markdown_resources(
         markdown_content,
         resource_base_url,
         has_local_res
     )
     
-    return jsonify({
+    return _json_body({
         "markdown": processed_markdown,
         "has_tests": has_tests,
         "has_solution": has_solution,
@@ -114,128 +358,588 @@ def get_exercise(bucket, exercise_code):
     })
 
 
-@app.route('/api/exercises/<bucket>/<exercise_code>/<filename>', methods=['GET'])
+def _render_built_exercise(root, bucket, exercise_code, resource_base_url, include_html=False):
+    """
+    get_exercise in read mode: metadata from the build's catalog, markdown
+    already rewritten (only the resource base URL is filled in)
+    
+    ?include=html adds the pre-rendered, sanitized HTML fragment
+    """
+    entry = root.catalog.exercises.get(f"{bucket}/{exercise_code}")
+    if entry is None:
+        return _json_body({
+            "error": "Exercise not found",
+            "bucket": bucket,
+            "exercise_code": exercise_code
+        }, 404)
+    
+    dir_path = os.path.join(root.base_dir, bucket, exercise_code)
+    with open(os.path.join(dir_path, "index.md"), 'r', encoding='utf-8') as f:
+        markdown_content = f.read()
+    html = None
+    if include_html and entry.get("has_html"):
+        with open(os.path.join(dir_path, "index.html"), 'r', encoding='utf-8') as f:
+            html = f.read().replace(RESOURCE_PLACEHOLDER, resource_base_url)
+    
+    payload = {
+        "markdown": markdown_content.replace(RESOURCE_PLACEHOLDER, resource_base_url),
+        "has_tests": entry["has_tests"],
+        "has_solution": entry["has_solution"],
+        "has_local_resources": entry["has_local_resources"],
+        "resource_base_url": resource_base_url,
+        "files": entry["files"]
+    }
+    if html is not None:
+        payload["html"] = html
+    return _json_body(payload)
+
+
+@course_route('/api/exercises/<bucket>/<exercise_code>/<filename>', methods=['GET'])
 def get_exercise_file(bucket, exercise_code, filename):
     """
     Get a specific file from an exercise (e.g., tests.toml, solution.py)
     """
-    # Validate paths
-    dir_path = validate_path(BASE_DIR, bucket, exercise_code)
-    if not dir_path:
+    file_path = g.root.paths.exercise_file(bucket, exercise_code, filename)
+    if not file_path:
         abort(404)
     
-    file_path = validate_path(dir_path, filename)
-    if not file_path or not os.path.isfile(file_path):
+    response = _send_file(g.root, file_path, _guess_mimetype(filename))
+    if response is None:
         abort(404)
-    
-    # Get mimetype
-    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-    
-    return send_from_directory(dir_path, filename, mimetype=mimetype)
+    return response
 
 
-@app.route('/api/exercises/<bucket>/<exercise_code>/res/<path:filename>', methods=['GET'])
+@course_route('/api/exercises/<bucket>/<exercise_code>/res/<path:filename>', methods=['GET'])
 def get_exercise_resource(bucket, exercise_code, filename):
     """
     Get a resource file from exercise's local res/ directory
-    Priority: local res/ > global res/
+    Priority: local res/ > the course's global res/ directories, in order
     """
-    # Try local res/ directory first
-    dir_path = validate_path(BASE_DIR, bucket, exercise_code)
-    if dir_path:
-        local_res_path = validate_path(dir_path, "res", filename)
-        if local_res_path and os.path.isfile(local_res_path):
-            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-            return send_from_directory(os.path.join(dir_path, "res"), filename, mimetype=mimetype)
-    
-    # Fall back to global res/ directory
-    global_res_path = validate_path(GLOBAL_RES_DIR, filename)
-    if global_res_path and os.path.isfile(global_res_path):
-        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-        return send_from_directory(GLOBAL_RES_DIR, filename, mimetype=mimetype)
+    file_path = g.root.paths.resource(bucket, exercise_code, filename)
+    if not file_path:
+        abort(404)
     
-    abort(404)
+    response = _send_file(g.root, file_path, _guess_mimetype(filename))
+    if response is None:
+        abort(404)
+    return response
 
 
-@app.route('/api/res/<path:filename>', methods=['GET'])
+@course_route('/api/res/<path:filename>', methods=['GET'])
 def get_global_resource(filename):
     """
-    Get a resource from global res/ directory
+    Get a resource from the course's global res/ directories
     For backward compatibility
     """
-    file_path = validate_path(GLOBAL_RES_DIR, filename)
+    file_path = g.root.paths.global_resource(filename)
+    if not file_path:
+        abort(404)
+    
+    response = _send_file(g.root, file_path, _guess_mimetype(filename))
+    if response is None:
+        abort(404)
+    return response
+
+
+@course_route('/api/exercises/<bucket>/<exercise_code>/datasets/<name>', methods=['GET'])
+def get_dataset_info(bucket, exercise_code, name):
+    """
+    Describe a dataset declared in the exercise's tests.toml
+    The CSV is converted to per-column .npy files on first request
+    
+    Returns:
+        {
+            "name": "iris",
+            "rows": 150,
+            "columns": [{"name": "sepal_length", "dtype": "float64", "url": "..."}, ...]
+        }
+    """
+    dir_path = g.root.paths.exercise_dir(bucket, exercise_code)
+    if not dir_path:
+        abort(404)
     
-    if not file_path or not os.path.isfile(file_path):
+    try:
+        _, meta = _ensure_dataset(g.root, dir_path, name)
+    except FileNotFoundError:
         abort(404)
+    except datasets.DatasetError as e:
+        return _dataset_error(e, name)
     
-    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
-    return send_from_directory(GLOBAL_RES_DIR, filename, mimetype=mimetype)
+    base_url = _api_url(f"/api/exercises/{bucket}/{exercise_code}/datasets/{name}")
+    return jsonify({
+        "name": name,
+        "rows": meta["rows"],
+        "columns": [
+            {"name": column["name"], "dtype": column["dtype"], "url": f"{base_url}/{column['file']}"}
+            for column in meta["columns"]
+        ]
+    })
 
 
-@app.route('/api/exercises', methods=['GET'])
-def list_exercises():
+@course_route('/api/exercises/<bucket>/<exercise_code>/datasets/<name>/<column_file>', methods=['GET'])
+def get_dataset_column(bucket, exercise_code, name, column_file):
     """
-    List all available exercises organized by bucket
+    Get one converted column as a .npy file (load with numpy.load(..., mmap_mode="r"))
+    """
+    dir_path = g.root.paths.exercise_dir(bucket, exercise_code)
+    if not dir_path:
+        abort(404)
+    
+    try:
+        cache_dir, meta = _ensure_dataset(g.root, dir_path, name)
+    except FileNotFoundError:
+        abort(404)
+    except datasets.DatasetError as e:
+        return _dataset_error(e, name)
+    
+    if column_file not in {column["file"] for column in meta["columns"]}:
+        abort(404)
+    
+    response = _send_file(g.root, os.path.join(cache_dir, column_file), 'application/octet-stream')
+    if response is None:
+        abort(404)
+    return response
+
+
+def _ensure_dataset(root, exercise_dir, name):
+    """
+    Look up the dataset in tests.toml and convert it if needed
+
+    One conversion at a time per course and process; readers of fresh
+    data don't wait long
+    """
+    with open(os.path.join(exercise_dir, "tests.toml"), "rb") as f:
+        try:
+            specs = tomllib.load(f).get("dataset", [])
+        except tomllib.TOMLDecodeError as e:
+            raise datasets.DatasetError(f"tests.toml is not valid TOML: {e}")
+    spec = datasets.find_spec(specs, name)
+    with root.dataset_lock:
+        return datasets.ensure_dataset(exercise_dir, spec)
+
+
+def _dataset_error(error, name):
+    """
+    404 for a dataset that doesn't exist, 501 without numpy, 500 for
+    broken exercise content (tests.toml, CSV) with the reason
+    """
+    if not datasets.np:
+        status = 501
+    elif isinstance(error, datasets.DatasetNotFound):
+        status = 404
+    else:
+        status = 500
+    return jsonify({"error": str(error), "dataset": name}), status
+
+
+def _send_file(root, path, mimetype):
+    """
+    send_file_fast, preferring the build's pre-compressed .gz variant
+    when the client accepts gzip (not for range requests: ranges would
+    then refer to the compressed bytes)
+    """
+    if not root.build_tree:
+        return send_file_fast(path, mimetype, root.file_cache)
+    response = None
+    if (path in root.paths.compressed and 'Range' not in request.headers
+            and 'gzip' in request.headers.get('Accept-Encoding', '')):
+        response = send_file_fast(path + '.gz', mimetype, root.file_cache)
+        if response is not None:
+            response.headers['Content-Encoding'] = 'gzip'
+    if response is None:
+        response = send_file_fast(path, mimetype, root.file_cache)
+    if response is not None:
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+@course_route('/api/bundles/<bucket>/sync', methods=['POST'])
+def sync_bundle(bucket):
+    """
+    What a client needs to bring its copy of a bucket (or one exercise) up to date
+    
+    Body (JSON):
+        {
+            "exercise": "001",          (optional; default: the whole bucket)
+            "etag": "...",              (optional; from the last sync of the same scope)
+            "files": {"001/index.md": "<sha256>", ...}   (what the client holds)
+        }
     
     Returns:
+        {"etag": "...", "unchanged": true} if etag still matches, otherwise
         {
-            "buckets": {
-                "default": ["001", "002", ...],
-                "custom": ["001", ...]
-            }
+            "etag": "...",
+            "files": {"001/index.md": {"size": 812, "sha256": "...", "chunks": [["<id>", 812]]}, ...},
+            "removed": ["001/old.png", ...]
+        }
+        with only new and changed files. Missing chunks are fetched from /api/chunks.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    client_files = body.get("files", {})
+    if not isinstance(client_files, dict) or len(client_files) > MAX_SYNC_FILES:
+        return jsonify({"error": "'files' must be an object of path: sha256"}), 400
+    
+    root = g.root
+    codes = root.catalog.buckets.get(bucket)
+    exercise_code = body.get("exercise")
+    if exercise_code is not None:
+        codes = [exercise_code] if codes and exercise_code in codes else None
+    if not codes:
+        return jsonify({
+            "error": "Exercise not found",
+            "bucket": bucket,
+            "exercise_code": exercise_code
+        }), 404
+    
+    files = root.chunk_index.bucket_manifest(os.path.join(root.base_dir, bucket), codes)
+    etag = bundles.bundle_etag(files)
+    if body.get("etag") == etag:
+        return jsonify({"etag": etag, "unchanged": True})
+    changed, removed = bundles.diff(files, client_files)
+    return jsonify({"etag": etag, "files": changed, "removed": removed})
+
+
+@course_route('/api/chunks', methods=['POST'])
+def get_chunks():
+    """
+    Chunk contents, concatenated in the requested order
+    
+    Body (JSON):
+        {
+            "ids": ["<chunk id>", ...],   (from /api/bundles/<bucket>/sync)
+            "bucket": "default",          (where they come from)
+            "exercise": "001"             (optional)
         }
+    
+    409 with {"missing": [...]} when a chunk is gone because its file
+    changed since the sync; the client syncs again.
+    """
+    body = request.get_json(silent=True)
+    ids = body.get("ids") if isinstance(body, dict) else None
+    if not isinstance(ids, list) or not all(isinstance(chunk, str) for chunk in ids):
+        return jsonify({"error": "Expected {\"ids\": [...]}"}), 400
+    if len(ids) > MAX_CHUNKS_PER_REQUEST:
+        return jsonify({"error": f"At most {MAX_CHUNKS_PER_REQUEST} chunks per request"}), 413
+    
+    root = g.root
+    chunks = {chunk: root.chunk_index.read_chunk(chunk) for chunk in set(ids)}
+    unknown = [chunk for chunk, data in chunks.items() if data is None]
+    bucket = body.get("bucket")
+    if unknown and isinstance(bucket, str) and bucket in root.catalog.buckets:
+        # Synced through another process (or before a restart): index the
+        # bucket here, then look again
+        codes = root.catalog.buckets[bucket]
+        if body.get("exercise") in codes:
+            codes = [body["exercise"]]
+        root.chunk_index.bucket_manifest(os.path.join(root.base_dir, bucket), codes)
+        chunks.update((chunk, root.chunk_index.read_chunk(chunk)) for chunk in unknown)
+    
+    missing = sorted(chunk for chunk, data in chunks.items() if data is None)
+    if missing:
+        return jsonify({"error": "Unknown or outdated chunks", "missing": missing}), 409
+    return Response(b''.join(chunks[chunk] for chunk in ids), mimetype='application/octet-stream')
+
+
+@course_route('/api/exercises/<bucket>/<exercise_code>/submissions', methods=['POST'])
+def submit_exercise(bucket, exercise_code):
     """
-    buckets = {}
+    Submit code for grading (202 Accepted; grading happens in the background)
+    
+    Body, one of:
+        - the source code itself (e.g. text/plain), ?student=<id> optional
+        - multipart form with a "code" file and optional "student" field
+        - JSON {"code": "...", "student": "..."}
+        - JSON {"submissions": [{"code": "...", "student": "..."}, ...]} (bulk)
+    
+    Returns:
+        {"id": "...", "status": "queued", "url": ".../api/submissions/<id>"}
+        or {"submissions": [...]} for a bulk upload;
+        503 with Retry-After when the grading queue is full
+    """
+    dir_path = g.root.paths.exercise_dir(bucket, exercise_code)
+    if not dir_path or not g.root.paths.exercise_file(bucket, exercise_code, 'tests.toml'):
+        return jsonify({
+            "error": "Exercise not found or has no tests",
+            "bucket": bucket,
+            "exercise_code": exercise_code
+        }), 404
+    
+    if (request.content_length or 0) > MAX_SUBMISSION_BYTES * MAX_BULK_SUBMISSIONS:
+        return jsonify({"error": "Upload too large"}), 413
     
     try:
-        for bucket_name in os.listdir(BASE_DIR):
-            bucket_path = os.path.join(BASE_DIR, bucket_name)
-            if os.path.isdir(bucket_path):
-                exercises = [
-                    name for name in os.listdir(bucket_path)
-                    if os.path.isdir(os.path.join(bucket_path, name)) and
-                    os.path.isfile(os.path.join(bucket_path, name, "index.md"))
-                ]
-                if exercises:
-                    buckets[bucket_name] = sorted(exercises)
-    except Exception as e:
-        return jsonify({"error": f"Failed to list exercises: {str(e)}"}), 500
+        items, bulk = _read_submissions()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Submissions of a server without a course config keep unqualified ids
+    course = g.root.name if COURSES_FILE else None
+    accepted = []
+    rejected = 0
+    for source, student in items:
+        if len(source) > MAX_SUBMISSION_BYTES:
+            accepted.append({"error": "Submission too large"})
+            continue
+        try:
+            record, status = GRADER.submit(bucket, exercise_code, dir_path, source, student, course)
+        except grading.QueueFull:
+            rejected += 1
+            accepted.append({"error": "Grading queue is full"})
+            continue
+        accepted.append({
+            "id": record["id"],
+            "status": status,
+            "url": _api_url(f"/api/submissions/{record['id']}"),
+        })
     
-    return jsonify({"buckets": buckets})
+    if not bulk:
+        entry = accepted[0]
+        if "error" in entry:
+            status_code = 503 if rejected else 413
+            response = jsonify(entry)
+            response.status_code = status_code
+            if rejected:
+                response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+            return response
+        response = jsonify(entry)
+        response.status_code = 202
+        response.headers['Location'] = entry["url"]
+        return response
+    
+    response = jsonify({"submissions": accepted, "rejected": rejected})
+    response.status_code = 202 if len(accepted) > rejected else 503
+    if rejected:
+        response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
 
 
-def _process_markdown_resources(markdown_content, resource_base_url, has_local_res):
+def _read_submissions():
     """
-    Process markdown to fix resource paths
+    Parse a submission upload
     
-    Converts:
-        - res/image.png -> {resource_base_url}/image.png
-        - ![alt](res/image.png) -> ![alt]({resource_base_url}/image.png)
+    Returns:
+        ([(source_bytes, student), ...], is_bulk)
     """
-    import re
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError("Invalid JSON body")
+        if "submissions" in data:
+            entries = data["submissions"]
+            if not isinstance(entries, list) or not entries:
+                raise ValueError("'submissions' must be a non-empty list")
+            if len(entries) > MAX_BULK_SUBMISSIONS:
+                raise ValueError(f"At most {MAX_BULK_SUBMISSIONS} submissions per upload")
+            items = []
+            for entry in entries:
+                if not isinstance(entry, dict) or not isinstance(entry.get("code"), str):
+                    raise ValueError("Each submission needs a 'code' string")
+                items.append((entry["code"].encode('utf-8'), entry.get("student")))
+            return items, True
+        if not isinstance(data.get("code"), str):
+            raise ValueError("Missing 'code'")
+        return [(data["code"].encode('utf-8'), data.get("student"))], False
     
-    # Fix markdown image syntax: ![alt](res/...)
-    markdown_content = re.sub(
-        r'!\[([^\]]*)\]\(res/([^)]+)\)',
-        rf'![\1]({resource_base_url}/\2)',
-        markdown_content
-    )
+    if 'code' in request.files:
+        return [(request.files['code'].read(), request.form.get('student'))], False
     
-    # Fix HTML img tags: <img src="res/...">
-    markdown_content = re.sub(
-        r'<img\s+([^>]*\s+)?src=["\']res/([^"\']+)["\']',
-        rf'<img \1src="{resource_base_url}/\2"',
-        markdown_content
-    )
+    source = request.get_data()
+    if not source:
+        raise ValueError("Empty submission")
+    return [(source, request.args.get('student'))], False
+
+
+@course_route('/api/submissions/<submission_id>', methods=['GET'])
+def get_submission(submission_id):
+    """
+    Submission status and, once graded, its result
     
-    # Fix plain res/ references in text (less common)
-    markdown_content = re.sub(
-        r'\bres/(\S+)',
-        rf'{resource_base_url}/\1',
-        markdown_content
-    )
+    ?wait=<seconds> long-polls until the result is ready (at most 60s)
+    
+    Returns:
+        {"id": "...", "status": "queued|running|done", "submission": {...}, "result": {...}}
+    """
+    # Ids are hex digests; anything else can't name a stored submission
+    if len(submission_id) != 32 or not all(c in '0123456789abcdef' for c in submission_id):
+        abort(404)
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_RESULT_WAIT)
+    except ValueError:
+        wait = 0.0
     
-    return markdown_content
+    status = GRADER.status(submission_id, wait=wait)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
+
+@course_route('/api/exercises/<bucket>/<exercise_code>/stats', methods=['GET'])
+def get_exercise_stats(bucket, exercise_code):
+    """
+    Class-wide results of an exercise's submissions (see analytics.py)
+    
+    Returns:
+        {"attempts", "pending", "students", "success_rate", "load_failures",
+         "tests": [{"test", "description", "pass_rate", "student_pass_rate", ...}],
+         "failure_clusters": [...], "time_to_pass": {...}}
+    """
+    if not g.root.paths.exercise_dir(bucket, exercise_code):
+        return jsonify({
+            "error": "Exercise not found",
+            "bucket": bucket,
+            "exercise_code": exercise_code
+        }), 404
+    course = g.root.name if COURSES_FILE else None
+    try:
+        stats = GRADER.attempts.exercise_stats(bucket, exercise_code, course)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 501
+    return jsonify(stats)
+
+
+def _guess_mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+@course_route('/api/exercises', methods=['GET'])
+def list_exercises():
+    """
+    List all available exercises organized by bucket
+    
+    Returns:
+        {
+            "buckets": {
+                "default": ["001", "002", ...],
+                "custom": ["001", ...]
+            }
+        }
+
+    With any of ?bucket=, ?prefix=, ?limit=, ?cursor= or ?fields= the
+    listing is paginated instead (see Catalog.page):
+        {
+            "exercises": [{"bucket": "default", "code": "001"}, ...],
+            "next_cursor": "..." or null
+        }
+    ?fields=summary adds "title" and "has_tests" to each exercise.
+    """
+    if not any(name in request.args for name in LISTING_PARAMS):
+        return jsonify({"buckets": g.root.catalog.buckets})
+
+    fields = request.args.get('fields', 'codes')
+    if fields not in ('codes', 'summary'):
+        return jsonify({"error": "fields must be 'codes' or 'summary'"}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        page = g.root.catalog.page(
+            bucket=request.args.get('bucket'),
+            prefix=request.args.get('prefix', ''),
+            cursor=request.args.get('cursor'),
+            limit=limit,
+            summary=fields == 'summary',
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+
+@course_route('/api/events', methods=['GET'])
+def stream_events():
+    """
+    Server-sent events for content changes
+
+    Only events of the request's course are sent.
+
+    Query parameters:
+        exercise: Only events for this "bucket/code" (repeatable)
+        last_event_id: Same as the Last-Event-ID header
+
+    Streams:
+        event: exercise
+        data: {"course": "main", "bucket": "default", "code": "001", "files": ["index.md"], "removed": false}
+
+        event: reset   (the client missed events; reload what it shows)
+    """
+    if EVENTS_PORT:
+        # Long-lived connections would each hold a worker thread here
+        host = urlsplit(request.host_url).hostname
+        if ':' in host:
+            host = f"[{host}]"
+        query = [(name, value) for name, value in request.args.items(multi=True) if name != 'course']
+        query = urlencode(query + [('course', g.root.name)])
+        return redirect(f"{request.scheme}://{host}:{EVENTS_PORT}/api/events?{query}", code=307)
+
+    global _event_streams
+    with _event_streams_lock:
+        if _event_streams >= MAX_EVENT_STREAMS:
+            response = jsonify({"error": "Too many event streams"})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+            return response
+        _event_streams += 1
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    keys = set(request.args.getlist('exercise'))
+    response = Response(
+        stream_with_context(events.stream(EVENTS, last_id, keys, duration=EVENT_STREAM_SECONDS,
+                                          course=g.root.name)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+    response.call_on_close(_close_event_stream)
+    return response
+
+
+def _close_event_stream():
+    global _event_streams
+    with _event_streams_lock:
+        _event_streams -= 1
+
+
+@course_route('/api/search', methods=['GET'])
+def search_exercises():
+    """
+    Ranked full-text search over exercise markdown (see search.py)
+
+    Query parameters:
+        q: Search words; "pri*" matches words starting with "pri"
+        bucket: Only exercises of this bucket
+        limit: Maximum number of results (default 20, at most 100)
+
+    Returns:
+        {
+            "query": "...",
+            "total": 3,
+            "results": [{"bucket": "default", "code": "001", "title": "...", "score": 4.2}, ...]
+        }
+    """
+    query = request.args.get('q', '')[:MAX_QUERY_LENGTH]
+    try:
+        limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    found = g.root.search.search(query, limit=limit, bucket=request.args.get('bucket'))
+    return jsonify({"query": query, **found})
+
+
+@course_route('/api/search/suggest', methods=['GET'])
+def suggest_search():
+    """
+    Autocomplete the last word of ?q= from the indexed vocabulary
+
+    Returns:
+        {"query": "sum of li", "suggestions": ["sum of list", "sum of lines", ...]}
+    """
+    query = request.args.get('q', '')[:MAX_QUERY_LENGTH]
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    return jsonify({"query": query, "suggestions": g.root.search.suggest(query, limit=limit)})
 
 
 @app.errorhandler(404)
@@ -260,16 +964,39 @@ if __name__ == "__main__":
     print("=" * 60)
     print("Exercise API Server Starting")
     print("=" * 60)
-    print(f"Base Directory: {BASE_DIR}")
-    print(f"Global Resources: {GLOBAL_RES_DIR}")
+    if COURSES_FILE:
+        print(f"Courses: {COURSES_FILE} (default: {DEFAULT_COURSE})")
+    for root in COURSES.values():
+        prefix = "" if root.name == DEFAULT_COURSE else f"/courses/{root.name}"
+        print(f"[{root.name}] {prefix or '/'}")
+        if root.build_tree:
+            print(f"  Build (read mode): {root.build_tree}")
+        print(f"  Base Directory: {root.base_dir}")
+        print(f"  Global Resources: {', '.join(root.res_dirs)}")
     print("=" * 60)
     print("\nEndpoints:")
     print("  GET  /health")
-    print("  GET  /api/exercises")
+    print("  GET  /courses/<course>/health")
+    print("  GET  /metrics")
+    print("  GET  /api/exercises[?bucket=&prefix=&limit=&cursor=&fields=codes|summary]")
     print("  GET  /api/exercises/<bucket>/<code>")
     print("  GET  /api/exercises/<bucket>/<code>/<file>")
     print("  GET  /api/exercises/<bucket>/<code>/res/<file>")
+    print("  GET  /api/exercises/<bucket>/<code>/datasets/<name>")
+    print("  POST /api/exercises/<bucket>/<code>/submissions")
+    print("  GET  /api/exercises/<bucket>/<code>/stats")
+    print("  POST /api/bundles/<bucket>/sync")
+    print("  POST /api/chunks")
+    print("  GET  /api/submissions/<id>[?wait=<seconds>]")
     print("  GET  /api/res/<file>")
+    print("  GET  /api/search?q=<words>[&bucket=&limit=]")
+    print("  GET  /api/events (server-sent events)")
+    print("  GET  /api/search/suggest?q=<prefix>")
+    print("  (every /api/... endpoint also under /courses/<course>/api/...)")
     print("=" * 60)
+    print("\nDevelopment server - use serve.py for classroom/production use")
+    
+    # Keep each course's catalog in sync with its content directory
+    start_watchers(on_content_change)
     
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The server modules live at the top level; the grading helpers in
+# course_checker/tests import each other as top-level modules
+sys.path.insert(0, ROOT)
+sys.path.append(os.path.join(ROOT, "course_checker", "tests"))
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data if isinstance(data, bytes) else data.encode("utf-8"))
+
+
+def _fixture_tree(base):
+    """
+    A small course: two exercises, exercise and global resources, and a
+    secret file next to (not inside) the content directories
+    """
+    content = os.path.join(base, "serverstr")
+    _write(os.path.join(content, "default", "001", "index.md"),
+           "# Sum of a list\n\n![pic](res/pic.png)\n\nWrite `sum_list(numbers)`.\n")
+    _write(os.path.join(content, "default", "001", "tests.toml"),
+           '[[test]]\nfunction = "sum_list"\nargs = [[1, 2, 3]]\nreturns = 6\n')
+    _write(os.path.join(content, "default", "001", "solution.py"),
+           "def sum_list(numbers):\n    return sum(numbers)\n")
+    _write(os.path.join(content, "default", "001", "res", "pic.png"), bytes(range(256)) * 8)
+    _write(os.path.join(content, "default", "001", "res", "img", "g.png"), b"\x89PNG" + b"g" * 500)
+    _write(os.path.join(content, "default", "002", "index.md"), "# Second\n\nNo tests yet.\n")
+    _write(os.path.join(content, "other", "A1", "index.md"), "# Other bucket\n")
+    _write(os.path.join(content, "other", "A1", "notes.txt"), "notes\n" * 100)
+    _write(os.path.join(base, "res", "readme.txt"), "shared resource\n" * 50)
+    _write(os.path.join(base, "res", "img", "g.png"), b"\x89PNG" + b"r" * 300)
+    _write(os.path.join(base, "secret.txt"), "not to be served\n")
+    # Links pointing out of the tree are never served
+    os.symlink(os.path.join(base, "secret.txt"), os.path.join(content, "default", "001", "link.txt"))
+    os.symlink(os.path.join(base, "secret.txt"), os.path.join(base, "res", "link.txt"))
+    os.symlink(base, os.path.join(base, "res", "up"))
+    os.symlink("readme.txt", os.path.join(base, "res", "alias.txt"))
+    _write(os.path.join(base, "courses.toml"),
+           'res = ["res"]\ndefault = "main"\n\n[courses.main]\ncontent = "serverstr"\n')
+
+
+# server.py configures itself from the environment at import time, so the
+# fixture tree has to exist before any test module imports it
+FIXTURE_DIR = tempfile.mkdtemp(prefix="exercise-api-tests-")
+atexit.register(shutil.rmtree, FIXTURE_DIR, ignore_errors=True)
+_fixture_tree(FIXTURE_DIR)
+os.environ["EXERCISE_COURSES"] = os.path.join(FIXTURE_DIR, "courses.toml")
+os.environ["EXERCISE_GRADING_DIR"] = os.path.join(FIXTURE_DIR, "grading")
+os.environ["EXERCISE_RATE_LIMIT"] = "0"
+os.environ.pop("EXERCISE_BUILD_DIR", None)
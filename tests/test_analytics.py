@@ -0,0 +1,85 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import analytics
+
+
+def _entry(test, passed, got=None, error=None):
+    entry = {"test": test, "function": "add", "description": "", "passed": passed}
+    if not passed:
+        entry.update({"call": "add(1, 2)", "expected": "3"})
+        entry.update({"got": got} if error is None else {"error": error})
+    return entry
+
+
+# Submissions by distinct code: A passes, B fails test 2, C doesn't load,
+# D fails both tests
+OUTCOMES = {
+    "A": {"success": True, "loaded": True, "tests": [_entry(1, True), _entry(2, True)]},
+    "B": {"success": False, "loaded": True, "tests": [_entry(1, True), _entry(2, False, got="-1")]},
+    "C": {"success": False, "loaded": False, "tests": []},
+    "D": {"success": False, "loaded": True,
+          "tests": [_entry(1, False, error="ZeroDivisionError: x"), _entry(2, False, got="-1")]},
+}
+# (student, submission, submitted_at)
+ATTEMPTS = [
+    ("s1", "B", 0), ("s2", "B", 10), ("s2", "B", 20), ("s3", "C", 30),
+    ("s3", "D", 40), (None, "A", 50), ("s4", "X", 60), ("s1", "A", 120),
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = analytics.AttemptStore(str(tmp_path / "attempts.sqlite3"))
+    for student, sub_id, submitted_at in ATTEMPTS:
+        store.add_attempt("main", "default", "001", student, sub_id, submitted_at)
+    for sub_id, result in OUTCOMES.items():
+        store.add_outcome(sub_id, result)
+    return store
+
+
+def test_stats_match_hand_computed_values(store):
+    stats = store.exercise_stats("default", "001", "main")
+    # X is still queued; s4 has no graded attempt
+    assert (stats["attempts"], stats["pending"], stats["students"]) == (7, 1, 3)
+    # A twice out of seven graded attempts
+    assert stats["success_rate"] == round(2 / 7, 4)
+    assert stats["load_failures"] == 1
+
+    # Test 1 passes in B (3 attempts) and A (2); the latest attempts are
+    # s1: A, s2: B, s3: D
+    rates = {t["test"]: (t["attempts"], t["pass_rate"], t["student_pass_rate"]) for t in stats["tests"]}
+    assert rates == {
+        1: (7, round(5 / 7, 4), round(2 / 3, 4)),
+        2: (7, round(2 / 7, 4), round(1 / 3, 4)),
+    }
+
+    clusters = [(c["test"], c.get("got"), c.get("error"), c["attempts"], c["students"])
+                for c in stats["failure_clusters"]]
+    assert clusters == [
+        (2, "-1", None, 4, 3),
+        (1, None, "ZeroDivisionError: x", 1, 1),
+    ]
+
+    # Only s1 passes: first attempt at 0, passing at 120, two attempts
+    time_to_pass = stats["time_to_pass"]
+    assert (time_to_pass["students"], time_to_pass["passed"]) == (3, 1)
+    assert time_to_pass["seconds"]["p50"] == 120.0
+    assert time_to_pass["attempts"]["max"] == 2.0
+    assert [b["students"] for b in time_to_pass["histogram"] if b["up_to_seconds"] == 300] == [1]
+    assert sum(b["students"] for b in time_to_pass["histogram"]) == 1
+
+
+def test_new_outcomes_refresh_cached_stats(store):
+    assert store.exercise_stats("default", "001", "main")["pending"] == 1
+    store.add_outcome("X", OUTCOMES["A"])
+    stats = store.exercise_stats("default", "001", "main")
+    assert (stats["pending"], stats["students"]) == (0, 4)
+    assert stats["time_to_pass"]["passed"] == 2
+
+
+def test_no_attempts():
+    stats = analytics.exercise_stats([], {})
+    assert (stats["attempts"], stats["success_rate"], stats["tests"], stats["failure_clusters"]) == (0, None, [], [])
+    assert stats["time_to_pass"]["seconds"] is None
@@ -0,0 +1,193 @@
+import http.client
+import socket
+import time
+
+import pytest
+
+import async_server
+import server
+
+
+PATHS = [
+    "/api/exercises",
+    "/api/exercises?fields=summary",
+    "/api/exercises?limit=1",
+    "/api/exercises?limit=x",
+    "/api/exercises?fields=bad",
+    "/api/exercises/",
+    "/api/exercises/default/001",
+    "/api/exercises/default/002",
+    "/api/exercises/default/nope",
+    "/api/exercises/other/A1",
+    "/api/exercises/default/001/tests.toml",
+    "/api/exercises/default/001/solution.py",
+    "/api/exercises/default/001/missing",
+    "/api/exercises/default/001/link.txt",
+    "/api/exercises/default/001/res/pic.png",
+    "/api/exercises/default/001/res/img/g.png",
+    "/api/exercises/default/001/res/../solution.py",
+    "/api/exercises/other/A1/notes.txt",
+    "/api/res/readme.txt",
+    "/api/res/img/g.png",
+    "/api/res/link.txt",
+    "/api/res/..%2Fsecret.txt",
+    "/api/res/nope",
+    "/courses/main/api/exercises/default/001",
+    "/courses/main/api/res/readme.txt",
+    "/courses/nope/api/exercises",
+    "/nothing",
+]
+REQUEST_HEADERS = [
+    {},
+    {"Range": "bytes=10-99"},
+    {"Range": "bytes=100-"},
+    {"Range": "bytes=999999999-"},
+]
+COMPARED_HEADERS = ("Content-Type", "Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def async_port():
+    port = _free_port()
+    async_server.AsyncExerciseServer("127.0.0.1", port, threads=4).start()
+    return port
+
+
+@pytest.fixture
+def flask_client():
+    return server.app.test_client()
+
+
+def _async_request(port, method, path, headers):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    try:
+        conn.request(method, path, headers=headers)
+        response = conn.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        conn.close()
+
+
+def _flask_request(client, method, path, headers):
+    with client.open(path, method=method, headers=headers) as response:
+        return response.status_code, dict(response.headers), response.get_data()
+
+
+def _users_after_responses():
+    """
+    Users of each cached descriptor once the server finished its responses
+    (the client can have read a body before the server's cleanup ran)
+    """
+    cache = server.COURSES[server.DEFAULT_COURSE].file_cache
+    deadline = time.monotonic() + 2
+    while True:
+        users = [entry.users for entry in list(cache._entries.values())]
+        if not any(users) or time.monotonic() > deadline:
+            return users
+        time.sleep(0.01)
+
+
+def _assert_same(flask, async_, compared=COMPARED_HEADERS):
+    flask_status, flask_headers, flask_body = flask
+    async_status, async_headers, async_body = async_
+    assert async_status == flask_status
+    assert async_body == flask_body
+    for name in compared:
+        assert async_headers.get(name) == flask_headers.get(name), name
+
+
+@pytest.mark.parametrize("headers", REQUEST_HEADERS, ids=["plain", "range", "open-range", "unsatisfiable"])
+@pytest.mark.parametrize("path", PATHS)
+def test_get_matches_flask(async_port, flask_client, path, headers):
+    headers = dict(headers, Host="localhost")
+    _assert_same(_flask_request(flask_client, "GET", path, headers),
+                 _async_request(async_port, "GET", path, headers))
+
+
+@pytest.mark.parametrize("path", [
+    "/api/exercises",
+    "/api/exercises/default/001",
+    "/api/exercises/default/001/res/pic.png",
+    "/api/res/readme.txt",
+    "/api/res/nope",
+])
+def test_head_matches_flask(async_port, flask_client, path):
+    headers = {"Host": "localhost"}
+    _assert_same(_flask_request(flask_client, "HEAD", path, headers),
+                 _async_request(async_port, "HEAD", path, headers))
+
+
+@pytest.mark.parametrize("path", ["/api/res/readme.txt", "/api/exercises/default/001/res/pic.png"])
+def test_conditional_requests_match_flask(async_port, flask_client, path):
+    etag = _flask_request(flask_client, "GET", path, {})[1]["ETag"]
+    for headers in ({"If-None-Match": etag}, {"If-None-Match": '"other"'},
+                    {"Range": "bytes=0-9", "If-Range": etag},
+                    {"Range": "bytes=0-9", "If-Range": '"other"'}):
+        headers = dict(headers, Host="localhost")
+        flask = _flask_request(flask_client, "GET", path, headers)
+        _assert_same(flask, _async_request(async_port, "GET", path, headers),
+                     compared=("ETag", "Content-Range"))
+    assert _async_request(async_port, "GET", path, {"If-None-Match": etag})[0] == 304
+
+
+def test_health_matches_flask(async_port, flask_client):
+    import json
+
+    def stable(body):
+        health = json.loads(body)
+        health.pop("in_flight")
+        for entry in [health] + list(health["courses"].values()):
+            entry["catalog"].pop("age_seconds")
+        return health
+
+    flask_status, _, flask_body = _flask_request(flask_client, "GET", "/health", {})
+    async_status, _, async_body = _async_request(async_port, "GET", "/health", {})
+    assert async_status == flask_status
+    assert stable(async_body) == stable(flask_body)
+
+
+@pytest.mark.parametrize("path", ["/courses/main/health", "/courses/nope/health"])
+def test_course_health_matches_flask(async_port, flask_client, path):
+    import json
+
+    def stable(body):
+        health = json.loads(body)
+        health.pop("in_flight", None)
+        health.get("catalog", {}).pop("age_seconds", None)
+        return health
+
+    flask_status, _, flask_body = _flask_request(flask_client, "GET", path, {})
+    async_status, _, async_body = _async_request(async_port, "GET", path, {})
+    assert async_status == flask_status == (200 if path == "/courses/main/health" else 404)
+    assert stable(async_body) == stable(flask_body)
+
+
+def test_other_methods_not_allowed(async_port):
+    assert _async_request(async_port, "DELETE", "/api/exercises", {})[0] == 405
+
+
+@pytest.mark.parametrize("method,headers", [
+    ("HEAD", {}),
+    ("GET", {"If-None-Match": "*"}),
+    ("GET", {"Range": "bytes=999999999-"}),
+    ("GET", {}),
+])
+def test_file_cache_entries_are_released(async_port, method, headers):
+    path = "/api/res/readme.txt"
+    for _ in range(3):
+        _async_request(async_port, method, path, headers)
+    assert not any(_users_after_responses())
+
+
+def test_client_gone_before_body_releases_entry(async_port):
+    path = "/api/exercises/default/001/res/pic.png"
+    with socket.create_connection(("127.0.0.1", async_port)) as sock:
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+        sock.recv(16)
+    assert not any(_users_after_responses())
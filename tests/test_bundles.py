@@ -0,0 +1,81 @@
+import hashlib
+import os
+import random
+
+import pytest
+
+import bundles
+import server
+
+
+def _data(size, seed=1):
+    return random.Random(seed).randbytes(size)
+
+
+def _reassemble(manifest, read_chunk):
+    return b"".join(read_chunk(chunk) for chunk, _ in manifest["chunks"])
+
+
+def test_chunks_reassemble_to_the_file(tmp_path):
+    data = _data(300 * 1024)
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+    index = bundles.ChunkIndex()
+    manifest = index.manifest(str(path))
+    assert manifest["sha256"] == hashlib.sha256(data).hexdigest()
+    assert sum(size for _, size in manifest["chunks"]) == len(data)
+    assert all(size <= bundles.MAX_CHUNK for _, size in manifest["chunks"])
+    assert all(size >= bundles.MIN_CHUNK for _, size in manifest["chunks"][:-1])
+    assert _reassemble(manifest, index.read_chunk) == data
+
+
+def test_an_insertion_changes_only_nearby_chunks():
+    data = _data(512 * 1024)
+    edited = data[:200000] + b"inserted line\n" + data[200000:]
+    before = {chunk for chunk, _ in bundles.file_manifest(data)["chunks"]}
+    after = [chunk for chunk, _ in bundles.file_manifest(edited)["chunks"]]
+    assert len(after) > 20
+    assert len([chunk for chunk in after if chunk not in before]) <= 2
+
+
+def test_numpy_and_python_cut_the_same_chunks():
+    pytest.importorskip("numpy")
+    data = _data(200 * 1024, seed=2)
+    assert bundles._cut_points_numpy(data) == bundles._cut_points_python(data)
+
+
+def test_changed_file_no_longer_serves_its_old_chunks(tmp_path):
+    path = tmp_path / "data.bin"
+    path.write_bytes(_data(100 * 1024))
+    index = bundles.ChunkIndex()
+    chunks = [chunk for chunk, _ in index.manifest(str(path))["chunks"]]
+    path.write_bytes(_data(100 * 1024, seed=3))
+    assert index.read_chunk(chunks[0]) is None
+
+
+def test_sync_round_trip():
+    client = server.app.test_client()
+    base_dir = os.path.join(server.COURSES[server.DEFAULT_COURSE].base_dir, "default")
+
+    sync = client.post("/api/bundles/default/sync", json={"files": {}}).get_json()
+    assert sync["removed"] == [] and "001/index.md" in sync["files"]
+    ids = [chunk for manifest in sync["files"].values() for chunk, _ in manifest["chunks"]]
+    response = client.post("/api/chunks", json={"ids": ids, "bucket": "default"})
+    assert response.status_code == 200
+
+    body, held = response.data, {}
+    for path, manifest in sync["files"].items():
+        data, body = body[:manifest["size"]], body[manifest["size"]:]
+        with open(os.path.join(base_dir, *path.split("/")), "rb") as f:
+            assert data == f.read()
+        held[path] = hashlib.sha256(data).hexdigest()
+    assert body == b""
+
+    again = client.post("/api/bundles/default/sync", json={"files": held}).get_json()
+    assert again == {"etag": sync["etag"], "files": {}, "removed": []}
+    unchanged = client.post("/api/bundles/default/sync", json={"etag": sync["etag"]}).get_json()
+    assert unchanged == {"etag": sync["etag"], "unchanged": True}
+    held["001/gone.txt"] = "0" * 64
+    assert client.post("/api/bundles/default/sync", json={"files": held}).get_json()["removed"] == ["001/gone.txt"]
+
+    assert client.post("/api/chunks", json={"ids": ["0" * 32]}).status_code == 409
@@ -0,0 +1,162 @@
+import textwrap
+
+import code_cache
+import test_runner
+
+
+def _snapshot(source):
+    return code_cache.NamespaceSnapshot(compile(textwrap.dedent(source), "student.py", "exec"))
+
+
+def _run(tmp_path, source, tests):
+    code_file = tmp_path / "student.py"
+    code_file.write_text(textwrap.dedent(source))
+    test_file = tmp_path / "tests.toml"
+    test_file.write_text(textwrap.dedent(tests))
+    runner = test_runner.TestRunner(str(code_file), str(test_file))
+    runner.run_all_tests()
+    return runner
+
+
+def test_clone_isolates_module_globals():
+    snapshot = _snapshot("""
+        items = []
+        def push(x):
+            items.append(x)
+            return len(items)
+    """)
+    first = snapshot.clone()
+    assert first["push"](1) == 1
+    assert first["push"](2) == 2
+    assert snapshot.clone()["push"](1) == 1
+    assert snapshot.namespace["items"] == []
+
+
+def test_clone_class_method_reads_module_global():
+    snapshot = _snapshot("""
+        history = []
+        class Tracker:
+            def add(self, x):
+                history.append(x)
+                return len(history)
+        def track(x):
+            return Tracker().add(x)
+        def total():
+            return len(history)
+    """)
+    first = snapshot.clone()
+    assert first["track"](5) == 1
+    assert first["total"]() == 1
+    second = snapshot.clone()
+    assert second["total"]() == 0
+    assert second["track"](5) == 1
+
+
+def test_clone_decorated_function_uses_clone_globals():
+    snapshot = _snapshot("""
+        import functools
+        calls = []
+        def logged(func):
+            @functools.wraps(func)
+            def wrapper(*args):
+                calls.append(args)
+                return func(*args)
+            return wrapper
+        @logged
+        def double(x):
+            return 2 * x
+        def count():
+            return len(calls)
+    """)
+    first = snapshot.clone()
+    first["double"](1)
+    assert first["count"]() == 1
+    assert snapshot.clone()["count"]() == 0
+
+
+def test_clone_handler_table_points_at_cloned_functions():
+    snapshot = _snapshot("""
+        seen = []
+        def on_a():
+            seen.append("a")
+            return len(seen)
+        HANDLERS = {"a": on_a}
+    """)
+    clone = snapshot.clone()
+    assert clone["HANDLERS"]["a"] is clone["on_a"]
+    assert clone["HANDLERS"]["a"]() == 1
+    assert clone["seen"] == ["a"]
+
+
+def test_class_with_global_passes_in_every_group(tmp_path):
+    runner = _run(tmp_path, """
+        history = []
+        class Tracker:
+            def add(self, x):
+                history.append(x)
+                return len(history)
+        def track(x):
+            return Tracker().add(x)
+    """, """
+        [[test]]
+        group = "a"
+        function = "track"
+        args = [5]
+        returns = 1
+
+        [[test]]
+        group = "b"
+        function = "track"
+        args = [5]
+        returns = 1
+    """)
+    assert (runner.passed, runner.failed) == (2, 0)
+
+
+def test_first_group_after_ungrouped_tests_gets_fresh_namespace(tmp_path):
+    runner = _run(tmp_path, """
+        items = []
+        def push(x):
+            items.append(x)
+            return len(items)
+    """, """
+        [[test]]
+        function = "push"
+        args = [1]
+        returns = 1
+
+        [[test]]
+        group = "fresh"
+        function = "push"
+        args = [1]
+        returns = 1
+    """)
+    assert (runner.passed, runner.failed) == (2, 0)
+
+
+def test_module_side_effects_happen_once(tmp_path, capsys, monkeypatch):
+    import io
+    monkeypatch.setattr("sys.stdin", io.StringIO("Ada\n"))
+    runner = _run(tmp_path, """
+        name = input("Name? ")
+        print("hello", name)
+        class Greeter:
+            def greet(self):
+                return "hi " + name
+        def greet():
+            return Greeter().greet()
+    """, """
+        [[test]]
+        group = "a"
+        function = "greet"
+        returns = "hi Ada"
+
+        [[test]]
+        group = "b"
+        function = "greet"
+        returns = "hi Ada"
+    """)
+    assert (runner.passed, runner.failed) == (2, 0)
+    out = capsys.readouterr().out
+    assert out.count("hello Ada") == 1
+    assert out.count("Name? ") == 1
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import datasets
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture
+def exercise(tmp_path):
+    (tmp_path / "data.csv").write_text("x,y\n1,2.5\n3,4.5\n")
+    return str(tmp_path), {"name": "data", "file": "data.csv"}
+
+
+def test_load_dataset_columns(exercise):
+    exercise_dir, spec = exercise
+    data = datasets.load_dataset(exercise_dir, spec)
+    assert list(data) == ["x", "y"]
+    assert data["y"].tolist() == [2.5, 4.5]
+    assert not data["x"].flags.writeable
+
+
+def test_touched_source_is_hashed_once(exercise, monkeypatch):
+    exercise_dir, spec = exercise
+    cache_dir, _ = datasets.ensure_dataset(exercise_dir, spec)
+    source = os.path.join(exercise_dir, "data.csv")
+    st = os.stat(source)
+    os.utime(source, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    hashed = []
+    sha256 = datasets._sha256
+    monkeypatch.setattr(datasets, "_sha256", lambda path: hashed.append(path) or sha256(path))
+    for _ in range(3):
+        assert datasets.ensure_dataset(exercise_dir, spec)[0] == cache_dir
+    assert hashed == [source]
+    assert datasets._read_meta(cache_dir)["source_mtime_ns"] == os.stat(source).st_mtime_ns
+
+
+def test_changed_source_is_converted_again(exercise):
+    exercise_dir, spec = exercise
+    datasets.ensure_dataset(exercise_dir, spec)
+    with open(os.path.join(exercise_dir, "data.csv"), "a") as f:
+        f.write("5,6.5\n")
+    assert datasets.load_dataset(exercise_dir, spec)["x"].tolist() == [1, 3, 5]
+
+
+@pytest.mark.parametrize("toml,csv,status,message", [
+    ('[[dataset]]\nname = "other"\nfile = "data.csv"\n', b"x\n1\n", 404, "not declared"),
+    ('[[dataset]]\nname = "data"\nfile = "missing.csv"\n', b"x\n1\n", 404, "not found"),
+    ('[[dataset]]\nname = "data"\nfile = "data.csv"\n', b"x\n\xff\n", 500, "not valid CSV"),
+    ('[[dataset]]\nname = "data"\nfile = "data.csv"\ndelimiter = ";;"\n', b"x\n1\n", 500, "not valid CSV"),
+    ('[[dataset]\n', b"x\n1\n", 500, "not valid TOML"),
+])
+def test_dataset_errors_are_reported(tmp_path, toml, csv, status, message):
+    import server
+
+    (tmp_path / "tests.toml").write_text(toml)
+    (tmp_path / "data.csv").write_bytes(csv)
+    with server.app.app_context():
+        with pytest.raises(server.datasets.DatasetError) as error:
+            server._ensure_dataset(server.COURSES[server.DEFAULT_COURSE], str(tmp_path), "data")
+        response, code = server._dataset_error(error.value, "data")
+    assert code == status
+    assert message in response.get_json()["error"]
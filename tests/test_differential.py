@@ -0,0 +1,53 @@
+import multiprocessing
+import time
+
+import pytest
+
+import differential
+
+
+def test_module_cache_is_bounded():
+    differential._modules.clear()
+    reference = differential._load_module("solution.py", "def f(x):\n    return x\n")
+    for i in range(differential.MAX_MODULES * 3):
+        differential._load_module("student.py", f"def f(x):\n    return x + {i}\n")
+        # Recently used modules stay cached
+        assert differential._load_module("solution.py", "def f(x):\n    return x\n") is reference
+    assert len(differential._modules) == differential.MAX_MODULES
+
+
+def test_check_case_reports_disagreement():
+    student = differential._load_module("student.py", "def f(x):\n    return x + 1\n")["f"]
+    reference = differential._load_module("solution.py", "def f(x):\n    return x\n")["f"]
+    assert differential.check_case(reference, reference, (3,)) is None
+    assert differential.check_case(student, reference, (3,)) == (4, 3, None)
+
+
+def _write(directory, name, text):
+    path = directory / name
+    path.write_text(text)
+    return str(path)
+
+
+def test_endless_loop_in_workers_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(differential, "MAX_WORKERS", 2)
+    _write(tmp_path, "solution.py", "def f(x):\n    return x\n")
+    student = ("student.py", "def f(x):\n    while True:\n        pass\n")
+    spec = {"function": "f", "args": [{"type": "int"}], "cases": 20, "batch": 10, "workers": 2, "timeout": 1}
+    started = time.monotonic()
+    with pytest.raises(differential.DifferentialError, match="did not finish"):
+        differential.run_differential(spec, student, str(tmp_path))
+    assert time.monotonic() - started < 10
+    # The pool's processes were terminated, not left spinning
+    deadline = time.monotonic() + 5
+    while multiprocessing.active_children() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not multiprocessing.active_children()
+
+
+def test_workers_are_capped(tmp_path, monkeypatch):
+    monkeypatch.setattr(differential, "MAX_WORKERS", 1)
+    _write(tmp_path, "solution.py", "def f(x):\n    return x\n")
+    spec = {"function": "f", "args": [{"type": "int"}], "cases": 20, "batch": 5, "workers": 8}
+    result = differential.run_differential(spec, ("student.py", "def f(x):\n    return x\n"), str(tmp_path))
+    assert result.ok and result.workers == 1
@@ -0,0 +1,127 @@
+import json
+import socket
+import time
+
+import pytest
+
+import events
+
+
+def _exercise(bucket, code, course="main"):
+    return {"bucket": bucket, "code": code, "course": course}
+
+
+def _parse(messages):
+    """[(id, type, data)] of SSE messages"""
+    parsed = []
+    for message in "".join(messages).split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in message.splitlines() if ": " in line)
+        if "event" in fields:
+            parsed.append((fields["id"], fields["event"], json.loads(fields["data"])))
+    return parsed
+
+
+def test_reconnect_gets_exactly_what_was_missed():
+    bus = events.EventBus()
+    messages, seen = bus.read(None)
+    assert messages == []
+    bus.publish("exercise", _exercise("basics", "001"))
+    bus.publish("exercise", _exercise("basics", "002"))
+    messages, last_id = bus.read(seen)
+    assert [data["code"] for _, _, data in _parse(messages)] == ["001", "002"]
+    assert last_id == bus.last_id
+    assert bus.read(last_id) == ([], last_id)
+
+
+def test_unknown_or_expired_id_gets_a_reset():
+    bus = events.EventBus(capacity=2)
+    _, seen = bus.read(None)
+    for code in ("001", "002", "003"):
+        bus.publish("exercise", _exercise("basics", code))
+    # The first event fell out of the buffer
+    assert [kind for _, kind, _ in _parse(bus.read(seen)[0])] == ["reset"]
+    assert [kind for _, kind, _ in _parse(bus.read("otherepoch-1")[0])] == ["reset"]
+    assert [kind for _, kind, _ in _parse(bus.read(f"{bus.epoch}-99")[0])] == ["reset"]
+    # Still within the buffer
+    assert [data["code"] for _, _, data in _parse(bus.read(f"{bus.epoch}-1")[0])] == ["002", "003"]
+
+
+def test_filters_by_exercise_and_course():
+    bus = events.EventBus()
+    _, seen = bus.read(None)
+    bus.publish("exercise", _exercise("basics", "001"))
+    bus.publish("exercise", _exercise("basics", "002", course="other"))
+    bus.publish("catalog", {"generation": 2})
+    codes = lambda messages: [data.get("code") for _, _, data in _parse(messages)]
+    assert codes(bus.read(seen, keys={"basics/002"})[0]) == ["002", None]
+    assert codes(bus.read(seen, course="main")[0]) == ["001", None]
+
+
+class _Client:
+    def __init__(self, port, last_id=None):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+        header = f"Last-Event-ID: {last_id}\r\n" if last_id else ""
+        self.sock.sendall(f"GET /api/events HTTP/1.1\r\nHost: x\r\n{header}\r\n".encode())
+        self.buffer = b""
+
+    def next_event(self):
+        """(id, type, data) of the next event, skipping retry and keepalive lines"""
+        while True:
+            message, separator, rest = self.buffer.partition(b"\n\n")
+            if separator:
+                self.buffer = rest
+                parsed = _parse([message.decode() + "\n\n"])
+                if parsed:
+                    return parsed[0]
+                continue
+            data = self.sock.recv(4096)
+            assert data, "stream closed"
+            self.buffer += data
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def stream_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    bus = events.EventBus()
+    server = events.EventStreamServer(bus, host="127.0.0.1", port=port, heartbeat=0.2)
+    server.start()
+    return bus, server
+
+
+def _wait_for_connections(server, count):
+    deadline = time.monotonic() + 5
+    while server.connections < count:
+        assert time.monotonic() < deadline, f"{server.connections} of {count} streams connected"
+        time.sleep(0.02)
+
+
+def test_events_fan_out_to_every_stream_and_resume(stream_server):
+    bus, server = stream_server
+    clients = [_Client(server.port) for _ in range(3)]
+    try:
+        _wait_for_connections(server, 3)
+        bus.publish("exercise", _exercise("basics", "001"))
+        received = [client.next_event() for client in clients]
+        assert {event_id for event_id, _, _ in received} == {bus.last_id}
+        assert all(data["code"] == "001" for _, _, data in received)
+        first_id = received[0][0]
+    finally:
+        for client in clients:
+            client.close()
+
+    # Published while nobody was connected
+    bus.publish("exercise", _exercise("basics", "002"))
+    bus.publish("exercise", _exercise("basics", "003"))
+    resumed = _Client(server.port, last_id=first_id)
+    stale = _Client(server.port, last_id="0000-1")
+    try:
+        assert [resumed.next_event()[2]["code"] for _ in range(2)] == ["002", "003"]
+        assert stale.next_event()[1] == "reset"
+    finally:
+        resumed.close()
+        stale.close()
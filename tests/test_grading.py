@@ -0,0 +1,187 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import grading
+import results_cache
+import server
+
+
+GOOD = b"def add(a, b):\n    return a + b\n"
+WRONG = b"def add(a, b):\n    return a - b\n"
+# Prints a passing report itself and leaves before the runner writes one
+FORGED = b"""import json, os, sys
+sys.__stdout__.write(json.dumps({"success": True, "loaded": True, "passed": 1, "failed": 0,
+                                 "total": 1, "tests": [], "output": ""}) + "\\n")
+sys.__stdout__.flush()
+os._exit(0)
+"""
+
+
+@pytest.fixture
+def exercise_dir(tmp_path):
+    directory = tmp_path / "exercise"
+    directory.mkdir()
+    (directory / "tests.toml").write_text('[[test]]\nfunction = "add"\nargs = [1, 2]\nreturns = 3\n')
+    return str(directory)
+
+
+@pytest.fixture
+def grader(tmp_path):
+    return grading.Grader(str(tmp_path / "grading"), workers=1, timeout=30,
+                          cache=results_cache.ResultsCache(str(tmp_path / "results.sqlite3")))
+
+
+def _result(grader, record):
+    status = grader.status(record["id"], wait=30)
+    assert status["status"] == "done"
+    return status["result"]
+
+
+def test_graded_results(grader, exercise_dir):
+    good, _ = grader.submit("default", "001", exercise_dir, GOOD)
+    wrong, _ = grader.submit("default", "001", exercise_dir, WRONG)
+    assert _result(grader, good)["success"] is True
+    result = _result(grader, wrong)
+    assert result["success"] is False
+    assert (result["passed"], result["failed"]) == (0, 1)
+
+
+def test_identical_code_is_one_submission(grader, exercise_dir):
+    first, _ = grader.submit("default", "001", exercise_dir, GOOD)
+    second, _ = grader.submit("default", "001", exercise_dir, GOOD)
+    assert first["id"] == second["id"]
+    _result(grader, first)
+    assert grader.submit("default", "001", exercise_dir, GOOD)[1] == "done"
+
+
+def test_cached_result_leaves_out_the_first_run(grader, exercise_dir):
+    # Same code up to comments, as another student would hand it in
+    first, _ = grader.submit("default", "001", exercise_dir, b"print('s1 was here')\n" + GOOD, student="s1")
+    assert "s1 was here" in _result(grader, first)["output"]
+    second, status = grader.submit("default", "001", exercise_dir,
+                                   b"print('s1 was here')  # mine\n" + GOOD, student="s2")
+    assert second["id"] != first["id"] and status == "done"
+    result = _result(grader, second)
+    assert result["cached"] is True and result["success"] is True
+    assert result["output"] == ""
+    assert "output" not in grader.cache.get(*second["cache_key"])
+
+
+def test_forged_report_is_rejected_and_not_cached(grader, exercise_dir):
+    record, _ = grader.submit("default", "001", exercise_dir, FORGED)
+    result = _result(grader, record)
+    assert result["success"] is False
+    assert "ended unexpectedly" in result["error"]
+    assert grader.cache.get(*record["cache_key"]) is None
+
+
+@pytest.mark.parametrize("stdout,returncode,accepted", [
+    ('abc {"success": true}\n', 0, True),
+    ('abc {"success": false}\n', 1, True),
+    ('{"success": true}\n', 0, False),
+    ('xyz {"success": true}\n', 0, False),
+    ('abc {"success": false}\n', 0, False),
+    ('abc {"success": true}\n', 1, False),
+    ('abc not json\n', 0, False),
+    ('', 0, False),
+])
+def test_parse_report_needs_nonce_and_matching_exit_code(stdout, returncode, accepted):
+    result, complete = grading.parse_report(stdout, "", returncode, "abc")
+    assert complete is accepted
+    if not accepted:
+        assert result["success"] is False
+
+
+def test_queue_full_and_status(tmp_path, exercise_dir):
+    # No dispatchers: submissions stay queued
+    grader = grading.Grader(str(tmp_path / "grading"), workers=0, max_pending=1)
+    record, status = grader.submit("default", "001", exercise_dir, GOOD)
+    assert status == "queued"
+    with pytest.raises(grading.QueueFull):
+        grader.submit("default", "001", exercise_dir, WRONG)
+    assert grader.pending() == 1
+    assert grader.status(record["id"])["status"] == "queued"
+    assert grader.status("0" * 32) is None
+
+
+def test_endpoint_answers_503_when_queue_full(tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "GRADER", grading.Grader(str(tmp_path / "grading"), workers=0, max_pending=1))
+    client = server.app.test_client()
+    url = "/api/exercises/default/001/submissions?student=s1"
+    first = client.post(url, data=GOOD, content_type="text/plain")
+    assert first.status_code == 202
+    assert first.get_json()["status"] == "queued"
+    status = client.get(first.get_json()["url"].replace("http://localhost", ""))
+    assert status.get_json()["status"] == "queued"
+
+    full = client.post(url, data=WRONG, content_type="text/plain")
+    assert full.status_code == 503
+    assert full.headers["Retry-After"] == str(server.RETRY_AFTER_SECONDS)
+    assert client.get("/health").get_json()["grading"] == {"queue_depth": 1, "max_pending": 1}
+
+    bulk = client.post("/api/exercises/default/001/submissions",
+                       json={"submissions": [{"code": "x = 1"}, {"code": "x = 2"}]})
+    assert bulk.status_code == 503
+    assert bulk.get_json()["rejected"] == 2
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_submissions_of_a_dead_process_are_recovered(tmp_path, exercise_dir):
+    root = str(tmp_path / "grading")
+    lost = grading.Grader(root, workers=0)
+    record, _ = lost.submit("default", "001", exercise_dir, GOOD)
+    # The process that queued it went away (e.g. a reloaded server worker)
+    claim_path = lost.store.claim_path(record["id"])
+    with open(claim_path, "w") as f:
+        json.dump({"pid": _dead_pid(), "exercise_dir": exercise_dir}, f)
+
+    grader = grading.Grader(root, workers=1)
+    assert grader.recover() == 1
+    assert _result(grader, record)["success"] is True
+    assert not os.path.exists(claim_path)
+    assert grader.recover() == 0
+
+
+def test_submissions_of_a_live_process_are_left_alone(tmp_path, exercise_dir):
+    root = str(tmp_path / "grading")
+    grading.Grader(root, workers=0).submit("default", "001", exercise_dir, GOOD)
+    other = grading.Grader(root, workers=0)
+    # Claimed by this (living) process
+    assert other.recover() == 0
+
+
+def _running(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return "\nState:\tZ" not in f.read()
+    except OSError:
+        return False
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="needs /proc")
+def test_timeout_kills_processes_the_run_started(tmp_path, exercise_dir):
+    pid_file = tmp_path / "child.pid"
+    source = f"""import subprocess, sys
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+open({str(pid_file)!r}, "w").write(str(child.pid))
+while True:
+    pass
+""".encode()
+    grader = grading.Grader(str(tmp_path / "grading"), workers=1, timeout=2)
+    record, _ = grader.submit("default", "001", exercise_dir, source)
+    assert "Timed out" in _result(grader, record)["error"]
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 5
+    while _running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _running(pid)
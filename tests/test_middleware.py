@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+import middleware
+
+
+def _app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ok']
+
+
+def _call(app, path='/api/exercises', **environ):
+    statuses = []
+    environ = dict({'PATH_INFO': path, 'REMOTE_ADDR': '10.0.0.1'}, **environ)
+    body = b''.join(app(environ, lambda status, headers: statuses.append(status)))
+    return statuses[0], body
+
+
+@pytest.mark.parametrize("value,hops,expected", [
+    ("203.0.113.7", 1, "203.0.113.7"),
+    ("1.2.3.4, 203.0.113.7", 1, "203.0.113.7"),
+    ("spoofed, 1.2.3.4 , 203.0.113.7", 2, "1.2.3.4"),
+    ("203.0.113.7", 3, "203.0.113.7"),
+    ("1.2.3.4,,203.0.113.7,", 1, "203.0.113.7"),
+    ("", 1, None),
+    (" , ", 1, None),
+])
+def test_client_address_counts_trusted_hops_from_the_right(value, hops, expected):
+    assert middleware.client_address(value, hops) == expected
+
+
+def test_spoofed_forwarded_for_does_not_get_around_the_limit():
+    app = middleware.RateLimitMiddleware(_app, rate=0.001, burst=3, key_header='X-Forwarded-For')
+    statuses = [
+        _call(app, HTTP_X_FORWARDED_FOR=f'198.51.100.{i}, 203.0.113.7')[0]
+        for i in range(5)
+    ]
+    assert statuses[:3] == ['200 OK'] * 3
+    assert statuses[3:] == ['429 Too Many Requests'] * 2
+    # Another client behind the same proxy has its own bucket
+    assert _call(app, HTTP_X_FORWARDED_FOR='203.0.113.8')[0] == '200 OK'
+
+
+def test_limited_response_and_exempt_paths():
+    app = middleware.RateLimitMiddleware(_app, rate=0.001, burst=1)
+    assert _call(app)[0] == '200 OK'
+    status, body = _call(app)
+    assert status == '429 Too Many Requests'
+    assert json.loads(body)["error"] == "Too many requests"
+    assert _call(app, path='/health')[0] == '200 OK'
+
+
+@pytest.mark.parametrize("path,exempt", [
+    ('/health', True),
+    ('/metrics', True),
+    ('/courses/main/health', True),
+    ('/courses//health', False),
+    ('/courses/other/api/exercises', False),
+    ('/api/health', False),
+])
+def test_per_course_health_is_exempt(path, exempt):
+    app = middleware.RateLimitMiddleware(_app, rate=0.001, burst=1)
+    _call(app)
+    assert (_call(app, path=path)[0] == '200 OK') == exempt
+
@@ -0,0 +1,141 @@
+import os
+import random
+from urllib.parse import quote
+
+import pytest
+
+import server
+from conftest import FIXTURE_DIR
+from pathindex import PathIndex, list_files
+
+
+SECRET = b"not to be served"
+
+# Pieces of traversal attempts, raw and in the encodings clients use
+FRAGMENTS = [
+    "..", ".", "%2e%2e", "%2E%2E", ".%2e", "%2e.", "%252e%252e",
+    "%2f", "%2F", "%5c", "%5C", "%252f", "\\", "..\\", "..%5c", "..%2f", "%c0%af",
+    "", "/", "//", "%00", "%00.png", "secret.txt", "..%00", "~",
+    "res", "up", "link.txt", "serverstr", "default", "001", "solution.py",
+    FIXTURE_DIR.lstrip("/"), quote(FIXTURE_DIR, safe=""), "etc", "passwd",
+]
+PREFIXES = [
+    "/api/res/",
+    "/api/exercises/default/001/",
+    "/api/exercises/default/001/res/",
+    "/courses/main/api/res/",
+]
+
+
+@pytest.fixture(scope="module")
+def index():
+    paths = PathIndex(os.path.join(FIXTURE_DIR, "serverstr"), [os.path.join(FIXTURE_DIR, "res")])
+    paths.rebuild({"default": ["001", "002"], "other": ["A1"]})
+    return paths
+
+
+@pytest.fixture
+def client():
+    return server.app.test_client()
+
+
+def _traversals(count, seed=0):
+    rng = random.Random(seed)
+    for _ in range(count):
+        parts = [rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 5))]
+        yield rng.choice(PREFIXES) + rng.choice(["/", "%2f", "\\"]).join(parts)
+
+
+def test_listing_skips_links_out_of_the_tree():
+    files = list_files(os.path.join(FIXTURE_DIR, "res"))
+    assert "readme.txt" in files
+    assert "alias.txt" in files
+    assert "link.txt" not in files
+    assert not any(rel.startswith("up/") for rel in files)
+    assert "link.txt" not in list_files(os.path.join(FIXTURE_DIR, "serverstr", "default", "001"))
+
+
+@pytest.mark.parametrize("rel", [
+    "../secret.txt",
+    "../../secret.txt",
+    "res/../../../secret.txt",
+    "./solution.py",
+    "res/../solution.py",
+    "res\\..\\solution.py",
+    "..%2fsecret.txt",
+    "%2e%2e/secret.txt",
+    os.path.join(FIXTURE_DIR, "secret.txt"),
+    "/" + "solution.py",
+    "solution.py\x00.png",
+    "solution.py\x00",
+    "\x00",
+    "",
+    "link.txt",
+    "up/secret.txt",
+    "res/",
+    "res//pic.png",
+])
+def test_resolver_rejects(index, rel):
+    assert index.exercise_file("default", "001", rel) is None
+    assert index.resource("default", "001", rel) is None
+    assert index.global_resource(rel) is None
+
+
+@pytest.mark.parametrize("bucket,code", [("..", "default"), ("default", ".."), ("default", "../001"),
+                                         ("default/001", ""), ("", ""), ("default", "001\x00")])
+def test_resolver_rejects_exercise_names(index, bucket, code):
+    assert index.exercise_files(bucket, code) is None
+    assert index.exercise_dir(bucket, code) is None
+    assert index.exercise_file(bucket, code, "solution.py") is None
+
+
+def test_resolver_finds_listed_files(index):
+    assert index.exercise_file("default", "001", "solution.py").endswith(os.path.join("001", "solution.py"))
+    assert index.resource("default", "001", "img/g.png").endswith(os.path.join("001", "res", "img", "g.png"))
+    assert index.resource("default", "002", "img/g.png") == os.path.join(FIXTURE_DIR, "res", "img", "g.png")
+    assert index.global_resource("alias.txt") == os.path.join(FIXTURE_DIR, "res", "alias.txt")
+
+
+@pytest.mark.parametrize("path", [
+    "/api/res/../secret.txt",
+    "/api/res/..%2fsecret.txt",
+    "/api/res/%2e%2e%2fsecret.txt",
+    "/api/res/%252e%252e%252fsecret.txt",
+    "/api/res/..%5csecret.txt",
+    "/api/res/link.txt",
+    "/api/res/up/secret.txt",
+    "/api/res/up%2fsecret.txt",
+    "/api/res/readme.txt%00",
+    "/api/res/readme.txt%00.png",
+    "/api/res/" + quote(os.path.join(FIXTURE_DIR, "secret.txt"), safe=""),
+    "/api/res//" + FIXTURE_DIR.lstrip("/") + "/secret.txt",
+    "/api/exercises/default/001/link.txt",
+    "/api/exercises/default/001/..%2f..%2f..%2fsecret.txt",
+    "/api/exercises/default/001/res/..%2fsolution.py",
+    "/api/exercises/default/001/res/%2e%2e/solution.py",
+    "/api/exercises/default/%2e%2e/001/solution.py",
+    "/api/exercises/%2e%2e/%2e%2e/secret.txt",
+    "/api/exercises/default/001%00/solution.py",
+])
+def test_traversal_is_not_found(client, path):
+    # Redirects (werkzeug merging "//") are followed to where they lead
+    with client.get(path, follow_redirects=True) as response:
+        assert response.status_code == 404
+        assert SECRET not in response.get_data()
+
+
+def test_fuzzed_traversals_are_not_found(client):
+    for path in _traversals(2000):
+        with client.get(path, follow_redirects=True) as response:
+            body = response.get_data()
+            assert SECRET not in body, path
+            # Only names of listed files resolve
+            if response.status_code != 404:
+                assert response.status_code in (200, 206), path
+
+
+def test_listed_files_are_served(client):
+    for path in ("/api/res/readme.txt", "/api/res/alias.txt", "/api/exercises/default/001/solution.py",
+                 "/api/exercises/default/001/res/pic.png"):
+        with client.get(path, follow_redirects=True) as response:
+            assert response.status_code == 200, path
@@ -0,0 +1,74 @@
+import pytest
+
+import search
+
+
+DOCS = {
+    "basics/001": "# Loops\n\nRepeat a block with `for` and `while`, then print the result.\n",
+    "basics/002": "# Lists\n\nA loop over a list visits every element.\n",
+    "basics/003": "# Printing\n\nUse `print_table` to print rows.\n",
+    "extra/001": "# Primes\n\nFind prime numbers with a loop.\n",
+}
+
+
+@pytest.fixture
+def index():
+    index = search.SearchIndex()
+    for key, markdown in DOCS.items():
+        index.add(key, markdown)
+    return index
+
+
+def _keys(result):
+    return [f"{r['bucket']}/{r['code']}" for r in result["results"]]
+
+
+def test_title_match_outranks_body_matches(index):
+    index.add("basics/004", "# Strings\n\nNo loops here, only loops in the text.\n")
+    result = index.search("loops")
+    assert _keys(result)[0] == "basics/001"
+    assert result["total"] == 2
+
+
+def test_prefix_matches_every_completion(index):
+    assert set(_keys(index.search("pri*"))) == {"basics/001", "basics/003", "extra/001"}
+    # Parts of snake_case identifiers in code are terms too
+    assert _keys(index.search("table")) == ["basics/003"]
+    assert set(index.suggest("find pri")) == {
+        "find prime", "find primes", "find print", "find print_table", "find printing",
+    }
+    # Most frequent first: print is in two exercises
+    assert index.suggest("find pri", limit=1) == ["find print"]
+    assert index.suggest("find ") == []
+
+
+def test_bucket_filter_and_limit(index):
+    assert _keys(index.search("loop", bucket="extra")) == ["extra/001"]
+    assert index.search("loop", bucket="missing") == {"total": 0, "results": []}
+    result = index.search("loop", limit=1)
+    assert result["total"] == 2 and len(result["results"]) == 1
+
+
+def test_updates_replace_the_document(index):
+    index.add("basics/001", "# Recursion\n\nA function calling itself.\n")
+    assert "basics/001" not in _keys(index.search("loops"))
+    assert _keys(index.search("recursion")) == ["basics/001"]
+    index.remove("basics/001")
+    assert index.search("recursion")["total"] == 0
+    assert len(index) == len(DOCS) - 1
+
+
+def test_saved_index_ranks_the_same(index, tmp_path):
+    index.remove("basics/002")
+    path = str(tmp_path / "search.json")
+    index.save(path)
+    loaded = search.SearchIndex.load(path)
+    for query in ("loop", "pri*", "print rows"):
+        assert loaded.search(query) == index.search(query)
+
+
+def test_numpy_scores_match_python(index, monkeypatch):
+    pytest.importorskip("numpy")
+    expected = index.search("loop pri*")
+    monkeypatch.setattr(search, "VECTORIZE_MIN", 0)
+    assert index.search("loop pri*") == expected